@@ -0,0 +1,180 @@
+"""Нагрузочный замер Bot API против локального фейкового API.
+
+Запуск: python bench_api.py [запросов] [параллельность] — HTTP-сессии
+        python bench_api.py publish [постов] [параллельность] — способы публикации
+"""
+import asyncio
+import importlib.util
+import json
+import multiprocessing
+import os
+import socket
+import statistics
+import sys
+import time
+
+from aiohttp import ClientSession, web
+from aiogram import Bot
+
+_spec = importlib.util.spec_from_file_location(
+    "botmoderka", os.path.join(os.path.dirname(os.path.abspath(__file__)), "botmoderka — копия.py")
+)
+botmoderka = sys.modules["botmoderka"] = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(botmoderka)
+
+TOKEN = '123456:FAKE'
+ROUNDS = 5
+PUBLISH_LATENCY = 0.05  # задержка ответа фейкового API при замере публикации, как у настоящего
+MESSAGE = {'message_id': 1, 'date': 0, 'chat': {'id': 1, 'type': 'private'}, 'text': 'ok'}
+
+
+async def fake_api(request: web.Request) -> web.Response:
+    """Отвечает как Bot API: отправка — сообщением, копии — id копий, остальное — True"""
+    method = request.match_info['method']
+    data = await request.post()
+    request.app['stats']['calls'] += 1
+    if request.app['latency']:
+        await asyncio.sleep(request.app['latency'])
+    if method == 'copyMessages':
+        result = [{'message_id': i} for i, _ in enumerate(json.loads(data['message_ids']))]
+    elif method == 'copyMessage':
+        result = {'message_id': 1}
+    else:
+        result = MESSAGE if method in ('sendMessage', 'sendPhoto', 'sendVideo') else True
+    return web.json_response({'ok': True, 'result': result})
+
+
+async def fake_api_calls(request: web.Request) -> web.Response:
+    """Счётчик вызовов; обнуляется при чтении"""
+    stats = request.app['stats']
+    calls, stats['calls'] = stats['calls'], 0
+    return web.json_response({'calls': calls})
+
+
+def run_fake_api(port: int, latency: float = 0.0):
+    """Фейковый API в отдельном процессе, чтобы не делить с клиентом цикл событий и GIL"""
+    app = web.Application()
+    app['stats'] = {'calls': 0}  # словарь: состояние запущенного приложения менять нельзя
+    app['latency'] = latency
+    app.router.add_get('/calls', fake_api_calls)
+    app.router.add_post('/bot{token}/{method}', fake_api)
+    web.run_app(app, host='127.0.0.1', port=port, access_log=None, print=None)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def wait_port(port: int):
+    for _ in range(100):
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError('Фейковый API не запустился')
+
+
+async def measure(bot: Bot, requests: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            if i % 2:
+                await bot.send_message(chat_id=1, text=f'bench {i}')
+            else:
+                await bot.answer_callback_query(callback_query_id=str(i))
+
+    await one(0)  # прогрев соединений
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return requests / (time.perf_counter() - started)
+
+
+async def measure_publish(bot: Bot, config, posts: int, concurrency: int) -> tuple[float, float]:
+    """Публикация posts одобренных постов: (медиана задержки одного поста, постов в секунду)"""
+    publisher = botmoderka.Publisher(bot, config)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        post = botmoderka.PendingPost(
+            user_id=1, username=None, original_message_id=i, moderator_message_id=i + 1,
+            content_type=botmoderka.ContentType.PHOTO, file_id='photo', moderator_chat_id=-100,
+            file_unique_id=f'unique-{i}'
+        )
+        async with semaphore:
+            started = time.perf_counter()
+            deliveries = await publisher.publish(post)
+            latencies.append(time.perf_counter() - started)
+        assert set(deliveries.values()) == {'ok'}, deliveries
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(posts)))
+    return statistics.median(latencies), posts / (time.perf_counter() - started)
+
+
+async def publish_main(posts: int, concurrency: int):
+    port = free_port()
+    server = multiprocessing.Process(target=run_fake_api, args=(port, PUBLISH_LATENCY), daemon=True)
+    server.start()
+    await wait_port(port)
+    base = f'http://127.0.0.1:{port}'
+    modes = {
+        'send по file_id': ('send', False),
+        'copyMessage': ('copy', False),
+        'copyMessages': ('copy', True),
+    }
+    try:
+        async with ClientSession() as stats_session:  # счётчик читаем своим клиентом, не трогая сессию бота
+            for name, (mode, batch) in modes.items():
+                config = botmoderka.BotConfig.for_tenant(
+                    'bench', api_server_url=base, publish_mode=mode, publish_batch_copies=batch,
+                    publish_destinations=[{'chat_id': 1, 'thread_id': 2, 'rate_per_minute': 1_000_000}]
+                )
+                session = botmoderka.TunedAiohttpSession(config)
+                bot = Bot(token=TOKEN, session=session)
+                latency, rate = await measure_publish(bot, config, posts, concurrency)
+                await session.close()
+                async with stats_session.get(f'{base}/calls') as response:
+                    calls = (await response.json())['calls']
+                print(f'{name:<22} задержка поста {latency * 1000:6.0f} мс, {rate:7.1f} постов/с, вызовов API {calls}')
+    finally:
+        server.terminate()
+
+
+async def main(requests: int, concurrency: int):
+    port = free_port()
+    server = multiprocessing.Process(target=run_fake_api, args=(port,), daemon=True)
+    server.start()
+    await wait_port(port)
+    base = f'http://127.0.0.1:{port}'
+    api = botmoderka.TelegramAPIServer.from_base(base)
+    config = botmoderka.BotConfig.for_tenant('bench', api_server_url=base)
+    factories = {
+        'aiogram по умолчанию': lambda: botmoderka.AiohttpSession(api=api),
+        'TunedAiohttpSession': lambda: botmoderka.TunedAiohttpSession(config),
+    }
+    results = {name: [] for name in factories}
+    try:
+        for _ in range(ROUNDS):  # чередуем сессии, чтобы шум поровну ложился на обе
+            for name, factory in factories.items():
+                session = factory()
+                results[name].append(await measure(Bot(token=TOKEN, session=session), requests, concurrency))
+                await session.close()
+        for name, samples in results.items():
+            print(f'{name:<22} медиана {statistics.median(samples):8.0f} запросов/с, лучший {max(samples):8.0f}')
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['publish']:
+        args = [int(arg) for arg in sys.argv[2:4]]
+        asyncio.run(publish_main(*(args + [200, 16][len(args):])))
+    else:
+        args = [int(arg) for arg in sys.argv[1:3]]
+        asyncio.run(main(*(args + [5000, 64][len(args):])))
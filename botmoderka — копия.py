@@ -1,21 +1,66 @@
 import asyncio
+import copy
+import heapq
+import io
 import logging
+import math
 import json
+import mmap
 import os
-from typing import Dict, Optional, List, Any
-from dataclasses import dataclass, asdict
+import pickle
+import re
+import shutil
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, List, Any, Awaitable, Callable, Collection, Iterable
+from dataclasses import dataclass, asdict, field
 from datetime import datetime, timedelta
 from enum import Enum
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from contextlib import suppress
 
-from aiogram import Bot, Dispatcher, F, html
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, FSInputFile
-from aiogram.filters import Command, StateFilter
+from aiogram import Bot, Dispatcher, F, Router, html
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.types import (
+    Message, CallbackQuery, InlineKeyboardMarkup, FSInputFile, BufferedInputFile, User, InputMediaPhoto, InputMediaVideo
+)
+from aiogram.filters import Command, CommandObject, StateFilter
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage, MemoryStorageRecord
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from aiogram.exceptions import TelegramBadRequest, TelegramAPIError
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramAPIError, TelegramForbiddenError, TelegramRetryAfter, TelegramNetworkError, TelegramServerError
+)
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+from aiogram.methods import CopyMessages, TelegramMethod
+
+try:
+    import orjson
+except ImportError:  # необязательная зависимость: без неё используется стандартный json
+    orjson = None
+
+try:
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+except ImportError:  # необязательная зависимость: без неё отчёт только текстовый
+    Figure = FigureCanvasAgg = None
+
+try:
+    from PIL import Image, ImageFilter, ImageStat
+except ImportError:  # необязательная зависимость: без неё анализ медиа выключен
+    Image = ImageFilter = ImageStat = None
 
 # ================== КОНФИГУРАЦИЯ ==================
 class BotConfig:
@@ -31,11 +76,94 @@ class BotConfig:
     MAX_PHOTO_SIZE_MB: int = 10
     MAX_VIDEO_SIZE_MB: int = 20
     MAX_PENDING_POSTS: int = 100
-    CLEANUP_INTERVAL_HOURS: int = 24
+    CLEANUP_INTERVAL_HOURS: int = 24  # срок рассмотрения: по истечении пост снимается с очереди
+    REMINDER_HOURS: list[float] = [2, 8]  # напоминания модераторам о зависших постах
+    BULK_RATE_PER_SECOND: float = 5.0
+    BULK_CONCURRENCY: int = 4
+    BROADCAST_RATE_PER_SECOND: float = 20.0
+    DIGEST_WINDOW_SECONDS: int = 60  # 0 — уведомлять сразу
+    CARD_EDIT_WINDOW_SECONDS: float = 0.5  # правки одной карточки за это время сливаются в одну
+    
+    # Всплески: выше порога предложки уходят модераторам альбомами с общей клавиатурой
+    BURST_RATE_PER_MINUTE: int = 20  # 0 — выключено
+    BURST_DIGEST_SIZE: int = 10  # предел альбома Telegram
+    BURST_DIGEST_WAIT_SECONDS: float = 15.0  # неполный дайджест уходит не позже
+    
+    # Репутация авторов: сглаженная доля одобрений с затуханием старых решений
+    REPUTATION_DECAY: float = 0.95
+    REPUTATION_MIN_DECISIONS: int = 5
+    REPUTATION_TRUSTED: float = 0.8  # выше — посты идут первыми
+    REPUTATION_LOW: float = 0.3  # ниже — последними и не больше THROTTLED_MAX_PENDING на рассмотрении
+    REPUTATION_AUTO_APPROVE: float = 0.0  # 0 — выключено; иначе порог публикации без модерации
+    THROTTLED_MAX_PENDING: int = 1
+    
+    # Публикация: пустой список — только MAIN_GROUP_ID/MAIN_GROUP_THREAD_ID
+    PUBLISH_DESTINATIONS: list[dict] = []  # [{'chat_id', 'thread_id', 'title', 'caption_template', 'rate_per_minute'}]
+    PUBLISH_ATTEMPTS: int = 3
+    PUBLISH_DEFERRED_RETRIES: int = 5
+    PUBLISH_RETRY_INTERVAL_SECONDS: int = 60
+    PUBLISH_MODE: str = 'copy'  # 'copy' — копия карточки на стороне Telegram, 'send' — заново по file_id
+    PUBLISH_BATCH_COPIES: bool = True  # копии без подписи, накопившиеся за время вызова, — одним copyMessages
+    FILE_ID_CACHE_SIZE: int = 4096
+    
+    # HTTP-сессия Bot API
+    API_SERVER_URL: str = ''  # пусто — api.telegram.org; иначе локальный Bot API сервер
+    HTTP_POOL_LIMIT: int = 100
+    HTTP_KEEPALIVE_SECONDS: float = 30.0
+    HTTP_DNS_CACHE_SECONDS: int = 300
+    HTTP_TIMEOUT_SECONDS: float = 60.0
+    HTTP_METHOD_TIMEOUTS: dict[str, float] = {
+        'sendVideo': 300.0,
+        'sendMediaGroup': 300.0,
+        'sendPhoto': 120.0,
+        'editMessageCaption': 15.0,
+        'editMessageReplyMarkup': 15.0,
+        'answerCallbackQuery': 5.0,
+    }
+    
+    # Предохранитель Bot API: после серии сбоев метод или чат временно не вызываются
+    BREAKER_FAILURE_THRESHOLD: int = 5  # подряд идущих сетевых/5xx ошибок
+    BREAKER_OPEN_SECONDS: float = 30.0  # пауза до пробного запроса
+    BREAKER_DRAIN_PER_MINUTE: int = 30  # темп разбора очереди ожидания после восстановления
     
     # Настройки админ-панели
     CONFIG_FILE: str = 'bot_config.json'
+    TENANTS_FILE: str = 'tenants.json'
+    AUDIENCE_FILE: str = 'audience.bin'
+    OVERFLOW_FILE: str = 'overflow_queue.jsonl'
+    OVERFLOW_COMPACT_BYTES: int = 1024 * 1024  # сжимать журнал ожидания, когда мёртвых записей больше
+    SNAPSHOT_FILE: str = 'state_snapshot.pkl'
+    AUDIT_DIR: str = 'audit'
+    ARCHIVE_FILE: str = 'archive.db'
+    AUDIT_SEGMENT_BYTES: int = 4 * 1024 * 1024
+    AUDIT_COMPACT_SEGMENTS: int = 8  # сколько запечатанных сегментов держать до слияния старых
+    SHUTDOWN_DRAIN_SECONDS: float = 20.0
     MAX_COMMENT_LENGTH: int = 1000
+    COMMENT_SESSION_MINUTES: int = 15
+    QUEUE_PAGE_SIZE: int = 10
+    
+    # Шардирование очереди модерации
+    REVIEW_MODE: str = 'single'  # 'single' — общий чат, 'sharded' — личные шарды модераторов
+    SHARD_STRATEGY: str = 'weighted'  # 'weighted' — взвешенный round-robin, 'least_loaded' — по нагрузке
+    SHARD_REASSIGN_MINUTES: int = 60
+    REVIEW_SHARDS: list[dict] = []  # [{'moderator_id': ..., 'chat_id': ..., 'thread_id': ..., 'weight': ...}]
+    
+    # Предварительный анализ медиа (нужен Pillow): водяные знаки, пустые и мелкие картинки, повторы
+    MEDIA_ANALYSIS_ENABLED: bool = False  # включается явно: каждый анализ скачивает превью
+    MEDIA_ANALYSIS_WORKERS: int = 2  # размер пула процессов, общего для всех арендаторов
+    MEDIA_ANALYSIS_QUEUE: int = 32  # при переполнении карточка остаётся без анализа
+    MEDIA_ANALYSIS_CACHE: int = 4096
+    MEDIA_MIN_SIDE_PX: int = 320
+    MEDIA_SIMILAR_HISTORY: int = 5000
+    MEDIA_SIMILAR_DISTANCE: int = 6  # расстояние Хэмминга между dHash, не больше — «похоже»
+    
+    # Самоконтроль цикла событий
+    LOOP_LAG_INTERVAL_SECONDS: float = 0.5
+    LOOP_LAG_THRESHOLD_SECONDS: float = 1.0  # дольше — снимаем стек и предупреждаем админов
+    LOOP_LAG_ALERT_MINUTES: int = 10  # не чаще одного предупреждения
+    LIVENESS_HOST: str = '127.0.0.1'
+    LIVENESS_PORT: int = 0  # 0 — выключено; иначе GET /healthz для супервизора
+    LIVENESS_STALE_SECONDS: float = 30.0  # цикл молчит дольше — /healthz отвечает 503
     
     @classmethod
     def load_config(cls):
@@ -50,6 +178,14 @@ class BotConfig:
                     cls.CLEANUP_INTERVAL_HOURS = config.get('cleanup_interval', cls.CLEANUP_INTERVAL_HOURS)
                     cls.MODERATORS = set(config.get('moderators', list(cls.MODERATORS)))
                     cls.ADMIN_IDS = set(config.get('admins', list(cls.ADMIN_IDS)))
+                    cls.REVIEW_MODE = config.get('review_mode', cls.REVIEW_MODE)
+                    cls.SHARD_STRATEGY = config.get('shard_strategy', cls.SHARD_STRATEGY)
+                    cls.SHARD_REASSIGN_MINUTES = config.get('shard_reassign_minutes', cls.SHARD_REASSIGN_MINUTES)
+                    cls.REVIEW_SHARDS = config.get('review_shards', cls.REVIEW_SHARDS)
+                    cls.DIGEST_WINDOW_SECONDS = config.get('digest_window', cls.DIGEST_WINDOW_SECONDS)
+                    cls.PUBLISH_DESTINATIONS = config.get('publish_destinations', cls.PUBLISH_DESTINATIONS)
+                    cls.REMINDER_HOURS = config.get('reminder_hours', cls.REMINDER_HOURS)
+                    cls.REPUTATION_AUTO_APPROVE = config.get('reputation_auto_approve', cls.REPUTATION_AUTO_APPROVE)
             except Exception as e:
                 logging.error(f"Ошибка загрузки конфигурации: {e}")
     
@@ -63,12 +199,59 @@ class BotConfig:
                 'max_pending_posts': cls.MAX_PENDING_POSTS,
                 'cleanup_interval': cls.CLEANUP_INTERVAL_HOURS,
                 'moderators': list(cls.MODERATORS),
-                'admins': list(cls.ADMIN_IDS)
+                'admins': list(cls.ADMIN_IDS),
+                'review_mode': cls.REVIEW_MODE,
+                'shard_strategy': cls.SHARD_STRATEGY,
+                'shard_reassign_minutes': cls.SHARD_REASSIGN_MINUTES,
+                'review_shards': cls.REVIEW_SHARDS,
+                'digest_window': cls.DIGEST_WINDOW_SECONDS,
+                'publish_destinations': cls.PUBLISH_DESTINATIONS,
+                'reminder_hours': cls.REMINDER_HOURS,
+                'reputation_auto_approve': cls.REPUTATION_AUTO_APPROVE
             }
             with open(cls.CONFIG_FILE, 'w', encoding='utf-8') as f:
                 json.dump(config, f, ensure_ascii=False, indent=2)
         except Exception as e:
             logging.error(f"Ошибка сохранения конфигурации: {e}")
+    
+    @classmethod
+    def for_tenant(cls, name: str, **overrides) -> type['BotConfig']:
+        """Отдельная конфигурация бота-арендатора со своими файлами состояния"""
+        attrs = {
+            key: copy.deepcopy(getattr(cls, key)) for key in dir(cls)
+            if key.isupper() and isinstance(getattr(cls, key), (set, list, dict))
+        }
+        attrs.update(
+            ADMIN_IDS=set(),  # права из базовой конфигурации на арендаторов не переносятся
+            MODERATORS=set(),
+            CONFIG_FILE=f'bot_config.{name}.json',
+            AUDIENCE_FILE=f'audience.{name}.bin',
+            OVERFLOW_FILE=f'overflow_queue.{name}.jsonl',
+            SNAPSHOT_FILE=f'state_snapshot.{name}.pkl',
+            AUDIT_DIR=f'audit.{name}',
+            ARCHIVE_FILE=f'archive.{name}.db',
+        )
+        for key, value in overrides.items():
+            key = key.upper()
+            attrs[key] = set(value) if isinstance(getattr(cls, key, None), set) else value
+        tenant = type(f'BotConfig_{name}', (cls,), attrs)
+        tenant.load_config()
+        if not tenant.ADMIN_IDS:
+            logging.warning(f"У арендатора {name} не заданы админы: админ-панель недоступна")
+        return tenant
+    
+    @classmethod
+    def load_tenants(cls) -> List[type['BotConfig']]:
+        """Загружает арендаторов из TENANTS_FILE: {"имя": {"bot_token": ..., ...}}"""
+        if not os.path.exists(cls.TENANTS_FILE):
+            return []
+        try:
+            with open(cls.TENANTS_FILE, 'r', encoding='utf-8') as f:
+                tenants = json.load(f)
+        except Exception as e:
+            logging.error(f"Ошибка загрузки арендаторов: {e}")
+            return []
+        return [cls.for_tenant(name, **overrides) for name, overrides in tenants.items()]
 
 BotConfig.load_config()
 
@@ -89,17 +272,125 @@ class PendingPost:
     caption: Optional[str] = None
     timestamp: datetime = None
     is_processed: bool = False
+    moderator_chat_id: int = 0
+    moderator_thread_id: Optional[int] = None
+    moderation_caption: str = ""
+    shard_id: Optional[int] = None
+    assigned_at: datetime = None
+    decision: Optional[str] = None
+    decided_by: str = ""
+    decided_by_id: Optional[int] = None
+    decision_comment: str = ""
+    archived: bool = False  # одобрение попадает в архив, когда известен итог доставки
+    deliveries: Dict[int, str] = field(default_factory=dict)  # dest_id -> 'ok' | 'retry' | 'failed'
+    file_unique_id: Optional[str] = None
+    priority: int = 1  # 0 — доверенный автор, 1 — обычный, 2 — с низкой репутацией
+    digest_message_id: Optional[int] = None  # карточка — элемент альбома; 0 — альбом без клавиатуры
     
     def __post_init__(self):
         if self.timestamp is None:
             self.timestamp = datetime.now()
+        if self.assigned_at is None:
+            self.assigned_at = self.timestamp
 
-# ================== СОСТОЯНИЯ FSM ==================
-class CommentStates(StatesGroup):
-    """Состояния для комментариев"""
-    waiting_for_approve_comment = State()
-    waiting_for_reject_comment = State()
+@dataclass
+class Submission:
+    """Предложка, ещё не переданная модераторам"""
+    user_id: int
+    username: Optional[str]
+    first_name: Optional[str]
+    message_id: int
+    content_type: ContentType
+    file_id: str
+    caption: Optional[str] = None
+    submitted_at: datetime = None
+    file_unique_id: Optional[str] = None
+    width: int = 0
+    height: int = 0
+    preview_file_id: Optional[str] = None  # уменьшенная копия для анализа медиа
+    
+    def __post_init__(self):
+        if self.submitted_at is None:
+            self.submitted_at = datetime.now()
+    
+    @classmethod
+    def from_message(cls, message: Message, file_id: str) -> 'Submission':
+        media = message.photo[-1] if message.photo else message.video
+        if message.photo:
+            # Эвристикам хватает ~800px, оригинал не скачиваем
+            preview = next((size for size in message.photo if max(size.width, size.height) >= 640), media)
+        else:
+            preview = message.video.thumbnail
+        return cls(
+            user_id=message.from_user.id,
+            username=message.from_user.username,
+            first_name=message.from_user.first_name,
+            message_id=message.message_id,
+            content_type=ContentType.PHOTO if message.photo else ContentType.VIDEO,
+            file_id=file_id,
+            caption=message.caption,
+            file_unique_id=media.file_unique_id,
+            width=media.width,
+            height=media.height,
+            preview_file_id=preview.file_id if preview else None
+        )
+    
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data['content_type'] = self.content_type.value
+        data['submitted_at'] = self.submitted_at.isoformat()
+        return data
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Submission':
+        data = dict(data)
+        data['content_type'] = ContentType(data['content_type'])
+        data['submitted_at'] = datetime.fromisoformat(data['submitted_at'])
+        return cls(**data)
+
+@dataclass
+class PublishDestination:
+    """Куда публиковать одобренные посты"""
+    dest_id: int
+    chat_id: int
+    thread_id: Optional[int] = None
+    title: str = ""
+    caption_template: str = "{comment}"
+    rate_per_minute: float = 20.0
+    limiter: 'RateLimiter' = field(default=None, repr=False)
+    
+    @property
+    def label(self) -> str:
+        return self.title or (f"{self.chat_id}/{self.thread_id}" if self.thread_id else str(self.chat_id))
+
+@dataclass
+class ReviewShard:
+    """Шард очереди модерации: личный чат или тема модератора"""
+    shard_id: int
+    moderator_id: int
+    chat_id: int
+    thread_id: Optional[int] = None
+    weight: int = 1
+    current_weight: int = 0
+    outstanding: int = 0
+
+@dataclass
+class CommentSession:
+    """Черновик комментария модератора к посту"""
+    moderator_id: int
+    post_id: int
+    action: str
+    chat_id: int
+    prompt_message_id: Optional[int] = None
+
+@dataclass
+class DecisionNote:
+    """Решение по посту, ожидающее отправки автору"""
+    post_id: int
+    approved: bool
+    comment: str = ""
 
+# ================== СОСТОЯНИЯ FSM ==================
 class AdminStates(StatesGroup):
     """Состояния для админ-панели"""
     waiting_photo_size = State()
@@ -109,24 +400,2174 @@ class AdminStates(StatesGroup):
     waiting_moderator_id = State()
     waiting_admin_id = State()
     waiting_broadcast = State()
+    waiting_queue_user = State()
+    waiting_bulk_user = State()
+    waiting_bulk_age = State()
 
 # ================== СЕРВИСЫ ==================
+class RateLimiter:
+    """Token bucket для ограничения частоты вызовов API"""
+    
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self, tokens: float = 1.0):
+        """Дождаться, пока в ведре наберётся нужное число токенов"""
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+class TunedAiohttpSession(AiohttpSession):
+    """Сессия Bot API: общий пул keep-alive соединений, кэш DNS и таймауты по методам"""
+    
+    def __init__(self, config: type[BotConfig] = BotConfig):
+        json_options = {}
+        if orjson is not None:
+            json_options = {'json_loads': orjson.loads, 'json_dumps': lambda obj: orjson.dumps(obj).decode()}
+        super().__init__(
+            limit=config.HTTP_POOL_LIMIT,
+            api=TelegramAPIServer.from_base(config.API_SERVER_URL) if config.API_SERVER_URL else PRODUCTION,
+            timeout=config.HTTP_TIMEOUT_SECONDS,
+            **json_options
+        )
+        self._connector_init.update(
+            limit_per_host=config.HTTP_POOL_LIMIT,  # все запросы идут на один хост
+            keepalive_timeout=config.HTTP_KEEPALIVE_SECONDS,
+            ttl_dns_cache=config.HTTP_DNS_CACHE_SECONDS,
+        )
+        if self.api.base.startswith('http://'):
+            self._connector_init.pop('ssl', None)
+        self.method_timeouts = dict(config.HTTP_METHOD_TIMEOUTS)
+    
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None):
+        if timeout is None:
+            timeout = self.method_timeouts.get(method.__api_method__)
+        return await super().make_request(bot, method, timeout=timeout)
+
+class BulkExecutor:
+    """Конвейерное выполнение пакетных операций с ограничением частоты"""
+    
+    def __init__(self, rate_per_second: float, concurrency: int):
+        self._limiter = RateLimiter(rate_per_second)
+        self._concurrency = max(1, concurrency)
+    
+    async def run(self, items: List[Any], worker: Callable[[Any], Awaitable[bool]], cost: float = 1.0,
+                  on_progress: Optional[Callable[[int, int, int], Awaitable[None]]] = None) -> tuple[int, int]:
+        """Выполнить worker для каждого элемента, вернуть (успешно, с ошибкой)"""
+        semaphore = asyncio.Semaphore(self._concurrency)
+        done = failed = 0
+        total = len(items)
+        
+        async def process(item):
+            nonlocal done, failed
+            async with semaphore:
+                await self._limiter.acquire(cost)
+                try:
+                    ok = await worker(item)
+                except Exception as e:
+                    logging.error(f"Ошибка пакетной операции: {e}")
+                    ok = False
+                if ok:
+                    done += 1
+                else:
+                    failed += 1
+                if on_progress:
+                    # Сбой отчёта не должен обрывать gather: остальные элементы уже могут быть заняты
+                    try:
+                        await on_progress(done, failed, total)
+                    except Exception as e:
+                        logging.warning(f"Ошибка отчёта о прогрессе: {e}")
+        
+        await asyncio.gather(*(process(item) for item in items))
+        return done, failed
+
+class _TemplateFields(dict):
+    def __missing__(self, key):
+        return ""
+
+class PartialCopyError(TelegramBadRequest):
+    """copyMessages скопировал не всё; какие именно — неизвестно, повторять нельзя"""
+
+class FileIdCache:
+    """LRU file_unique_id -> file_id из последней успешной отправки"""
+    
+    def __init__(self, size: int):
+        self.size = size
+        self._ids: OrderedDict[str, str] = OrderedDict()
+    
+    def remember(self, message: Optional[Message]):
+        media = message and (message.photo[-1] if message.photo else message.video)
+        if not media:
+            return
+        self._ids[media.file_unique_id] = media.file_id
+        self._ids.move_to_end(media.file_unique_id)
+        if len(self._ids) > self.size:
+            self._ids.popitem(last=False)
+    
+    def resolve(self, file_unique_id: Optional[str], file_id: str) -> str:
+        """Самый свежий file_id для медиа, иначе переданный"""
+        if file_unique_id not in self._ids:
+            return file_id
+        self._ids.move_to_end(file_unique_id)
+        return self._ids[file_unique_id]
+    
+    def __len__(self) -> int:
+        return len(self._ids)
+
+class Publisher:
+    """Параллельная публикация в несколько мест с повторами по каждому"""
+    
+    def __init__(self, bot: Bot, config: type[BotConfig] = BotConfig):
+        self.bot = bot
+        self.config = config
+        self._destinations: List[PublishDestination] = []
+        self._retry_queue: Dict[tuple[int, int], list] = {}  # (post_id, dest_id) -> [post, dest, comment, попытки]
+        self._batches: Dict[tuple[int, int], List[tuple[PendingPost, asyncio.Future]]] = {}  # (dest_id, чат карточки)
+        self._copiers: Dict[tuple[int, int], asyncio.Task] = {}
+        self.file_ids = FileIdCache(config.FILE_ID_CACHE_SIZE)
+        self.reload()
+    
+    def reload(self):
+        """Перечитать места публикации из конфигурации"""
+        raw_destinations = self.config.PUBLISH_DESTINATIONS or [
+            {'chat_id': self.config.MAIN_GROUP_ID, 'thread_id': self.config.MAIN_GROUP_THREAD_ID, 'title': 'Основная группа'}
+        ]
+        destinations = []
+        for dest_id, raw in enumerate(raw_destinations):
+            try:
+                rate = float(raw.get('rate_per_minute', 20))
+                destinations.append(PublishDestination(
+                    dest_id=dest_id,
+                    chat_id=int(raw['chat_id']),
+                    thread_id=raw.get('thread_id'),
+                    title=raw.get('title', ''),
+                    caption_template=raw.get('caption_template', '{comment}'),
+                    rate_per_minute=rate,
+                    limiter=RateLimiter(rate / 60, capacity=max(1.0, rate / 20))
+                ))
+            except (KeyError, TypeError, ValueError) as e:
+                logging.error(f"Некорректное место публикации #{dest_id}: {e}")
+        self._destinations = destinations
+    
+    def get_destinations(self) -> List[PublishDestination]:
+        return self._destinations
+    
+    def get_destination(self, dest_id: int) -> Optional[PublishDestination]:
+        return next((dest for dest in self._destinations if dest.dest_id == dest_id), None)
+    
+    @staticmethod
+    def render_caption(dest: PublishDestination, post: PendingPost, comment: str) -> Optional[str]:
+        caption = dest.caption_template.format_map(_TemplateFields(
+            comment=comment,
+            caption=html.quote(post.caption or ''),
+            post_id=post.original_message_id
+        )).strip()
+        return caption or None
+    
+    async def _send(self, dest: PublishDestination, post: PendingPost, caption: Optional[str]):
+        if self.config.PUBLISH_MODE == 'copy' and post.moderator_message_id:
+            try:
+                if caption is None and self.config.PUBLISH_BATCH_COPIES:
+                    await self._copy_batched(dest, post)
+                else:
+                    await self._copy(dest, post, caption)
+                return
+            except PartialCopyError:
+                raise  # часть уже опубликована, отправка заново даст дубли
+            except TelegramBadRequest as e:
+                # Карточку удалили или её нельзя скопировать — отправляем медиа заново
+                logging.warning(f"Копия карточки {post.original_message_id} не удалась, отправка по file_id: {e}")
+        
+        file_id = self.file_ids.resolve(post.file_unique_id, post.file_id)
+        if post.content_type == ContentType.PHOTO:
+            sent = await self.bot.send_photo(
+                chat_id=dest.chat_id,
+                message_thread_id=dest.thread_id,
+                photo=file_id,
+                caption=caption,
+                parse_mode="HTML" if caption else None
+            )
+        else:
+            sent = await self.bot.send_video(
+                chat_id=dest.chat_id,
+                message_thread_id=dest.thread_id,
+                video=file_id,
+                caption=caption,
+                parse_mode="HTML" if caption else None
+            )
+        self.file_ids.remember(sent)
+    
+    async def _copy(self, dest: PublishDestination, post: PendingPost, caption: Optional[str]):
+        """Серверная копия карточки модерации с подписью для места публикации"""
+        await self.bot.copy_message(
+            chat_id=dest.chat_id,
+            message_thread_id=dest.thread_id,
+            from_chat_id=post.moderator_chat_id,
+            message_id=post.moderator_message_id,
+            caption=caption or "",  # пустая подпись убирает подпись карточки
+            parse_mode="HTML" if caption else None,
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[])
+        )
+    
+    async def _copy_batched(self, dest: PublishDestination, post: PendingPost):
+        """Копия без подписи; пока идёт вызов в то же место, следующие копятся в один copyMessages"""
+        key = (dest.dest_id, post.moderator_chat_id)
+        future = asyncio.get_running_loop().create_future()
+        self._batches.setdefault(key, []).append((post, future))
+        if key not in self._copiers:
+            self._copiers[key] = asyncio.create_task(self._copy_flusher(dest, key))
+        await asyncio.shield(future)
+    
+    async def _copy_flusher(self, dest: PublishDestination, key: tuple[int, int]):
+        try:
+            while batch := self._batches.pop(key, None):
+                if len(batch) > 100:  # предел copyMessages
+                    self._batches[key] = batch[100:] + self._batches.get(key, [])
+                    batch = batch[:100]
+                await self._copy_batch(dest, key[1], batch)
+        finally:
+            self._copiers.pop(key, None)
+    
+    async def _copy_batch(self, dest: PublishDestination, from_chat_id: int,
+                          batch: List[tuple[PendingPost, asyncio.Future]]):
+        batch.sort(key=lambda item: item[0].moderator_message_id)  # copyMessages требует возрастающие id
+        try:
+            if len(batch) == 1:
+                await self._copy(dest, batch[0][0], None)
+            else:
+                # Кнопки с callback_data при копировании не переносятся
+                method = CopyMessages(
+                    chat_id=dest.chat_id,
+                    message_thread_id=dest.thread_id,
+                    from_chat_id=from_chat_id,
+                    message_ids=[post.moderator_message_id for post, _ in batch],
+                    remove_caption=True
+                )
+                copied = await self.bot(method)
+                if not copied:
+                    raise TelegramBadRequest(method, "ни одно сообщение не скопировано")
+                if len(copied) != len(batch):
+                    raise PartialCopyError(method, f"скопировано {len(copied)} из {len(batch)}")
+        except PartialCopyError as e:
+            self._settle(batch, e)
+        except TelegramBadRequest as e:
+            if len(batch) == 1:
+                self._settle(batch, e)
+                return
+            # Отклонённый вызов ничего не скопировал: делим пополам, чтобы ошибку получили только её посты
+            middle = len(batch) // 2
+            await self._copy_batch(dest, from_chat_id, batch[:middle])
+            await self._copy_batch(dest, from_chat_id, batch[middle:])
+        except Exception as e:
+            self._settle(batch, e)  # сеть, флуд-контроль, нет прав — общее для всех, повторы решит _deliver
+        else:
+            self._settle(batch)
+    
+    @staticmethod
+    def _settle(batch: List[tuple[PendingPost, asyncio.Future]], error: Optional[Exception] = None):
+        for _, waiter in batch:
+            if waiter.done():
+                continue
+            if error is None:
+                waiter.set_result(None)
+            else:
+                waiter.set_exception(error)
+    
+    async def _deliver(self, dest: PublishDestination, post: PendingPost, comment: str) -> str:
+        """Доставить в одно место: 'ok', 'retry' (временная ошибка) или 'failed'"""
+        caption = self.render_caption(dest, post, comment)
+        for attempt in range(self.config.PUBLISH_ATTEMPTS):
+            await dest.limiter.acquire()
+            try:
+                await self._send(dest, post, caption)
+                return 'ok'
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+            except (TelegramBadRequest, TelegramForbiddenError) as e:
+                logging.error(f"Публикация {post.original_message_id} в {dest.label} невозможна: {e}")
+                return 'failed'
+            except TelegramAPIError as e:
+                logging.warning(f"Ошибка публикации {post.original_message_id} в {dest.label}: {e}")
+                await asyncio.sleep(2 ** attempt)
+        return 'retry'
+    
+    async def publish(self, post: PendingPost, comment: str = "") -> Dict[int, str]:
+        """Опубликовать во все места параллельно; неудачные встают в очередь повторов"""
+        destinations = self.get_destinations()
+        results = await asyncio.gather(*(self._deliver(dest, post, comment) for dest in destinations))
+        for dest, status in zip(destinations, results):
+            post.deliveries[dest.dest_id] = status
+            if status == 'retry':
+                self._retry_queue[(post.original_message_id, dest.dest_id)] = [post, dest, comment, 0]
+        return post.deliveries
+    
+    async def retry_pending(self) -> List[PendingPost]:
+        """Повторить отложенные доставки, вернуть посты с изменившимся статусом"""
+        changed = {}
+        for key, entry in list(self._retry_queue.items()):
+            post, dest, comment, attempts = entry
+            status = await self._deliver(dest, post, comment)
+            if status == 'retry' and attempts + 1 < self.config.PUBLISH_DEFERRED_RETRIES:
+                entry[3] = attempts + 1
+                continue
+            del self._retry_queue[key]
+            post.deliveries[dest.dest_id] = 'ok' if status == 'ok' else 'failed'
+            changed[post.original_message_id] = post
+        return list(changed.values())
+    
+    def dump_retries(self) -> List[tuple[PendingPost, int, str, int]]:
+        """Отложенные доставки для снимка состояния (место — по dest_id: ограничитель не сериализуется)"""
+        return [(post, dest.dest_id, comment, attempts) for post, dest, comment, attempts in self._retry_queue.values()]
+    
+    def restore_retries(self, entries: List[tuple[PendingPost, int, str, int]]):
+        """Вернуть отложенные доставки из снимка; исчезнувшие места публикации пропускаются"""
+        for post, dest_id, comment, attempts in entries:
+            if dest := self.get_destination(dest_id):
+                self._retry_queue[(post.original_message_id, dest_id)] = [post, dest, comment, attempts]
+    
+    def __len__(self) -> int:
+        return len(self._retry_queue)
+
+class BurstDetector:
+    """Скорость приёма предложек за минуту с гистерезисом переключения режима"""
+    
+    def __init__(self, config: type[BotConfig] = BotConfig):
+        self.config = config
+        self.active = False
+        self._arrivals: deque[float] = deque()
+    
+    def rate(self) -> int:
+        cutoff = time.monotonic() - 60
+        while self._arrivals and self._arrivals[0] < cutoff:
+            self._arrivals.popleft()
+        return len(self._arrivals)
+    
+    def record(self) -> bool:
+        """Учесть предложку; True — сейчас режим дайджестов"""
+        self._arrivals.append(time.monotonic())
+        rate, limit = self.rate(), self.config.BURST_RATE_PER_MINUTE
+        if not limit:
+            self.active = False
+        elif rate > limit:
+            self.active = True
+        elif rate <= limit // 2:  # выходим с запасом, чтобы режим не дёргался на границе
+            self.active = False
+        return self.active
+
+class CardRenderer:
+    """Правки карточек модерации: желаемое состояние, слияние правок в окне, пропуск правок без изменений"""
+    KNOWN_CARDS = 10000
+    
+    def __init__(self, bot: Bot, render: Callable[[PendingPost], tuple[str, Optional[InlineKeyboardMarkup]]],
+                 window_seconds: float = 0.5):
+        self.bot = bot
+        self.render = render
+        self.window_seconds = window_seconds
+        self.requested = 0
+        self.edits = 0
+        self.skipped = 0
+        self._sent: OrderedDict[tuple[int, int], tuple[str, Optional[str]]] = OrderedDict()  # что сейчас на карточке
+        self._desired: Dict[tuple[int, int], tuple[Callable[[], tuple[str, Optional[InlineKeyboardMarkup]]], bool]] = {}
+        self._waiters: Dict[tuple[int, int], asyncio.Future] = {}
+        self._flushers: Dict[tuple[int, int], asyncio.Task] = {}
+    
+    @staticmethod
+    def _state(caption: str, markup: Optional[InlineKeyboardMarkup]) -> tuple[str, Optional[str]]:
+        return caption, markup.model_dump_json(exclude_none=True) if markup else None
+    
+    def remember(self, chat_id: int, message_id: int, caption: str, markup: Optional[InlineKeyboardMarkup]):
+        """Запомнить только что отправленную карточку"""
+        self._sent[(chat_id, message_id)] = self._state(caption, markup)
+        self._sent.move_to_end((chat_id, message_id))
+        if len(self._sent) > self.KNOWN_CARDS:
+            self._sent.popitem(last=False)
+    
+    def update(self, post: PendingPost) -> asyncio.Future:
+        """Перерисовать карточку поста; подпись и кнопки считаются в момент правки"""
+        return self._schedule((post.moderator_chat_id, post.moderator_message_id), lambda: self.render(post))
+    
+    def replace(self, chat_id: int, message_id: int, caption: str, markup: Optional[InlineKeyboardMarkup]) -> asyncio.Future:
+        """Заменить содержимое карточки, уже не привязанной к посту"""
+        return self._schedule((chat_id, message_id), lambda: (caption, markup))
+    
+    def refresh_text(self, chat_id: int, message_id: int,
+                     render: Callable[[], tuple[str, Optional[InlineKeyboardMarkup]]]) -> asyncio.Future:
+        """Перерисовать текстовое сообщение (клавиатуру дайджеста)"""
+        return self._schedule((chat_id, message_id), render, text=True)
+    
+    def _schedule(self, key: tuple[int, int], desired: Callable[[], tuple[str, Optional[InlineKeyboardMarkup]]],
+                  text: bool = False) -> asyncio.Future:
+        self.requested += 1
+        self._desired[key] = (desired, text)  # побеждает последняя правка
+        if key not in self._waiters:
+            self._waiters[key] = asyncio.get_running_loop().create_future()
+        if key not in self._flushers:
+            self._flushers[key] = asyncio.create_task(self._flush(key))
+        return asyncio.shield(self._waiters[key])
+    
+    async def _flush(self, key: tuple[int, int]):
+        try:
+            # Пришедшее во время правки уходит следующей правкой после нового окна
+            while key in self._desired:
+                await asyncio.sleep(self.window_seconds)
+                desired, text = self._desired.pop(key)
+                waiter = self._waiters.pop(key)
+                try:
+                    await self._apply(key, *desired(), text=text)
+                finally:
+                    waiter.set_result(None)
+        finally:
+            self._flushers.pop(key, None)
+            self._desired.pop(key, None)
+            if (waiter := self._waiters.pop(key, None)) and not waiter.done():
+                waiter.cancel()
+    
+    async def _apply(self, key: tuple[int, int], caption: str, markup: Optional[InlineKeyboardMarkup], text: bool = False):
+        state = self._state(caption, markup)
+        if self._sent.get(key) == state:
+            self.skipped += 1
+            return
+        try:
+            if text:
+                await self.bot.edit_message_text(
+                    chat_id=key[0],
+                    message_id=key[1],
+                    text=caption,
+                    parse_mode="HTML",
+                    reply_markup=markup
+                )
+            else:
+                await self.bot.edit_message_caption(
+                    chat_id=key[0],
+                    message_id=key[1],
+                    caption=caption,
+                    parse_mode="HTML",
+                    reply_markup=markup
+                )
+            self.edits += 1
+        except TelegramBadRequest as e:
+            # Состояние карточки неизвестно (например, после рестарта) и совпало с нужным
+            if "message is not modified" not in str(e):
+                logging.warning(f"Не удалось обновить карточку модерации {key}: {e}")
+                return
+        except TelegramAPIError as e:
+            logging.warning(f"Не удалось обновить карточку модерации {key}: {e}")
+            return
+        self.remember(*key, caption, markup)
+    
+    async def flush(self):
+        """Дождаться отложенных правок"""
+        while self._flushers:
+            await asyncio.gather(*self._flushers.values(), return_exceptions=True)
+
+class TimerWheel:
+    """Хешированное колесо таймеров: постановка и отмена за O(1)"""
+    
+    def __init__(self, tick_seconds: float = 1.0, slots: int = 512):
+        self.tick_seconds = tick_seconds
+        self._slots: List[Dict[Any, int]] = [{} for _ in range(slots)]
+        self._where: Dict[Any, int] = {}
+        self._cursor = 0
+        self._last_tick = time.monotonic()
+    
+    def schedule(self, key: Any, delay_seconds: float, now: Optional[float] = None):
+        """Поставить (или переставить) таймер для ключа"""
+        self.cancel(key)
+        now = time.monotonic() if now is None else now
+        # Отсчёт от последнего поворота: ещё не прокрученные тики простоя не съедают задержку
+        ticks = max(1, math.ceil((now - self._last_tick + delay_seconds) / self.tick_seconds))
+        slot = (self._cursor + ticks) % len(self._slots)
+        self._slots[slot][key] = (ticks - 1) // len(self._slots)
+        self._where[key] = slot
+    
+    def cancel(self, key: Any):
+        if (slot := self._where.pop(key, None)) is not None:
+            self._slots[slot].pop(key, None)
+    
+    def advance(self, now: Optional[float] = None) -> List[Any]:
+        """Прокрутить колесо до текущего времени и вернуть истёкшие ключи"""
+        now = time.monotonic() if now is None else now
+        ticks = int((now - self._last_tick) // self.tick_seconds)
+        if ticks <= 0:
+            return []
+        self._last_tick += ticks * self.tick_seconds
+        
+        expired = []
+        for _ in range(ticks):
+            self._cursor = (self._cursor + 1) % len(self._slots)
+            bucket = self._slots[self._cursor]
+            for key, rounds in list(bucket.items()):
+                if rounds:
+                    bucket[key] = rounds - 1
+                else:
+                    del bucket[key]
+                    del self._where[key]
+                    expired.append(key)
+        return expired
+    
+    def __len__(self) -> int:
+        return len(self._where)
+    
+    def __contains__(self, key: Any) -> bool:
+        return key in self._where
+
+class DeadlineScheduler:
+    """Сроки рассмотрения постов: напоминания и истечение на одном колесе таймеров"""
+    
+    def __init__(self, stages_seconds: List[float], tick_seconds: float = 30.0):
+        self.stages = sorted(stages_seconds)  # последний этап — истечение срока
+        self.tick_seconds = tick_seconds
+        self._wheel = TimerWheel(tick_seconds=tick_seconds, slots=1024)
+        self._stage: Dict[int, int] = {}  # post_id -> индекс ближайшего этапа
+    
+    def track(self, post_id: int, age_seconds: float = 0.0):
+        """Поставить пост на контроль с учётом уже прошедшего времени"""
+        stage = min(bisect_right(self.stages, age_seconds), len(self.stages) - 1)
+        self._stage[post_id] = stage
+        self._wheel.schedule(post_id, self.stages[stage] - age_seconds)
+    
+    def untrack(self, post_id: int):
+        self._wheel.cancel(post_id)
+        self._stage.pop(post_id, None)
+    
+    def advance(self) -> tuple[List[int], List[int]]:
+        """Вернуть посты, дошедшие до напоминания, и посты с истёкшим сроком"""
+        reminders, expired = [], []
+        for post_id in self._wheel.advance():
+            stage = self._stage[post_id]
+            if stage == len(self.stages) - 1:
+                del self._stage[post_id]
+                expired.append(post_id)
+            else:
+                reminders.append(post_id)
+                self._stage[post_id] = stage + 1
+                self._wheel.schedule(post_id, self.stages[stage + 1] - self.stages[stage])
+        return reminders, expired
+    
+    def __len__(self) -> int:
+        return len(self._stage)
+
+class CommentSessionManager:
+    """Параллельные черновики комментариев модераторов с таймаутом"""
+    
+    def __init__(self, config: type[BotConfig] = BotConfig, tick_seconds: float = 5.0):
+        self.config = config
+        self.tick_seconds = tick_seconds
+        self._sessions: Dict[tuple[int, int], CommentSession] = {}
+        self._by_prompt: Dict[tuple[int, int], tuple[int, int]] = {}
+        self._by_moderator: Dict[int, Dict[tuple[int, int], None]] = {}
+        self._wheel = TimerWheel(tick_seconds=tick_seconds)
+    
+    def open(self, moderator_id: int, post_id: int, action: str, chat_id: int) -> CommentSession:
+        """Открыть черновик (повторное открытие для того же поста заменяет старый)"""
+        key = (moderator_id, post_id)
+        if old := self._sessions.get(key):
+            self.close(old)
+        session = CommentSession(moderator_id=moderator_id, post_id=post_id, action=action, chat_id=chat_id)
+        self._sessions[key] = session
+        self._by_moderator.setdefault(moderator_id, {})[key] = None
+        self._wheel.schedule(key, self.config.COMMENT_SESSION_MINUTES * 60)
+        return session
+    
+    def attach_prompt(self, session: CommentSession, prompt_message_id: int):
+        session.prompt_message_id = prompt_message_id
+        self._by_prompt[(session.chat_id, prompt_message_id)] = (session.moderator_id, session.post_id)
+    
+    def get_by_prompt(self, chat_id: int, prompt_message_id: int) -> Optional[CommentSession]:
+        key = self._by_prompt.get((chat_id, prompt_message_id))
+        return self._sessions.get(key) if key else None
+    
+    def resolve(self, moderator_id: int, chat_id: int, reply_to_message_id: Optional[int]) -> Optional[CommentSession]:
+        """Черновик по ответу на запрос, иначе — последний открытый в этом чате"""
+        if reply_to_message_id is not None:
+            session = self.get_by_prompt(chat_id, reply_to_message_id)
+            if session and session.moderator_id == moderator_id:
+                return session
+        
+        for key in reversed(self._by_moderator.get(moderator_id, {})):
+            session = self._sessions[key]
+            if session.chat_id == chat_id:
+                return session
+        return None
+    
+    def close(self, session: CommentSession):
+        key = (session.moderator_id, session.post_id)
+        if self._sessions.get(key) is not session:
+            return
+        del self._sessions[key]
+        self._wheel.cancel(key)
+        if session.prompt_message_id is not None:
+            self._by_prompt.pop((session.chat_id, session.prompt_message_id), None)
+        owned = self._by_moderator.get(session.moderator_id)
+        if owned is not None:
+            owned.pop(key, None)
+            if not owned:
+                del self._by_moderator[session.moderator_id]
+    
+    def close_all(self, moderator_id: int, chat_id: int) -> int:
+        """Закрыть все черновики модератора в чате"""
+        sessions = [
+            self._sessions[key] for key in self._by_moderator.get(moderator_id, {})
+            if self._sessions[key].chat_id == chat_id
+        ]
+        for session in sessions:
+            self.close(session)
+        return len(sessions)
+    
+    def expire(self) -> List[CommentSession]:
+        """Закрыть истёкшие черновики и вернуть их"""
+        expired = []
+        for key in self._wheel.advance():
+            if session := self._sessions.get(key):
+                self.close(session)
+                expired.append(session)
+        return expired
+    
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+class NotificationDigest:
+    """Буфер уведомлений авторам: решения за окно склеиваются в одно сообщение"""
+    
+    def __init__(self, config: type[BotConfig] = BotConfig, tick_seconds: float = 1.0):
+        self.config = config
+        self.tick_seconds = tick_seconds
+        self._buffers: Dict[int, List[DecisionNote]] = {}
+        self._wheel = TimerWheel(tick_seconds=tick_seconds)
+    
+    def add(self, user_id: int, note: DecisionNote):
+        """Добавить решение; окно отсчитывается от первого решения в буфере"""
+        buffer = self._buffers.setdefault(user_id, [])
+        buffer.append(note)
+        if len(buffer) == 1:
+            self._wheel.schedule(user_id, self.config.DIGEST_WINDOW_SECONDS)
+    
+    def due(self) -> List[tuple[int, List[DecisionNote]]]:
+        """Забрать буферы, у которых закончилось окно"""
+        return [(user_id, self._buffers.pop(user_id)) for user_id in self._wheel.advance() if user_id in self._buffers]
+    
+    def drain(self) -> List[tuple[int, List[DecisionNote]]]:
+        """Забрать все буферы (при остановке бота)"""
+        for user_id in self._buffers:
+            self._wheel.cancel(user_id)
+        buffers, self._buffers = self._buffers, {}
+        return list(buffers.items())
+    
+    @staticmethod
+    def render(notes: List[DecisionNote]) -> str:
+        """Текст уведомления для одного или нескольких решений (комментарии экранируются)"""
+        if len(notes) == 1:
+            note = notes[0]
+            comment_text = f"\n\n<b>Комментарий модератора:</b>\n{html.quote(note.comment)}" if note.comment else ""
+            if note.approved:
+                return f"✅ <b>Ваша предложка одобрена и опубликована!</b>{comment_text}"
+            return (
+                "❌ <b>Ваша предложка была отклонена модератором</b>\n\n"
+                "Не расстраивайся! Попробуй отправить что-то другое."
+                f"{comment_text}"
+            )
+        
+        approved = sum(1 for note in notes if note.approved)
+        rejected = len(notes) - approved
+        lines = ["📬 <b>Итоги модерации твоих предложек</b>\n"]
+        if approved:
+            lines.append(f"✅ Одобрено: <b>{approved}</b>")
+        if rejected:
+            lines.append(f"❌ Отклонено: <b>{rejected}</b>")
+        
+        comments = [note for note in notes if note.comment]
+        if comments:
+            lines.append("\n<b>Комментарии модераторов:</b>")
+            for note in comments:
+                lines.append(f"{'✅' if note.approved else '❌'} #{note.post_id}: {html.quote(note.comment)}")
+        return "\n".join(lines)
+    
+    def __len__(self) -> int:
+        return len(self._buffers)
+
+class OverflowQueue:
+    """Дисковая очередь ожидания с честным чередованием пользователей"""
+    
+    def __init__(self, path: str, compact_bytes: int = 1024 * 1024):
+        self.path = path
+        self.compact_bytes = compact_bytes
+        self._users: OrderedDict[int, deque[int]] = OrderedDict()  # user_id -> смещения записей
+        self._count = 0
+        self._size = 0  # длина журнала
+        self._dead = 0  # байты выданных записей и отметок о выдаче
+        self._lock = asyncio.Lock()  # файл трогают только в потоках asyncio.to_thread, по одному
+        self._load()
+        self._file = open(self.path, 'a+b')
+    
+    def _load(self):
+        """Восстановить очередь из журнала: записи минус отметки о выдаче"""
+        if not os.path.exists(self.path):
+            return
+        entries: Dict[int, tuple[int, int]] = {}  # смещение -> (user_id, длина строки)
+        done = set()
+        try:
+            with open(self.path, 'rb') as f:
+                offset = 0
+                for line in f:
+                    record = json.loads(line)
+                    if 'done' in record:
+                        done.add(record['done'])
+                    else:
+                        entries[offset] = (record['sub']['user_id'], len(line))
+                    offset += len(line)
+        except (OSError, ValueError, KeyError) as e:
+            logging.error(f"Ошибка загрузки очереди ожидания: {e}")
+        
+        self._size = os.path.getsize(self.path)
+        self._dead = self._size
+        for offset, (user_id, length) in entries.items():
+            if offset not in done:
+                self._users.setdefault(user_id, deque()).append(offset)
+                self._count += 1
+                self._dead -= length
+    
+    def _append(self, line: bytes) -> int:
+        self._file.seek(0, os.SEEK_END)
+        offset = self._file.tell()
+        self._file.write(line)
+        self._file.flush()
+        return offset
+    
+    def _take(self, offset: int, last: bool) -> tuple[bytes, int]:
+        """Прочитать запись и отметить её выданной; вернуть строку и длину отметки"""
+        self._file.seek(offset)
+        line = self._file.readline()
+        if last:
+            self._file.truncate(0)
+            return line, 0
+        tombstone = json.dumps({'done': offset}).encode('utf-8') + b'\n'
+        self._append(tombstone)
+        return line, len(tombstone)
+    
+    def _compact(self, offsets: List[int]) -> Dict[int, int]:
+        """Переписать журнал без выданных записей; вернуть старое смещение -> новое"""
+        moved = {}
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as out:
+            for offset in offsets:
+                self._file.seek(offset)
+                moved[offset] = out.tell()
+                out.write(self._file.readline())
+            out.flush()
+            os.fsync(out.fileno())
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, 'a+b')
+        return moved
+    
+    async def push(self, submission: Submission) -> int:
+        """Сохранить предложку, вернуть примерное место в очереди ожидания"""
+        line = json.dumps({'sub': submission.to_dict()}, ensure_ascii=False).encode('utf-8') + b'\n'
+        async with self._lock:
+            offset = await asyncio.to_thread(self._append, line)
+            self._users.setdefault(submission.user_id, deque()).append(offset)
+            self._count += 1
+            self._size = offset + len(line)
+        return self.position(submission.user_id)
+    
+    async def pop(self) -> Optional[Submission]:
+        """Следующая предложка по кругу пользователей"""
+        async with self._lock:
+            if not self._users:
+                return None
+            user_id, offsets = next(iter(self._users.items()))
+            offset = offsets.popleft()
+            if offsets:
+                self._users.move_to_end(user_id)
+            else:
+                del self._users[user_id]
+            self._count -= 1
+            
+            line, tombstone = await asyncio.to_thread(self._take, offset, self._count == 0)
+            if self._count == 0:
+                self._size = self._dead = 0
+            else:
+                self._size += tombstone
+                self._dead += len(line) + tombstone
+                # Под постоянной нагрузкой очередь не пустеет — сжимаем по доле мёртвых записей
+                if self._dead >= max(self.compact_bytes, self._size // 2):
+                    await self._compact_locked()
+        return Submission.from_dict(json.loads(line)['sub'])
+    
+    async def _compact_locked(self):
+        live = sorted(offset for offsets in self._users.values() for offset in offsets)
+        moved = await asyncio.to_thread(self._compact, live)
+        for offsets in self._users.values():
+            remapped = [moved[offset] for offset in offsets]
+            offsets.clear()
+            offsets.extend(remapped)
+        self._size -= self._dead
+        self._dead = 0
+        logging.info(f"Очередь ожидания сжата: {self._count} записей, {self._size} байт")
+    
+    def count_for(self, user_id: int) -> int:
+        return len(self._users.get(user_id, ()))
+    
+    def position(self, user_id: int) -> int:
+        """Место последней предложки пользователя при круговой выдаче"""
+        own = len(self._users.get(user_id, ()))
+        if not own:
+            return 0
+        ahead = 0
+        for other_id, offsets in self._users.items():
+            if other_id == user_id:
+                continue
+            ahead += min(len(offsets), own)
+        return ahead + own
+    
+    def __len__(self) -> int:
+        return self._count
+    
+    def close(self):
+        self._file.close()
+
+class _AuditSegment:
+    """Запечатанный сегмент журнала аудита с индексом, отображённым в память"""
+    
+    def __init__(self, path: str, first_seq: int, last_seq: int):
+        self.path = path
+        self.first_seq = first_seq
+        self.last_seq = last_seq
+        with open(AuditLog.index_path(path), 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _, n_posts, n_moderators, _ = AuditLog.INDEX_HEADER.unpack_from(self._mm)
+        self._view = memoryview(self._mm)[AuditLog.INDEX_HEADER.size:].cast('q')
+        bounds = (0, n_posts, 2 * n_posts, 2 * n_posts + n_moderators, 2 * (n_posts + n_moderators))
+        self.post_keys, self.post_offsets, self.moderator_keys, self.moderator_offsets = (
+            self._view[start:end] for start, end in zip(bounds, bounds[1:])
+        )
+    
+    @staticmethod
+    def _lookup(keys: memoryview, offsets: memoryview, key: int) -> memoryview:
+        return offsets[bisect_left(keys, key):bisect_right(keys, key)]
+    
+    def post_offsets_for(self, post_id: int) -> memoryview:
+        return self._lookup(self.post_keys, self.post_offsets, post_id)
+    
+    def moderator_offsets_for(self, moderator_id: int) -> memoryview:
+        return self._lookup(self.moderator_keys, self.moderator_offsets, moderator_id)
+    
+    def close(self):
+        for view in (self.post_keys, self.post_offsets, self.moderator_keys, self.moderator_offsets, self._view):
+            view.release()
+        self._mm.close()
+
+class AuditLog:
+    """Журнал модерации только на дозапись: JSONL-сегменты и индексы post_id/модератор -> смещение"""
+    
+    INDEX_HEADER = struct.Struct('<4s4xqqq')  # магия, постов, записей модераторов, размер сегмента
+    INDEX_MAGIC = b'AIX1'
+    _SEGMENT_RE = re.compile(r'^segment-(\d+)(?:-(\d+))?\.jsonl$')
+    
+    def __init__(self, directory: str, segment_bytes: int):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._sealed: List[_AuditSegment] = []
+        self._active_posts: Dict[int, List[int]] = {}
+        self._active_moderators: Dict[int, List[int]] = {}
+        self._compacting = False
+        self._load()
+    
+    @staticmethod
+    def index_path(segment_path: str) -> str:
+        return segment_path[:-len('.jsonl')] + '.idx'
+    
+    def _segment_path(self, first_seq: int, last_seq: Optional[int] = None) -> str:
+        name = f"segment-{first_seq:06d}" + (f"-{last_seq:06d}" if last_seq is not None else "")
+        return os.path.join(self.directory, f"{name}.jsonl")
+    
+    def _load(self):
+        """Найти сегменты, убрать покрытые сжатыми, достроить недостающие индексы"""
+        found = []
+        for name in os.listdir(self.directory):
+            if match := self._SEGMENT_RE.match(name):
+                first_seq = int(match.group(1))
+                path = os.path.join(self.directory, name)
+                if match.group(2) and not os.path.exists(self.index_path(path)):
+                    self._remove_segment(path)  # сжатие прервано до записи индекса
+                    continue
+                found.append((first_seq, int(match.group(2) or first_seq), path))
+        
+        # Сжатый сегмент покрывает диапазон: исходники, пережившие сбой, удаляем
+        found.sort(key=lambda item: (item[0], -item[1]))
+        segments = []
+        for first_seq, last_seq, path in found:
+            if segments and last_seq <= segments[-1][1]:
+                self._remove_segment(path)
+            else:
+                segments.append((first_seq, last_seq, path))
+        
+        if segments:
+            *sealed, (active_seq, _, active_path) = segments
+        else:
+            sealed, active_seq, active_path = [], 1, self._segment_path(1)
+        for first_seq, last_seq, path in sealed:
+            if not self._index_valid(path):
+                self._write_index(path, *self._scan(path))
+            self._sealed.append(_AuditSegment(path, first_seq, last_seq))
+        
+        self._active_seq = active_seq
+        self._active_path = active_path
+        if os.path.exists(active_path):
+            self._active_posts, self._active_moderators = self._scan(active_path)
+        self._file = open(active_path, 'a+b')
+    
+    def _index_valid(self, path: str) -> bool:
+        try:
+            with open(self.index_path(path), 'rb') as f:
+                magic, _, _, size = self.INDEX_HEADER.unpack(f.read(self.INDEX_HEADER.size))
+            return magic == self.INDEX_MAGIC and size == os.path.getsize(path)
+        except (OSError, struct.error):
+            return False
+    
+    @staticmethod
+    def _remove_segment(path: str):
+        for stale in (path, AuditLog.index_path(path)):
+            with suppress(FileNotFoundError):
+                os.remove(stale)
+    
+    @staticmethod
+    def _scan(path: str, base: int = 0, posts: Optional[Dict[int, List[int]]] = None,
+              moderators: Optional[Dict[int, List[int]]] = None) -> tuple[Dict[int, List[int]], Dict[int, List[int]]]:
+        """Построить индексы сегмента чтением с диска"""
+        posts = {} if posts is None else posts
+        moderators = {} if moderators is None else moderators
+        offset = base
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logging.error(f"Повреждённая запись аудита в {path} @ {offset - base}")
+                else:
+                    posts.setdefault(record['post'], []).append(offset)
+                    if 'mod' in record:
+                        moderators.setdefault(record['mod'], []).append(offset)
+                offset += len(line)
+        return posts, moderators
+    
+    @classmethod
+    def _write_index(cls, path: str, posts: Dict[int, List[int]], moderators: Dict[int, List[int]]):
+        """Отсортированные пары ключ/смещение в компактном бинарном файле"""
+        columns = []
+        for index in (posts, moderators):
+            keys, offsets = array('q'), array('q')
+            for key in sorted(index):
+                keys.extend([key] * len(index[key]))
+                offsets.extend(index[key])
+            columns.append((keys, offsets))
+        (post_keys, post_offsets), (moderator_keys, moderator_offsets) = columns
+        tmp_path = f"{cls.index_path(path)}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(cls.INDEX_HEADER.pack(cls.INDEX_MAGIC, len(post_keys), len(moderator_keys), os.path.getsize(path)))
+            for column in (post_keys, post_offsets, moderator_keys, moderator_offsets):
+                f.write(column.tobytes())
+        os.replace(tmp_path, cls.index_path(path))
+    
+    def append(self, record: Dict[str, Any]):
+        """Дописать событие в активный сегмент"""
+        record = {'ts': round(time.time(), 3), **record}
+        self._file.seek(0, os.SEEK_END)
+        offset = self._file.tell()
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n')
+        self._file.flush()
+        self._active_posts.setdefault(record['post'], []).append(offset)
+        if 'mod' in record:
+            self._active_moderators.setdefault(record['mod'], []).append(offset)
+        if offset >= self.segment_bytes:
+            self._seal()
+    
+    def _seal(self):
+        """Запечатать активный сегмент и начать следующий"""
+        self._file.close()
+        self._write_index(self._active_path, self._active_posts, self._active_moderators)
+        self._sealed.append(_AuditSegment(self._active_path, self._active_seq, self._active_seq))
+        self._active_seq = self._sealed[-1].last_seq + 1
+        self._active_path = self._segment_path(self._active_seq)
+        self._active_posts, self._active_moderators = {}, {}
+        self._file = open(self._active_path, 'a+b')
+    
+    @staticmethod
+    def _read(path: str, offsets: Iterable[int]) -> List[Dict[str, Any]]:
+        records = []
+        with open(path, 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                records.append(json.loads(f.readline()))
+        return records
+    
+    def post_history(self, post_id: int) -> List[Dict[str, Any]]:
+        """Все события поста в хронологическом порядке"""
+        records = []
+        for segment in self._sealed:
+            if offsets := segment.post_offsets_for(post_id):
+                records.extend(self._read(segment.path, offsets))
+        if offsets := self._active_posts.get(post_id):
+            self._file.flush()
+            records.extend(self._read(self._active_path, offsets))
+        return records
+    
+    def moderator_history(self, moderator_id: int, limit: int = 20) -> List[Dict[str, Any]]:
+        """Последние решения модератора, новые первыми"""
+        records = []
+        sources = [(self._active_path, self._active_moderators.get(moderator_id, []))]
+        sources += [(segment.path, segment.moderator_offsets_for(moderator_id)) for segment in reversed(self._sealed)]
+        for path, offsets in sources:
+            wanted = list(offsets[::-1][:limit - len(records)])
+            if wanted:
+                records.extend(self._read(path, wanted))
+            if len(records) >= limit:
+                break
+        return records
+    
+    def compaction_candidates(self, max_segments: int) -> List[_AuditSegment]:
+        """Самые старые сегменты, которые стоит слить в один"""
+        if self._compacting or len(self._sealed) <= max_segments:
+            return []
+        return self._sealed[:len(self._sealed) - max_segments + 1]
+    
+    def compact_files(self, segments: List[_AuditSegment]) -> str:
+        """Слить сегменты в один с новым индексом (выполняется в потоке)"""
+        path = self._segment_path(segments[0].first_seq, segments[-1].last_seq)
+        tmp_path = f"{path}.tmp"
+        posts: Dict[int, List[int]] = {}
+        moderators: Dict[int, List[int]] = {}
+        with open(tmp_path, 'wb') as out:
+            for segment in segments:
+                base = out.tell()
+                with open(segment.path, 'rb') as f:
+                    shutil.copyfileobj(f, out)
+                self._scan(segment.path, base, posts, moderators)
+        os.replace(tmp_path, path)
+        # Индекс пишется последним: сжатый сегмент без индекса при загрузке считается незавершённым
+        self._write_index(path, posts, moderators)
+        return path
+    
+    async def compact(self, max_segments: int):
+        """Фоновое сжатие старых сегментов"""
+        segments = self.compaction_candidates(max_segments)
+        if not segments:
+            return
+        self._compacting = True
+        try:
+            path = await asyncio.to_thread(self.compact_files, segments)
+            merged = _AuditSegment(path, segments[0].first_seq, segments[-1].last_seq)
+            self._sealed[:len(segments)] = [merged]
+            for segment in segments:
+                segment.close()
+                self._remove_segment(segment.path)
+            logging.info(f"Журнал аудита: сжато сегментов {len(segments)} -> {os.path.basename(path)}")
+        finally:
+            self._compacting = False
+    
+    def close(self):
+        self._file.close()
+        for segment in self._sealed:
+            segment.close()
+
+class PostArchive:
+    """Архив решённых постов в SQLite: FTS5 по подписям и комментариям, индексы по автору и дате"""
+    
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS posts (
+            id INTEGER PRIMARY KEY,
+            post_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            username TEXT,
+            content_type TEXT NOT NULL,
+            file_id TEXT NOT NULL,
+            file_unique_id TEXT,
+            caption TEXT,
+            comment TEXT,
+            outcome TEXT NOT NULL,
+            moderator_id INTEGER,
+            submitted_at REAL NOT NULL,
+            decided_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS posts_user ON posts (user_id, decided_at);
+        CREATE INDEX IF NOT EXISTS posts_date ON posts (decided_at);
+        CREATE INDEX IF NOT EXISTS posts_file ON posts (file_unique_id) WHERE file_unique_id IS NOT NULL;
+        CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5 (
+            caption, comment, content='posts', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='3 4 5 6 7 8'
+        );
+        CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN
+            INSERT INTO posts_fts (rowid, caption, comment) VALUES (new.id, new.caption, new.comment);
+        END;
+    """
+    MAX_PREFIX = 8
+    _COLUMNS = ('id', 'post_id', 'user_id', 'username', 'content_type', 'file_id', 'caption', 'comment',
+                'outcome', 'moderator_id', 'decided_at')
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self._SCHEMA)
+        self._lock = threading.Lock()  # запросы выполняются в потоках asyncio.to_thread
+    
+    def add(self, post: PendingPost, outcome: str, moderator_id: Optional[int], comment: str = ""):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO posts (post_id, user_id, username, content_type, file_id, file_unique_id, caption, "
+                "comment, outcome, moderator_id, submitted_at, decided_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (post.original_message_id, post.user_id, post.username, post.content_type.value, post.file_id,
+                 post.file_unique_id, post.caption, comment or None, outcome, moderator_id,
+                 post.timestamp.timestamp(), time.time())
+            )
+    
+    def find_duplicate(self, file_unique_id: Optional[str]) -> Optional[sqlite3.Row]:
+        """Последняя публикация того же файла"""
+        if not file_unique_id:
+            return None
+        with self._lock:
+            return self._db.execute(
+                "SELECT * FROM posts WHERE file_unique_id = ? AND outcome = 'approved' ORDER BY decided_at DESC LIMIT 1",
+                (file_unique_id,)
+            ).fetchone()
+    
+    def get(self, row_id: int) -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self._db.execute("SELECT * FROM posts WHERE id = ?", (row_id,)).fetchone()
+    
+    @classmethod
+    def parse_query(cls, query: str) -> tuple[str, Optional[int], Optional[float]]:
+        """Разобрать запрос: слова для FTS, user:<id>, since:<ДД.ММ.ГГГГ>"""
+        words, user_id, since = [], None, None
+        for token in query.split():
+            key, _, value = token.partition(':')
+            if key == 'user' and value.isdigit():
+                user_id = int(value)
+            elif key == 'since' and value:
+                with suppress(ValueError):
+                    since = datetime.strptime(value, '%d.%m.%Y').timestamp()
+            else:
+                # Слово — фраза (спецсинтаксис FTS5 недоступен), от 3 букв — префикс. Длинные слова
+                # режем до MAX_PREFIX: такие префиксы есть в индексе, а окончания всё равно меняются
+                token = token.replace('"', '')[:cls.MAX_PREFIX]
+                if token:
+                    words.append(f'"{token}"' + ('*' if len(token) >= 3 else ''))
+        return " ".join(words), user_id, since
+    
+    def search(self, query: str, offset: int = 0, limit: int = 10) -> tuple[List[sqlite3.Row], bool]:
+        """Страница результатов (новые первыми) и признак следующей страницы"""
+        match, user_id, since = self.parse_query(query)
+        conditions, params = [], []
+        if user_id is not None:
+            conditions.append("p.user_id = ?")
+            params.append(user_id)
+        if since is not None:
+            conditions.append("p.decided_at >= ?")
+            params.append(since)
+        columns = ", ".join(f"p.{column}" for column in self._COLUMNS)
+        if match:
+            sql = f"SELECT {columns} FROM posts_fts f JOIN posts p ON p.id = f.rowid WHERE posts_fts MATCH ?"
+            params.insert(0, match)
+        else:
+            sql = f"SELECT {columns} FROM posts p WHERE 1"
+        # С автором идём по индексу posts_user; иначе по rowid, который FTS5 отдаёт без сортировки совпадений
+        order = "p.decided_at DESC" if user_id is not None or not match else "f.rowid DESC"
+        sql += "".join(f" AND {condition}" for condition in conditions) + f" ORDER BY {order} LIMIT ? OFFSET ?"
+        with self._lock:
+            rows = self._db.execute(sql, (*params, limit + 1, offset)).fetchall()
+        return rows[:limit], len(rows) > limit
+    
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+class QuantileSketch:
+    """Потоковый квантильный скетч (DDSketch): логарифмические корзины с относительной точностью"""
+    
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self._buckets: Dict[int, int] = {}
+        self._zeros = 0
+        self.count = 0
+    
+    def add(self, value: float):
+        self.count += 1
+        if value <= 0:
+            self._zeros += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self._buckets[key] = self._buckets.get(key, 0) + 1
+    
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self._zeros
+        if rank < seen:
+            return 0.0
+        for key in sorted(self._buckets):
+            seen += self._buckets[key]
+            if seen > rank:
+                # Середина корзины (gamma^(k-1), gamma^k] даёт ошибку не больше relative_accuracy
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return None
+
+class ModerationAnalytics:
+    """Инкрементальная аналитика модерации по событиям решений"""
+    
+    DAYS_KEPT = 30
+    
+    def __init__(self):
+        self.latency = QuantileSketch()
+        self._moderators: Dict[int, Dict[str, Any]] = {}  # id -> {'name', 'decisions', 'approved', 'latency'}
+        self._by_hour = [[0, 0] for _ in range(24)]  # [одобрено, всего] по часу суток
+        self._by_day: OrderedDict[str, List[int]] = OrderedDict()  # 'YYYY-MM-DD' -> [одобрено, всего]
+        self._submitters: Dict[int, int] = {}
+        self.expired = 0
+    
+    def record_submission(self, user_id: int):
+        self._submitters[user_id] = self._submitters.get(user_id, 0) + 1
+    
+    def record_expiry(self):
+        self.expired += 1
+    
+    def record_decision(self, moderator_id: int, moderator_name: str, approved: bool,
+                        latency_seconds: float, when: Optional[datetime] = None):
+        when = when or datetime.now()
+        self.latency.add(latency_seconds)
+        
+        moderator = self._moderators.get(moderator_id)
+        if moderator is None:
+            moderator = self._moderators[moderator_id] = {
+                'name': moderator_name, 'decisions': 0, 'approved': 0, 'latency': QuantileSketch()
+            }
+        moderator['name'] = moderator_name
+        moderator['decisions'] += 1
+        moderator['approved'] += approved
+        moderator['latency'].add(latency_seconds)
+        
+        hour = self._by_hour[when.hour]
+        hour[0] += approved
+        hour[1] += 1
+        
+        day_key = when.strftime('%Y-%m-%d')
+        day = self._by_day.get(day_key)
+        if day is None:
+            day = self._by_day[day_key] = [0, 0]
+            while len(self._by_day) > self.DAYS_KEPT:
+                self._by_day.popitem(last=False)
+        day[0] += approved
+        day[1] += 1
+    
+    def latency_percentiles(self) -> Dict[str, Optional[float]]:
+        return {name: self.latency.quantile(q) for name, q in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99))}
+    
+    def moderator_rows(self) -> List[Dict[str, Any]]:
+        """Модераторы по числу решений: имя, решений, доля одобрений, медиана реакции"""
+        return sorted((
+            {
+                'id': moderator_id,
+                'name': moderator['name'],
+                'decisions': moderator['decisions'],
+                'approval_rate': moderator['approved'] / moderator['decisions'],
+                'p50': moderator['latency'].quantile(0.5),
+            }
+            for moderator_id, moderator in self._moderators.items()
+        ), key=lambda row: row['decisions'], reverse=True)
+    
+    def approval_by_hour(self) -> List[Optional[float]]:
+        return [approved / total if total else None for approved, total in self._by_hour]
+    
+    def approval_by_day(self) -> List[tuple[str, float, int]]:
+        return [(day, approved / total, total) for day, (approved, total) in sorted(self._by_day.items()) if total]
+    
+    def top_submitters(self, limit: int = 10) -> List[tuple[int, int]]:
+        return heapq.nlargest(limit, self._submitters.items(), key=lambda item: item[1])
+    
+    def report_data(self) -> Dict[str, Any]:
+        """Небольшой снимок для отрисовки в потоке, пока цикл событий пополняет статистику"""
+        return {
+            'percentiles': self.latency_percentiles(),
+            'moderators': self.moderator_rows()[:10],
+            'by_hour': self.approval_by_hour(),
+            'submitters': self.top_submitters(),
+        }
+    
+    @staticmethod
+    def render_report(data: Dict[str, Any], path: str) -> bool:
+        """Нарисовать отчёт в PNG (выполняется в потоке); False, если нет matplotlib"""
+        if Figure is None:
+            return False
+        figure = Figure(figsize=(12, 9), dpi=100)
+        FigureCanvasAgg(figure)
+        (latency_ax, moderators_ax), (hours_ax, submitters_ax) = figure.subplots(2, 2)
+        
+        percentiles = data['percentiles']
+        latency_ax.bar(list(percentiles), [(value or 0) / 60 for value in percentiles.values()], color='#4c72b0')
+        latency_ax.set_title('Время до решения, мин')
+        
+        moderators = data['moderators']
+        moderators_ax.barh([row['name'] for row in moderators][::-1], [row['decisions'] for row in moderators][::-1],
+                           color='#55a868')
+        moderators_ax.set_title('Решений по модераторам')
+        
+        by_hour = data['by_hour']
+        hours_ax.plot(range(24), [rate * 100 if rate is not None else float('nan') for rate in by_hour], marker='o')
+        hours_ax.set_xticks(range(0, 24, 3))
+        hours_ax.set_ylim(0, 100)
+        hours_ax.set_title('Одобрено по часам, %')
+        
+        submitters = data['submitters']
+        submitters_ax.barh([str(user_id) for user_id, _ in submitters][::-1], [count for _, count in submitters][::-1],
+                           color='#dd8452')
+        submitters_ax.set_title('Самые активные авторы')
+        
+        figure.tight_layout()
+        figure.savefig(path, format='png')
+        return True
+
+class MediaAnalyzer:
+    """Эвристики по медиа в пуле процессов: ограниченная очередь и кеш по file_unique_id"""
+    BLANK_STDDEV = 6.0
+    WATERMARK_RATIO = 2.5  # плотность границ в углу относительно всего кадра
+    OVERLAY_RATIO = 2.0  # то же для верхней/нижней полосы во всю ширину
+    
+    def __init__(self, config: type[BotConfig] = BotConfig, pool: Optional[ProcessPoolExecutor] = None):
+        self.config = config
+        self.enabled = config.MEDIA_ANALYSIS_ENABLED and Image is not None
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=config.MEDIA_ANALYSIS_QUEUE)
+        self.dropped = 0
+        self._cache: OrderedDict[str, Dict[str, Any]] = OrderedDict()
+        self._hashes: OrderedDict[int, tuple[int, float]] = OrderedDict()  # post_id -> (dHash, время предложки)
+        # Хеши на расстоянии ≤ D совпадают хотя бы в одной из D + 1 полос — кандидатов ищем по полосам
+        self._bands = self._split_bands(config.MEDIA_SIMILAR_DISTANCE + 1)
+        self._band_index: List[Dict[int, set[int]]] = [{} for _ in self._bands]
+        # Общий пул процесса передаёт владелец (MultiTenantRunner), иначе создаём свой при первом анализе
+        self._pool = pool
+        self._owns_pool = pool is None
+    
+    @staticmethod
+    def _split_bands(count: int) -> List[tuple[int, int]]:
+        """64 бита dHash -> count полос (сдвиг, маска)"""
+        count = max(1, min(count, 64))
+        bands, shift = [], 0
+        for i in range(count):
+            width = 64 // count + (i < 64 % count)
+            bands.append((shift, (1 << width) - 1))
+            shift += width
+        return bands
+    
+    @classmethod
+    def inspect(cls, data: bytes) -> Dict[str, Any]:
+        """Выполняется в процессе пула, поэтому без состояния"""
+        with Image.open(io.BytesIO(data)) as image:
+            image.draft('L', (512, 512))  # JPEG сразу декодируется в уменьшенном виде
+            gray = image.convert('L')
+        gray.thumbnail((512, 512))
+        flags = []
+        if ImageStat.Stat(gray).stddev[0] < cls.BLANK_STDDEV:
+            flags.append('blank')
+        elif min(gray.size) >= 64:
+            edges = gray.filter(ImageFilter.FIND_EDGES)
+            w, h = edges.size
+            edges = edges.crop((1, 1, w - 1, h - 1))  # рамка фильтра даёт ложные границы
+            w, h = edges.size
+            overall = ImageStat.Stat(edges).mean[0] or 1.0
+            
+            def density(box: tuple[int, int, int, int]) -> float:
+                return ImageStat.Stat(edges.crop(box)).mean[0] / overall
+            
+            cw, bh = w * 3 // 10, h // 7
+            bands = {0: density((0, 0, w, bh)), h - bh: density((0, h - bh, w, h))}
+            if max(bands.values()) >= cls.OVERLAY_RATIO:
+                flags.append('overlay')
+            # Водяной знак — плотный угол на фоне спокойной полосы, а не кусок строки текста
+            for top, band in bands.items():
+                corner = max(density((0, top, cw, top + bh)), density((w - cw, top, w, top + bh)))
+                if corner >= cls.WATERMARK_RATIO and corner >= 1.5 * band:
+                    flags.append('watermark')
+                    break
+        
+        pixels = gray.resize((9, 8)).tobytes()
+        dhash = 0
+        for row in range(8):
+            for col in range(8):
+                dhash = dhash << 1 | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+        return {'flags': flags, 'dhash': dhash}
+    
+    def submit(self, post_id: int, submission: Submission) -> bool:
+        """Поставить в очередь, не дожидаясь места: приём предложек не тормозит"""
+        if not self.enabled:
+            return False
+        try:
+            self.queue.put_nowait((post_id, submission))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+    
+    async def analyze(self, data: bytes) -> Dict[str, Any]:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.config.MEDIA_ANALYSIS_WORKERS)
+        return await asyncio.get_running_loop().run_in_executor(self._pool, self.inspect, data)
+    
+    def cached(self, file_unique_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        if file_unique_id not in self._cache:
+            return None
+        self._cache.move_to_end(file_unique_id)
+        return self._cache[file_unique_id]
+    
+    def remember(self, file_unique_id: Optional[str], result: Dict[str, Any]):
+        if not file_unique_id:
+            return
+        self._cache[file_unique_id] = result
+        if len(self._cache) > self.config.MEDIA_ANALYSIS_CACHE:
+            self._cache.popitem(last=False)
+    
+    def find_similar(self, post_id: int, dhash: int) -> Optional[int]:
+        """Последний пост с близким dHash (только поиск, история не меняется)"""
+        candidates = set()
+        for (shift, mask), index in zip(self._bands, self._band_index):
+            candidates |= index.get(dhash >> shift & mask, set())
+        candidates.discard(post_id)
+        matches = [
+            other_id for other_id in candidates
+            if (dhash ^ self._hashes[other_id][0]).bit_count() <= self.config.MEDIA_SIMILAR_DISTANCE
+        ]
+        # id сообщений нумеруются в каждом личном чате отдельно — последний определяем по времени
+        return max(matches, key=lambda other_id: (self._hashes[other_id][1], other_id), default=None)
+    
+    def add_hash(self, post_id: int, dhash: int, timestamp: float):
+        """Запомнить хеш поста для будущих сравнений"""
+        if post_id in self._hashes:
+            return
+        self._hashes[post_id] = (dhash, timestamp)
+        self._index_hash(post_id, dhash, add=True)
+        if len(self._hashes) > self.config.MEDIA_SIMILAR_HISTORY:
+            old_id, (old_hash, _) = self._hashes.popitem(last=False)
+            self._index_hash(old_id, old_hash, add=False)
+    
+    def _index_hash(self, post_id: int, dhash: int, add: bool):
+        for (shift, mask), index in zip(self._bands, self._band_index):
+            key = dhash >> shift & mask
+            if add:
+                index.setdefault(key, set()).add(post_id)
+            elif bucket := index.get(key):
+                bucket.discard(post_id)
+                if not bucket:
+                    del index[key]
+    
+    def describe(self, post_id: int, submission: Submission, result: Optional[Dict[str, Any]]) -> List[str]:
+        notes = []
+        if submission.width and min(submission.width, submission.height) < self.config.MEDIA_MIN_SIDE_PX:
+            notes.append(f"маленькое разрешение {submission.width}×{submission.height}")
+        if result is None:
+            return notes
+        flags = set(result['flags'])
+        suffix = " (по превью)" if submission.content_type == ContentType.VIDEO else ""
+        if 'blank' in flags:
+            notes.append(f"пустое или однотонное изображение{suffix}")
+        if 'watermark' in flags:
+            notes.append(f"возможен водяной знак в углу{suffix}")
+        if 'overlay' in flags:
+            notes.append(f"возможен текст поверх кадра{suffix}")
+        if 'blank' not in flags and (similar := self.find_similar(post_id, result['dhash'])) is not None:
+            notes.append(f"похоже на #{similar}")
+        return notes
+    
+    def shutdown(self):
+        """Остановить собственный пул; общий останавливает его владелец"""
+        if self._pool is not None and self._owns_pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+class _LivenessHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != '/healthz':
+            self.send_error(404)
+            return
+        status = self.server.watchdog.status()
+        body = json.dumps(status).encode()
+        self.send_response(200 if status['alive'] else 503)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass  # опросы супервизора не засоряют лог
+
+class LoopWatchdog:
+    """Задержка цикла событий, стек зависшего кода и liveness-эндпоинт для супервизора"""
+    ASYNCIO_DIR = os.path.dirname(asyncio.__file__)
+    
+    def __init__(self, config: type[BotConfig], on_stall: Callable[[float, Optional[str]], Awaitable[None]]):
+        self.config = config
+        self.on_stall = on_stall
+        self.heartbeat = time.monotonic()
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._stack: Optional[str] = None
+        self._thread_id: Optional[int] = None
+        self._last_alert = -math.inf
+        self._alert_task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._server: Optional[ThreadingHTTPServer] = None
+    
+    async def run(self):
+        """Пульс цикла: насколько позже запланированного просыпается sleep"""
+        interval = self.config.LOOP_LAG_INTERVAL_SECONDS
+        self._thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        threading.Thread(target=self._watch, name='loop-watchdog', daemon=True).start()
+        self._start_liveness()
+        try:
+            while True:
+                started = time.monotonic()
+                await asyncio.sleep(interval)
+                self.heartbeat = time.monotonic()
+                self.lag = self.heartbeat - started - interval
+                self.max_lag = max(self.max_lag, self.lag)
+                if self.lag >= self.config.LOOP_LAG_THRESHOLD_SECONDS:
+                    self._report()
+        finally:
+            self._stop.set()
+            if self._server:
+                # shutdown() ждёт конца serve_forever — не блокируем цикл на время опроса
+                await asyncio.to_thread(self._server.shutdown)
+                self._server.server_close()
+                self._server = None
+    
+    def _watch(self):
+        """Поток-сторож: пока цикл стоит, снимает стек того, что его держит"""
+        limit = self.config.LOOP_LAG_INTERVAL_SECONDS + self.config.LOOP_LAG_THRESHOLD_SECONDS
+        while not self._stop.wait(self.config.LOOP_LAG_THRESHOLD_SECONDS / 4):
+            if self._stack is None and time.monotonic() - self.heartbeat >= limit:
+                if frame := sys._current_frames().get(self._thread_id):
+                    frames = traceback.extract_stack(frame)
+                    # Кадры самого asyncio неинтересны — оставляем код, вызванный циклом
+                    start = max((i + 1 for i, f in enumerate(frames) if f.filename.startswith(self.ASYNCIO_DIR)), default=0)
+                    self._stack = "".join(traceback.format_list(frames[start:] or frames))
+    
+    def _report(self):
+        stack, self._stack = self._stack, None
+        self.stalls += 1
+        logging.warning(f"Цикл событий простоял {self.lag:.2f} с" + (f", стек:\n{stack}" if stack else ""))
+        if time.monotonic() - self._last_alert < self.config.LOOP_LAG_ALERT_MINUTES * 60:
+            return
+        self._last_alert = time.monotonic()
+        # Отправка идёт отдельной задачей, чтобы не сбивать замер пульса
+        self._alert_task = asyncio.create_task(self._alert(self.lag, stack))
+    
+    async def _alert(self, lag: float, stack: Optional[str]):
+        try:
+            await self.on_stall(lag, stack)
+        except Exception as e:
+            logging.error(f"Не удалось предупредить о зависании цикла: {e}")
+    
+    def _start_liveness(self):
+        if not self.config.LIVENESS_PORT:
+            return
+        try:
+            self._server = ThreadingHTTPServer((self.config.LIVENESS_HOST, self.config.LIVENESS_PORT), _LivenessHandler)
+        except OSError as e:
+            logging.error(f"Liveness-эндпоинт не запущен: {e}")
+            return
+        self._server.daemon_threads = True
+        self._server.watchdog = self
+        threading.Thread(target=self._server.serve_forever, name='liveness', daemon=True).start()
+    
+    def status(self) -> Dict[str, Any]:
+        """Отвечает из своего потока, поэтому работает и при зависшем цикле"""
+        age = time.monotonic() - self.heartbeat
+        return {
+            'alive': age < self.config.LIVENESS_STALE_SECONDS,
+            'heartbeat_age': round(age, 3),
+            'lag_ms': round(self.lag * 1000, 1),
+            'max_lag_ms': round(self.max_lag * 1000, 1),
+            'stalls': self.stalls,
+        }
+
+class SamplingProfiler:
+    """Сэмплирующий профайлер потока цикла событий: поток-сэмплер живёт только во время замера"""
+    IDLE_FILES = ('selectors.py', 'windows_events.py')  # цикл ждёт событий
+    
+    def __init__(self, thread_id: int, interval: float = 0.005, slowest: int = 5):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self.total_us = 0
+        self.idle_us = 0
+        self._stacks: Dict[tuple, int] = {}  # стек -> микросекунды
+        self._slowest: List[tuple[float, str]] = []  # мин-куча самых долгих обработчиков
+        self._slowest_limit = slowest
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+    
+    def start(self):
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+    
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            # Занятый цикл дольше не отдаёт GIL, поэтому сэмпл весит прошедшее с прошлого время
+            now = time.perf_counter()
+            weight, last = int((now - last) * 1_000_000), now
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            if not stack:
+                continue
+            self.samples += 1
+            self.total_us += weight
+            if os.path.basename(stack[0].co_filename) in self.IDLE_FILES:
+                self.idle_us += weight
+                continue
+            stack.reverse()
+            key = tuple(stack)
+            self._stacks[key] = self._stacks.get(key, 0) + weight
+    
+    def record_handler(self, name: str, seconds: float):
+        if len(self._slowest) < self._slowest_limit:
+            heapq.heappush(self._slowest, (seconds, name))
+        else:
+            heapq.heappushpop(self._slowest, (seconds, name))
+    
+    def slowest_handlers(self) -> List[tuple[float, str]]:
+        return sorted(self._slowest, reverse=True)
+    
+    @staticmethod
+    def _label(code) -> str:
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    
+    def hot_functions(self, limit: int = 15) -> List[tuple[str, int, int]]:
+        """(функция, собственное время, время вместе с вызовами) в микросекундах"""
+        own: Dict[Any, int] = {}
+        total: Dict[Any, int] = {}
+        for stack, count in self._stacks.items():
+            own[stack[-1]] = own.get(stack[-1], 0) + count
+            for code in set(stack):
+                total[code] = total.get(code, 0) + count
+        top = sorted(own, key=own.get, reverse=True)[:limit]
+        return [(self._label(code), own[code], total[code]) for code in top]
+    
+    def collapsed(self) -> str:
+        """Стеки в формате flamegraph.pl / speedscope: «a;b;c микросекунды»"""
+        return "".join(f"{';'.join(map(self._label, stack))} {count}\n" for stack, count in self._stacks.items())
+
+class AudienceIndex:
+    """Компактный персистентный индекс получателей рассылок"""
+    
+    FLAG_BLOCKED = 1
+    FLAG_DEACTIVATED = 2
+    _HEADER = struct.Struct('<4sI')
+    _MAGIC = b'AUD1'
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._ids = array('q')         # отсортированные user_id
+        self._last_seen = array('I')   # unix-время последней активности
+        self._flags = bytearray()      # битовые флаги недоступности
+        self._dirty = False
+        self.load()
+    
+    def _find(self, user_id: int) -> tuple[int, bool]:
+        pos = bisect_left(self._ids, user_id)
+        return pos, pos < len(self._ids) and self._ids[pos] == user_id
+    
+    def touch(self, user_id: int, create: bool = True):
+        """Отметить активность пользователя (он снова доступен)"""
+        pos, found = self._find(user_id)
+        now = int(time.time())
+        if found:
+            self._last_seen[pos] = now
+            self._flags[pos] = 0
+        elif create:
+            self._ids.insert(pos, user_id)
+            self._last_seen.insert(pos, now)
+            self._flags.insert(pos, 0)
+        else:
+            return
+        self._dirty = True
+    
+    def mark_unreachable(self, user_id: int, deactivated: bool = False):
+        """Запомнить 403: бот заблокирован или аккаунт удалён"""
+        pos, found = self._find(user_id)
+        if not found:
+            return
+        self._flags[pos] |= self.FLAG_DEACTIVATED if deactivated else self.FLAG_BLOCKED
+        self._dirty = True
+    
+    def is_reachable(self, user_id: int) -> bool:
+        pos, found = self._find(user_id)
+        return not found or not self._flags[pos]
+    
+    def iter_recipients(self) -> Iterable[int]:
+        """Поток доступных получателей без промежуточных структур"""
+        # Курсор по user_id, а не по позиции: вставки во время рассылки не дают повторов
+        pos = 0
+        while pos < len(self._ids):
+            user_id = self._ids[pos]
+            if not self._flags[pos]:
+                yield user_id
+            pos = bisect_right(self._ids, user_id, lo=pos)
+    
+    def get_counts(self) -> Dict[str, int]:
+        unreachable = sum(1 for flags in self._flags if flags)
+        return {'total': len(self._ids), 'reachable': len(self._ids) - unreachable, 'unreachable': unreachable}
+    
+    def dump(self) -> Optional[bytes]:
+        """Снимок для записи на диск (None, если изменений нет)"""
+        if not self._dirty:
+            return None
+        self._dirty = False
+        return (
+            self._HEADER.pack(self._MAGIC, len(self._ids))
+            + self._ids.tobytes() + self._last_seen.tobytes() + bytes(self._flags)
+        )
+    
+    def write(self, data: bytes):
+        """Атомарно записать снимок (можно вызывать из потока)"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+    
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                magic, count = self._HEADER.unpack(f.read(self._HEADER.size))
+                if magic != self._MAGIC:
+                    raise ValueError("неизвестный формат файла")
+                ids, last_seen = array('q'), array('I')
+                ids.fromfile(f, count)
+                last_seen.fromfile(f, count)
+                flags = bytearray(f.read(count))
+                if len(flags) != count:
+                    raise ValueError("файл обрезан")
+            self._ids, self._last_seen, self._flags = ids, last_seen, flags
+        except Exception as e:
+            logging.error(f"Ошибка загрузки индекса аудитории: {e}")
+    
+    def __len__(self) -> int:
+        return len(self._ids)
+
+class AudienceMiddleware(BaseRequestMiddleware):
+    """Отмечает недоступных пользователей по ответам 403 на любые отправки"""
+    
+    def __init__(self):
+        self.audiences: Dict[int, AudienceIndex] = {}  # bot.id -> индекс (сессия может быть общей)
+    
+    @classmethod
+    def attach(cls, bot: Bot, audience: AudienceIndex):
+        """Подключить индекс бота к middleware его сессии (одна на сессию)"""
+        middleware = next((mw for mw in bot.session.middleware if isinstance(mw, cls)), None)
+        if middleware is None:
+            middleware = cls()
+            bot.session.middleware(middleware)
+        middleware.audiences[bot.id] = audience
+    
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        try:
+            return await make_request(bot, method)
+        except TelegramForbiddenError as e:
+            chat_id = getattr(method, 'chat_id', None)
+            if isinstance(chat_id, int) and chat_id > 0 and (audience := self.audiences.get(bot.id)):
+                audience.mark_unreachable(chat_id, deactivated='deactivated' in str(e))
+            raise
+
+class CircuitOpenError(TelegramNetworkError):
+    """Запрос не отправлялся: предохранитель метода или чата разомкнут"""
+
+class CircuitBreaker:
+    """Состояние одного предохранителя: closed → open после серии сбоев → пробный запрос"""
+    
+    def __init__(self, threshold: int, open_seconds: float):
+        self.threshold = threshold
+        self.open_seconds = open_seconds
+        self.failures = 0
+        self.opened_until = 0.0  # 0 — замкнут
+        self.probing = False
+    
+    @property
+    def state(self) -> str:
+        if not self.opened_until:
+            return 'closed'
+        return 'open' if time.monotonic() < self.opened_until else 'half_open'
+    
+    def blocked(self) -> bool:
+        """Запрос сейчас отклоняется (в полуоткрытом состоянии пропускается один пробный)"""
+        state = self.state
+        return state == 'open' or (state == 'half_open' and self.probing)
+    
+    def acquire(self):
+        if self.state == 'half_open':
+            self.probing = True
+    
+    def failure(self, open_for: Optional[float] = None) -> bool:
+        """Учесть сбой; True — предохранитель только что разомкнулся"""
+        self.failures += 1
+        was_closed = not self.opened_until
+        if open_for or self.failures >= self.threshold or not was_closed:
+            self.opened_until = time.monotonic() + (open_for or self.open_seconds)
+        return was_closed and bool(self.opened_until)
+
+class CircuitBreakerMiddleware(BaseRequestMiddleware):
+    """Предохранители по методам и чатам: при деградации Bot API запросы сразу отклоняются"""
+    
+    EXEMPT_METHODS = frozenset({'getUpdates', 'getMe', 'close', 'logOut'})  # у опроса свои повторы
+    
+    def __init__(self, config: type[BotConfig] = BotConfig):
+        self.config = config  # для ботов, подключённых без своей конфигурации
+        self.configs: Dict[int, type[BotConfig]] = {}  # bot.id -> конфигурация арендатора
+        # Сессия общая для арендаторов, поэтому всё ключуется по bot.id: сбой одного токена не трогает других
+        self.methods: Dict[tuple[int, str], CircuitBreaker] = {}  # (bot.id, метод)
+        self.chats: Dict[tuple[int, int], CircuitBreaker] = {}  # (bot.id, chat_id); только со сбоями
+        self.rejected: Dict[int, int] = {}  # bot.id -> отклонено запросов
+    
+    @classmethod
+    def attach(cls, bot: Bot, config: type[BotConfig] = BotConfig) -> 'CircuitBreakerMiddleware':
+        """Предохранители сессии бота (одни на сессию, пороги — из конфигурации каждого бота)"""
+        middleware = next((mw for mw in bot.session.middleware if isinstance(mw, cls)), None)
+        if middleware is None:
+            middleware = cls(config)
+            bot.session.middleware(middleware)
+        middleware.configs[bot.id] = config
+        return middleware
+    
+    def _new(self, bot_id: int) -> CircuitBreaker:
+        config = self.configs.get(bot_id, self.config)
+        return CircuitBreaker(config.BREAKER_FAILURE_THRESHOLD, config.BREAKER_OPEN_SECONDS)
+    
+    def blocked(self, bot_id: int, api_method: str, chat_id: Optional[int] = None) -> bool:
+        """Будет ли такой запрос отклонён прямо сейчас"""
+        breakers = (self.methods.get((bot_id, api_method)), self.chats.get((bot_id, chat_id)))
+        return any(breaker and breaker.blocked() for breaker in breakers)
+    
+    def status(self, bot_id: int) -> List[tuple[str, str]]:
+        """Разомкнутые предохранители бота: (метод или чат, состояние)"""
+        items = [(api_method, breaker) for (owner, api_method), breaker in self.methods.items() if owner == bot_id]
+        items += [(f"чат {chat_id}", breaker) for (owner, chat_id), breaker in self.chats.items() if owner == bot_id]
+        return [(label, breaker.state) for label, breaker in items if breaker.opened_until]
+    
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        api_method = method.__api_method__
+        if api_method in self.EXEMPT_METHODS:
+            return await make_request(bot, method)
+        chat_id = getattr(method, 'chat_id', None)
+        method_key = (bot.id, api_method)
+        chat_key = (bot.id, chat_id) if isinstance(chat_id, int) else None
+        if self.blocked(bot.id, api_method, chat_id):
+            self.rejected[bot.id] = self.rejected.get(bot.id, 0) + 1
+            raise CircuitOpenError(method, f"Bot API временно недоступен для {api_method}")
+        
+        breakers = [breaker for breaker in (self.methods.get(method_key), self.chats.get(chat_key)) if breaker]
+        for breaker in breakers:
+            breaker.acquire()
+        try:
+            result = await make_request(bot, method)
+        except TelegramRetryAfter as e:
+            # Флуд-лимит — свойство чата: держим его закрытым ровно столько, сколько просит Telegram
+            if chat_key:
+                self.chats.setdefault(chat_key, self._new(bot.id)).failure(open_for=e.retry_after)
+            raise
+        except (TelegramNetworkError, TelegramServerError) as e:
+            if self.methods.setdefault(method_key, self._new(bot.id)).failure():
+                logging.warning(f"Предохранитель {api_method} бота {bot.id} разомкнут: {e}")
+            if chat_key and self.chats.setdefault(chat_key, self._new(bot.id)).failure():
+                logging.warning(f"Предохранитель чата {chat_id} разомкнут: {e}")
+            raise
+        except TelegramAPIError:
+            self._recovered(method_key, chat_key)  # API ответил — значит, доступен
+            raise
+        finally:
+            for breaker in breakers:
+                breaker.probing = False
+        self._recovered(method_key, chat_key)
+        return result
+    
+    def _recovered(self, method_key: tuple[int, str], chat_key: Optional[tuple[int, int]]):
+        breaker = self.methods.pop(method_key, None)
+        if breaker and breaker.opened_until:
+            logging.info(f"Предохранитель {method_key[1]} бота {method_key[0]} замкнут")
+        if chat_key:
+            self.chats.pop(chat_key, None)
+
+class ShardBalancer:
+    """Распределение предложек по шардам модераторов"""
+    
+    def __init__(self, config: type[BotConfig] = BotConfig):
+        self.config = config
+        self._shards: Dict[int, ReviewShard] = {}
+        self._assignments: Dict[int, int] = {}
+        self.reload()
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['config']  # класс конфигурации арендатора не сериализуется
+        return state
+    
+    def reload(self):
+        """Перечитать список шардов из конфигурации"""
+        shards = {}
+        for shard_id, raw in enumerate(self.config.REVIEW_SHARDS):
+            try:
+                shards[shard_id] = ReviewShard(
+                    shard_id=shard_id,
+                    moderator_id=int(raw['moderator_id']),
+                    chat_id=int(raw.get('chat_id', raw['moderator_id'])),
+                    thread_id=raw.get('thread_id'),
+                    weight=max(1, int(raw.get('weight', 1)))
+                )
+            except (KeyError, TypeError, ValueError) as e:
+                logging.error(f"Некорректный шард #{shard_id} в конфигурации: {e}")
+        
+        for assigned_shard_id in self._assignments.values():
+            if assigned_shard_id in shards:
+                shards[assigned_shard_id].outstanding += 1
+        self._shards = shards
+    
+    @property
+    def enabled(self) -> bool:
+        return self.config.REVIEW_MODE == 'sharded' and bool(self._active_shards())
+    
+    def _active_shards(self, exclude: Optional[int] = None) -> List[ReviewShard]:
+        return [
+            shard for shard in self._shards.values()
+            if shard.moderator_id in self.config.MODERATORS and shard.shard_id != exclude
+        ]
+    
+    def active_chats(self) -> set[int]:
+        """Чаты, куда сейчас могут уйти карточки"""
+        return {shard.chat_id for shard in self._active_shards()}
+    
+    def assign(self, post_id: int, exclude: Optional[int] = None,
+               blocked_chats: Collection[int] = ()) -> Optional[ReviewShard]:
+        """Выбрать шард для поста и закрепить его за ним; шарды недоступных чатов пропускаются"""
+        candidates = [shard for shard in self._active_shards(exclude) if shard.chat_id not in blocked_chats]
+        if not candidates:
+            return None
+        
+        if self.config.SHARD_STRATEGY == 'least_loaded':
+            shard = min(candidates, key=lambda s: (s.outstanding / s.weight, s.shard_id))
+        else:
+            # Плавный взвешенный round-robin (как в nginx)
+            total = 0
+            for candidate in candidates:
+                candidate.current_weight += candidate.weight
+                total += candidate.weight
+            shard = max(candidates, key=lambda s: s.current_weight)
+            shard.current_weight -= total
+        
+        self.release(post_id)
+        self._assignments[post_id] = shard.shard_id
+        shard.outstanding += 1
+        return shard
+    
+    def release(self, post_id: int):
+        """Снять пост с шарда (решение принято или пост удалён)"""
+        shard_id = self._assignments.pop(post_id, None)
+        if shard_id is not None and (shard := self._shards.get(shard_id)):
+            shard.outstanding = max(0, shard.outstanding - 1)
+    
+    def restore(self, post_id: int, shard_id: Optional[int]):
+        """Вернуть пост на прежний шард, если новое назначение ещё в силе"""
+        if post_id not in self._assignments:
+            return  # пост решён, пока шла переотправка
+        self.release(post_id)
+        if shard_id in self._shards:
+            self._assignments[post_id] = shard_id
+            self._shards[shard_id].outstanding += 1
+    
+    def get_shards(self) -> List[ReviewShard]:
+        return list(self._shards.values())
+    
+    def clear(self):
+        self._assignments.clear()
+        for shard in self._shards.values():
+            shard.outstanding = 0
+
 class PostManager:
     """Менеджер управления постами"""
     
-    def __init__(self):
+    def __init__(self, config: type[BotConfig] = BotConfig):
+        self.config = config
         self._pending_posts: Dict[int, PendingPost] = {}
         self._lock = asyncio.Lock()
         self._user_stats: Dict[int, Dict[str, int]] = {}
+        self.shards = ShardBalancer(config)
+        self.deadlines = self._build_deadlines()
+        
+        # Места, зарезервированные под отправку карточек модераторам
+        self._reserved = 0
+        
+        # Упорядоченные индексы необработанных постов: (timestamp, post_id)
+        self._queue_index: List[tuple[datetime, int]] = []
+        # Порядок рассмотрения: (priority, timestamp, post_id)
+        self._priority_index: List[tuple[int, datetime, int]] = []
+        
+        # Репутация авторов: user_id -> (одобрения, отклонения) с затуханием
+        self._reputation: Dict[int, tuple[float, float]] = {}
+        self._user_index: Dict[int, List[tuple[datetime, int]]] = {}
+        self._type_index: Dict[ContentType, List[tuple[datetime, int]]] = {}
+        
+        # Обратный индекс: (чат, карточка модерации) -> post_id
+        self._card_index: Dict[tuple[int, int], int] = {}
+        # Дайджесты всплесков: (чат, сообщение с клавиатурой) -> post_id в порядке альбома
+        self._digest_index: Dict[tuple[int, int], List[int]] = {}
+        
+        # EWMA пропускной способности модерации (решений в час) по часу суток
+        self._hourly_rate: List[Optional[float]] = [None] * 24
+        self._rate_hour: datetime = datetime.now().replace(minute=0, second=0, microsecond=0)
+        self._rate_count = 0
+    
+    RATE_EWMA_ALPHA = 0.3
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['config'], state['_lock'], state['deadlines']  # сроки пересчитываются по возрасту постов
+        state['_reserved'] = 0  # резервы принадлежат отправкам, не пережившим рестарт
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = asyncio.Lock()
+    
+    def bind_config(self, config: type[BotConfig]):
+        """Привязать восстановленный из снимка менеджер к конфигурации"""
+        self.config = config
+        self.shards.config = config
+        self.shards.reload()
+        self.reschedule_deadlines()
+    
+    def _build_deadlines(self) -> DeadlineScheduler:
+        expiry = self.config.CLEANUP_INTERVAL_HOURS * 3600
+        reminders = [hours * 3600 for hours in self.config.REMINDER_HOURS if 0 < hours * 3600 < expiry]
+        return DeadlineScheduler(reminders + [expiry])
+    
+    def reschedule_deadlines(self):
+        """Пересобрать сроки после смены настроек или восстановления из снимка"""
+        self.deadlines = self._build_deadlines()
+        now = datetime.now()
+        for _, post_id in self._queue_index:
+            self.deadlines.track(post_id, (now - self._pending_posts[post_id].timestamp).total_seconds())
+    
+    def _roll_rate_hour(self):
+        """Свернуть счётчики завершившихся часов в EWMA"""
+        current_hour = datetime.now().replace(minute=0, second=0, microsecond=0)
+        skipped = 0
+        while self._rate_hour < current_hour and skipped < 24:
+            slot = self._rate_hour.hour
+            previous = self._hourly_rate[slot]
+            self._hourly_rate[slot] = (
+                float(self._rate_count) if previous is None
+                else self.RATE_EWMA_ALPHA * self._rate_count + (1 - self.RATE_EWMA_ALPHA) * previous
+            )
+            self._rate_count = 0
+            self._rate_hour += timedelta(hours=1)
+            skipped += 1
+        self._rate_hour = max(self._rate_hour, current_hour)
+    
+    def _record_decisions(self, count: int = 1):
+        self._roll_rate_hour()
+        self._rate_count += count
+    
+    PRIORITY_TRUSTED, PRIORITY_NORMAL, PRIORITY_LOW = 0, 1, 2
+    
+    def _record_user_decision(self, user_id: int, approved: bool):
+        """Учесть решение в статистике и репутации автора"""
+        stats = self._user_stats.setdefault(user_id, {'submitted': 0, 'approved': 0, 'rejected': 0})
+        stats['approved' if approved else 'rejected'] += 1
+        good, bad = self._reputation.get(user_id, (0.0, 0.0))
+        decay = self.config.REPUTATION_DECAY
+        self._reputation[user_id] = (good * decay + approved, bad * decay + (not approved))
+    
+    def get_reputation(self, user_id: int) -> tuple[float, float]:
+        """Сглаженная доля одобрений и вес истории автора (O(1))"""
+        good, bad = self._reputation.get(user_id, (0.0, 0.0))
+        return (good + 1) / (good + bad + 2), good + bad
+    
+    def get_priority(self, user_id: int) -> int:
+        score, weight = self.get_reputation(user_id)
+        if weight < self.config.REPUTATION_MIN_DECISIONS:
+            return self.PRIORITY_NORMAL
+        if score >= self.config.REPUTATION_TRUSTED:
+            return self.PRIORITY_TRUSTED
+        if score <= self.config.REPUTATION_LOW:
+            return self.PRIORITY_LOW
+        return self.PRIORITY_NORMAL
+    
+    def can_auto_approve(self, user_id: int) -> bool:
+        threshold = self.config.REPUTATION_AUTO_APPROVE
+        score, weight = self.get_reputation(user_id)
+        return 0 < threshold <= score and weight >= self.config.REPUTATION_MIN_DECISIONS
+    
+    def record_auto_approval(self, user_id: int):
+        """Учесть пост, опубликованный без модерации"""
+        stats = self._user_stats.setdefault(user_id, {'submitted': 0, 'approved': 0, 'rejected': 0})
+        stats['submitted'] += 1
+        stats['approved'] += 1
+    
+    def _index_add(self, post: PendingPost):
+        key = (post.timestamp, post.original_message_id)
+        insort(self._queue_index, key)
+        insort(self._priority_index, (post.priority, *key))
+        insort(self._user_index.setdefault(post.user_id, []), key)
+        insort(self._type_index.setdefault(post.content_type, []), key)
+        self.deadlines.track(post.original_message_id, (datetime.now() - post.timestamp).total_seconds())
+    
+    def _index_remove(self, post: PendingPost):
+        key = (post.timestamp, post.original_message_id)
+        self.deadlines.untrack(post.original_message_id)
+        priority_key = (post.priority, *key)
+        pos = bisect_left(self._priority_index, priority_key)
+        if pos < len(self._priority_index) and self._priority_index[pos] == priority_key:
+            del self._priority_index[pos]
+        for index, bucket, owner in (
+            (self._queue_index, None, None),
+            (self._user_index.get(post.user_id), self._user_index, post.user_id),
+            (self._type_index.get(post.content_type), self._type_index, post.content_type)
+        ):
+            if not index:
+                continue
+            pos = bisect_left(index, key)
+            if pos < len(index) and index[pos] == key:
+                del index[pos]
+            if bucket is not None and not index:
+                del bucket[owner]
     
     async def add_post(self, user_id: int, username: Optional[str], 
                       original_msg_id: int, mod_msg_id: int,
-                      content_type: ContentType, file_id: str, caption: Optional[str] = None) -> bool:
-        """Добавить пост в очередь на модерацию"""
+                      content_type: ContentType, file_id: str, caption: Optional[str] = None,
+                      mod_chat_id: Optional[int] = None, mod_thread_id: Optional[int] = None,
+                      moderation_caption: str = "", shard_id: Optional[int] = None,
+                      file_unique_id: Optional[str] = None, digest_message_id: Optional[int] = None) -> bool:
+        """Добавить пост в очередь на модерацию (место резервируется через reserve_slot)"""
         async with self._lock:
-            if len(self._pending_posts) >= BotConfig.MAX_PENDING_POSTS:
-                await self._cleanup_old_posts()
-            
             post = PendingPost(
                 user_id=user_id,
                 username=username,
@@ -134,10 +2575,23 @@ class PostManager:
                 moderator_message_id=mod_msg_id,
                 content_type=content_type,
                 file_id=file_id,
-                caption=caption
+                caption=caption,
+                moderator_chat_id=mod_chat_id or self.config.MODERATORS_CHAT_ID,
+                moderator_thread_id=mod_thread_id,
+                moderation_caption=moderation_caption,
+                shard_id=shard_id,
+                file_unique_id=file_unique_id,
+                priority=self.get_priority(user_id),
+                digest_message_id=digest_message_id
             )
             
+            if old_post := self._pending_posts.get(original_msg_id):
+                self._index_remove(old_post)
+                self._card_index.pop((old_post.moderator_chat_id, old_post.moderator_message_id), None)
             self._pending_posts[original_msg_id] = post
+            self._index_add(post)
+            if mod_msg_id:  # 0 — карточка ещё не отправлена (ждёт дайджеста)
+                self._card_index[(post.moderator_chat_id, post.moderator_message_id)] = original_msg_id
             
             if user_id not in self._user_stats:
                 self._user_stats[user_id] = {'submitted': 0, 'approved': 0, 'rejected': 0}
@@ -146,35 +2600,115 @@ class PostManager:
             logging.info(f"Добавлен пост {original_msg_id} от пользователя {user_id}")
             return True
     
+    async def reserve_slot(self) -> bool:
+        """Занять место в очереди модерации; False, если очередь заполнена"""
+        async with self._lock:
+            if len(self._queue_index) + self._reserved >= self.config.MAX_PENDING_POSTS:
+                return False
+            self._reserved += 1
+            return True
+    
+    def release_slot(self):
+        """Вернуть резерв (пост добавлен или отправка не удалась)"""
+        self._reserved = max(0, self._reserved - 1)
+    
     async def get_post(self, post_id: int) -> Optional[PendingPost]:
         """Получить пост по ID"""
         return self._pending_posts.get(post_id)
     
+    def get_post_by_card(self, chat_id: int, message_id: int) -> Optional[PendingPost]:
+        """Получить пост по его карточке в чате модерации"""
+        post_id = self._card_index.get((chat_id, message_id))
+        return self._pending_posts.get(post_id) if post_id is not None else None
+    
+    async def attach_card(self, post_id: int, chat_id: int, mod_msg_id: int):
+        """Привязать к посту карточку, отправленную после постановки в очередь"""
+        async with self._lock:
+            if post := self._pending_posts.get(post_id):
+                self._card_index.pop((post.moderator_chat_id, post.moderator_message_id), None)
+                post.moderator_chat_id = chat_id
+                post.moderator_message_id = mod_msg_id
+                self._card_index[(chat_id, mod_msg_id)] = post_id
+    
+    async def withdraw_post(self, post_id: int) -> Optional[PendingPost]:
+        """Убрать из очереди нерешённый пост, карточку которого не удалось отправить"""
+        async with self._lock:
+            post = self._pending_posts.get(post_id)
+            if not post or post.is_processed:
+                return None
+            del self._pending_posts[post_id]
+            self._index_remove(post)
+            self._card_index.pop((post.moderator_chat_id, post.moderator_message_id), None)
+            self.shards.release(post_id)
+            if stats := self._user_stats.get(post.user_id):
+                stats['submitted'] -= 1  # при повторной отправке пост учтётся заново
+            return post
+    
+    def attach_digest(self, chat_id: int, digest_message_id: int, post_ids: List[int]):
+        """Привязать посты альбома к сообщению с клавиатурой дайджеста"""
+        self._digest_index[(chat_id, digest_message_id)] = list(post_ids)
+        for post_id in post_ids:
+            if post := self._pending_posts.get(post_id):
+                post.digest_message_id = digest_message_id
+    
+    def get_digest_posts(self, chat_id: int, digest_message_id: int) -> List[PendingPost]:
+        """Посты дайджеста в порядке альбома"""
+        post_ids = self._digest_index.get((chat_id, digest_message_id), [])
+        return [self._pending_posts[post_id] for post_id in post_ids if post_id in self._pending_posts]
+    
     async def mark_approved(self, post_id: int):
         """Пометить пост как одобренный"""
-        if post := self._pending_posts.get(post_id):
+        post = self._pending_posts.get(post_id)
+        if post and not post.is_processed:  # решённый пост уже учтён в статистике
             post.is_processed = True
-            if post.user_id in self._user_stats:
-                self._user_stats[post.user_id]['approved'] += 1
+            self.shards.release(post_id)
+            self._index_remove(post)
+            self._record_decisions()
+            self._record_user_decision(post.user_id, True)
     
     async def mark_rejected(self, post_id: int):
         """Пометить пост как отклоненный"""
-        if post := self._pending_posts.get(post_id):
+        post = self._pending_posts.get(post_id)
+        if post and not post.is_processed:  # решённый пост уже учтён в статистике
             post.is_processed = True
-            if post.user_id in self._user_stats:
-                self._user_stats[post.user_id]['rejected'] += 1
+            self.shards.release(post_id)
+            self._index_remove(post)
+            self._record_decisions()
+            self._record_user_decision(post.user_id, False)
+    
+    async def expire_posts(self, post_ids: List[int]) -> List[PendingPost]:
+        """Снять с очереди посты с истёкшим сроком рассмотрения"""
+        expired = []
+        async with self._lock:
+            for post_id in post_ids:
+                post = self._pending_posts.get(post_id)
+                if not post or post.is_processed:
+                    continue
+                post.is_processed = True
+                post.decision = "expire"
+                self._index_remove(post)
+                self.shards.release(post_id)
+                expired.append(post)
+        if expired:
+            logging.info(f"Истёк срок рассмотрения {len(expired)} постов")
+        return expired
     
     async def _cleanup_old_posts(self):
-        """Очистка устаревших постов"""
+        """Удаление давно решённых постов из памяти"""
         now = datetime.now()
         to_remove = []
         
         for post_id, post in self._pending_posts.items():
-            if (now - post.timestamp).total_seconds() > BotConfig.CLEANUP_INTERVAL_HOURS * 3600:
+            if post.is_processed and (now - post.timestamp).total_seconds() > self.config.CLEANUP_INTERVAL_HOURS * 3600:
                 to_remove.append(post_id)
         
         for post_id in to_remove:
-            del self._pending_posts[post_id]
+            post = self._pending_posts.pop(post_id)
+            self._card_index.pop((post.moderator_chat_id, post.moderator_message_id), None)
+            digest_key = (post.moderator_chat_id, post.digest_message_id)
+            if post.digest_message_id and digest_key in self._digest_index:
+                # Посты дайджеста решаются и стареют вместе — ключ уходит целиком
+                del self._digest_index[digest_key]
         
         if to_remove:
             logging.info(f"Очищено {len(to_remove)} устаревших постов")
@@ -184,8 +2718,124 @@ class PostManager:
         async with self._lock:
             count = len(self._pending_posts)
             self._pending_posts.clear()
+            self._queue_index.clear()
+            self._priority_index.clear()
+            self._user_index.clear()
+            self._type_index.clear()
+            self._card_index.clear()
+            self._digest_index.clear()
+            self.shards.clear()
+            self.deadlines = self._build_deadlines()
             return count
     
+    def find_posts(self, user_id: Optional[int] = None, older_than_hours: Optional[float] = None) -> List[int]:
+        """ID необработанных постов пользователя и/или старше заданного возраста"""
+        index = self._user_index.get(user_id, []) if user_id is not None else self._queue_index
+        if older_than_hours is not None:
+            cutoff = datetime.now() - timedelta(hours=older_than_hours)
+            if user_id is None:
+                index = index[:bisect_left(index, (cutoff, -1))]
+            else:
+                index = [key for key in index if key[0] < cutoff]
+        return [post_id for _, post_id in index]
+    
+    async def claim_posts(self, post_ids: Iterable[int], approved: bool) -> List[PendingPost]:
+        """Атомарно забрать необработанные посты под пакетное решение"""
+        claimed = []
+        async with self._lock:
+            for post_id in post_ids:
+                post = self._pending_posts.get(post_id)
+                if not post or post.is_processed:
+                    continue
+                post.is_processed = True
+                self.shards.release(post_id)
+                self._index_remove(post)
+                self._record_user_decision(post.user_id, approved)
+                claimed.append(post)
+            if claimed:
+                self._record_decisions(len(claimed))
+        return claimed
+    
+    def get_queue_position(self, post_id: int) -> Optional[int]:
+        """Место поста в очереди (1 — следующий), None если он уже обработан"""
+        post = self._pending_posts.get(post_id)
+        if not post or post.is_processed:
+            return None
+        return bisect_left(self._priority_index, (post.priority, post.timestamp, post_id)) + 1
+    
+    def get_user_pending(self, user_id: int) -> List[PendingPost]:
+        """Необработанные посты пользователя (старые сначала)"""
+        return [self._pending_posts[post_id] for _, post_id in self._user_index.get(user_id, [])]
+    
+    def estimate_wait(self, position: int) -> Optional[timedelta]:
+        """Оценка ожидания по EWMA пропускной способности для каждого часа суток"""
+        self._roll_rate_hour()
+        known = [rate for rate in self._hourly_rate if rate is not None]
+        if not known or not any(known):
+            return None
+        fallback = sum(known) / len(known)
+        
+        now = datetime.now()
+        hour_start = now.replace(minute=0, second=0, microsecond=0)
+        remaining = float(position)
+        elapsed = 0.0
+        # Первый час — только оставшаяся доля; горизонт — неделя
+        hour_fraction = 1 - (now - hour_start).total_seconds() / 3600
+        for step in range(24 * 7):
+            rate = self._hourly_rate[(hour_start.hour + step) % 24]
+            rate = fallback if rate is None else rate
+            capacity = rate * hour_fraction
+            if capacity >= remaining:
+                elapsed += remaining / rate if rate else 0
+                return timedelta(hours=elapsed)
+            remaining -= capacity
+            elapsed += hour_fraction
+            hour_fraction = 1.0
+        return None
+    
+    def get_queue_page(self, offset: int, limit: int, user_id: Optional[int] = None,
+                       content_type: Optional[ContentType] = None) -> tuple[List[PendingPost], int]:
+        """Страница очереди (без фильтров — в порядке рассмотрения) и число постов под фильтром"""
+        if user_id is not None:
+            index = self._user_index.get(user_id, [])
+            if content_type is not None:
+                index = [key for key in index if self._pending_posts[key[1]].content_type == content_type]
+        elif content_type is not None:
+            index = self._type_index.get(content_type, [])
+        else:
+            index = self._priority_index
+        
+        page = [self._pending_posts[key[-1]] for key in index[offset:offset + limit]]
+        return page, len(index)
+    
+    async def reassign_post(self, post_id: int, shard: ReviewShard, mod_msg_id: int):
+        """Закрепить пост за новым шардом после переотправки карточки"""
+        async with self._lock:
+            if post := self._pending_posts.get(post_id):
+                self._card_index.pop((post.moderator_chat_id, post.moderator_message_id), None)
+                post.moderator_chat_id = shard.chat_id
+                post.moderator_thread_id = shard.thread_id
+                post.moderator_message_id = mod_msg_id
+                self._card_index[(shard.chat_id, mod_msg_id)] = post_id
+                post.shard_id = shard.shard_id
+                post.assigned_at = datetime.now()
+    
+    def get_overdue_assignments(self) -> List[PendingPost]:
+        """Посты, которые висят на шарде дольше SHARD_REASSIGN_MINUTES"""
+        deadline = datetime.now() - timedelta(minutes=self.config.SHARD_REASSIGN_MINUTES)
+        return [
+            post for post in self._pending_posts.values()
+            if not post.is_processed and post.shard_id is not None and post.assigned_at < deadline
+        ]
+    
+    def get_shard_depths(self) -> Dict[Optional[int], int]:
+        """Количество необработанных постов по шардам (None — общий чат)"""
+        depths: Dict[Optional[int], int] = {}
+        for post in self._pending_posts.values():
+            if not post.is_processed:
+                depths[post.shard_id] = depths.get(post.shard_id, 0) + 1
+        return depths
+    
     def get_stats(self) -> Dict[str, Any]:
         """Получить статистику"""
         return {
@@ -211,6 +2861,18 @@ class KeyboardFactory:
         builder.adjust(2, 2)
         return builder.as_markup()
     
+    @staticmethod
+    def get_digest_kb(items: List[tuple[int, int]]) -> Optional[InlineKeyboardMarkup]:
+        """Компактная клавиатура дайджеста: строка «номер ✅ ❌» на каждый нерешённый пост"""
+        if not items:
+            return None
+        builder = InlineKeyboardBuilder()
+        for number, post_id in items:
+            builder.button(text=f"{number} ✅", callback_data=f"approve_{post_id}")
+            builder.button(text=f"{number} ❌", callback_data=f"reject_{post_id}")
+        builder.adjust(*([2] * len(items)))
+        return builder.as_markup()
+    
     @staticmethod
     def get_user_help_kb() -> InlineKeyboardMarkup:
         """Клавиатура помощи пользователю (без suggest)"""
@@ -225,6 +2887,10 @@ class KeyboardFactory:
         """Клавиатура админ-панели"""
         builder = InlineKeyboardBuilder()
         builder.button(text="📊 Статистика", callback_data="admin_stats")
+        builder.button(text="📈 Отчёт", callback_data="admin_report")
+        builder.button(text="🗂 Шарды", callback_data="admin_shards")
+        builder.button(text="📋 Очередь", callback_data="queue_0_all_0")
+        builder.button(text="🧰 Массовые действия", callback_data="admin_bulk")
         builder.button(text="⚙️ Настройки лимитов", callback_data="admin_limits")
         builder.button(text="👥 Управление модераторами", callback_data="admin_moderators")
         builder.button(text="🛠️ Управление админами", callback_data="admin_admins")
@@ -232,7 +2898,7 @@ class KeyboardFactory:
         builder.button(text="📢 Рассылка", callback_data="admin_broadcast")
         builder.button(text="💾 Сохранить конфиг", callback_data="admin_save")
         builder.button(text="❌ Закрыть", callback_data="admin_close")
-        builder.adjust(1, 2, 2, 2, 1)
+        builder.adjust(2, 2, 2, 2, 2, 2, 1)
         return builder.as_markup()
     
     @staticmethod
@@ -269,6 +2935,71 @@ class KeyboardFactory:
         builder.adjust(1, 1, 1, 1)
         return builder.as_markup()
     
+    @staticmethod
+    def get_search_kb(row_ids: List[int], offset: int, has_next: bool, page_size: int) -> InlineKeyboardMarkup:
+        """Клавиатура результатов поиска по архиву"""
+        builder = InlineKeyboardBuilder()
+        for number, row_id in enumerate(row_ids, start=offset + 1):
+            builder.button(text=f"📎 {number}", callback_data=f"arch_{row_id}")
+        
+        nav = 0
+        if offset > 0:
+            builder.button(text="◀️", callback_data=f"srch_{max(0, offset - page_size)}")
+            nav += 1
+        if has_next:
+            builder.button(text="▶️", callback_data=f"srch_{offset + page_size}")
+            nav += 1
+        
+        item_rows = [5] * (len(row_ids) // 5) + ([len(row_ids) % 5] if len(row_ids) % 5 else [])
+        builder.adjust(*item_rows, *([nav] if nav else []))
+        return builder.as_markup()
+    
+    @staticmethod
+    def get_queue_kb(offset: int, total: int, content_filter: str, user_id: int, page_size: int,
+                     post_ids: List[int] = (), selected: set[int] = frozenset()) -> InlineKeyboardMarkup:
+        """Клавиатура просмотра очереди с пагинацией, фильтрами и выбором постов"""
+        builder = InlineKeyboardBuilder()
+        for post_id in post_ids:
+            mark = "☑️" if post_id in selected else "⬜"
+            builder.button(text=f"{mark} #{post_id}", callback_data=f"qsel_{post_id}_{offset}_{content_filter}_{user_id}")
+        
+        nav = 0
+        if offset > 0:
+            builder.button(text="◀️", callback_data=f"queue_{max(0, offset - page_size)}_{content_filter}_{user_id}")
+            nav += 1
+        if offset + page_size < total:
+            builder.button(text="▶️", callback_data=f"queue_{offset + page_size}_{content_filter}_{user_id}")
+            nav += 1
+        
+        for value, title in (("all", "Все"), ("photo", "📸 Фото"), ("video", "🎥 Видео")):
+            mark = "• " if value == content_filter else ""
+            builder.button(text=f"{mark}{title}", callback_data=f"queue_0_{value}_{user_id}")
+        
+        builder.button(text="👤 По пользователю", callback_data="queue_by_user")
+        if user_id:
+            builder.button(text="✖️ Сбросить пользователя", callback_data=f"queue_0_{content_filter}_0")
+        if selected:
+            builder.button(text=f"✅ Одобрить выбранные ({len(selected)})", callback_data="bulk_sel_approve")
+            builder.button(text=f"❌ Отклонить выбранные ({len(selected)})", callback_data="bulk_sel_reject")
+            builder.button(text="🧹 Снять выбор", callback_data=f"bulk_sel_clear_{offset}_{content_filter}_{user_id}")
+        builder.button(text="🔙 Назад", callback_data="admin_back")
+        
+        item_rows = [2] * (len(post_ids) // 2) + ([1] if len(post_ids) % 2 else [])
+        sizes = item_rows + ([nav] if nav else []) + [3, 1] + ([1] if user_id else []) + ([2, 1] if selected else []) + [1]
+        builder.adjust(*sizes)
+        return builder.as_markup()
+    
+    @staticmethod
+    def get_bulk_kb() -> InlineKeyboardMarkup:
+        """Клавиатура массовых действий"""
+        builder = InlineKeyboardBuilder()
+        builder.button(text="❌ Отклонить все от пользователя", callback_data="bulk_by_user")
+        builder.button(text="⏳ Отклонить всё старше N часов", callback_data="bulk_by_age")
+        builder.button(text="📋 Выбрать в очереди", callback_data="queue_0_all_0")
+        builder.button(text="🔙 Назад", callback_data="admin_back")
+        builder.adjust(1, 1, 1, 1)
+        return builder.as_markup()
+    
     @staticmethod
     def get_cancel_kb() -> InlineKeyboardMarkup:
         """Клавиатура отмены"""
@@ -282,12 +3013,12 @@ class ContentValidator:
     """Валидация входящего контента"""
     
     @staticmethod
-    def is_allowed_content(message: Message) -> tuple[bool, Optional[str]]:
+    def is_allowed_content(message: Message, config: type[BotConfig] = BotConfig) -> tuple[bool, Optional[str]]:
         if message.photo:
             return True, message.photo[-1].file_id
         elif message.video:
-            if message.video.file_size and message.video.file_size > BotConfig.MAX_VIDEO_SIZE_MB * 1024 * 1024:
-                return False, f"Видео слишком большое (максимум {BotConfig.MAX_VIDEO_SIZE_MB}МБ)"
+            if message.video.file_size and message.video.file_size > config.MAX_VIDEO_SIZE_MB * 1024 * 1024:
+                return False, f"Видео слишком большое (максимум {config.MAX_VIDEO_SIZE_MB}МБ)"
             return True, message.video.file_id
         return False, None
 
@@ -295,71 +3026,168 @@ class ContentValidator:
 class MemesModerationBot:
     """Основной класс бота"""
     
-    def __init__(self):
-        self.bot = Bot(token=BotConfig.BOT_TOKEN)
-        self.storage = MemoryStorage()
-        self.dp = Dispatcher(storage=self.storage)
-        self.post_manager = PostManager()
+    SNAPSHOT_VERSION = 3
+    ARCHIVE_OUTCOMES = {'approve': 'approved', 'reject': 'rejected'}
+    REMINDER_MAX_LINES = 30
+    PROFILE_DEFAULT_SECONDS = 10
+    PROFILE_MAX_SECONDS = 120
+    
+    def __init__(self, config: type[BotConfig] = BotConfig, session: Optional[AiohttpSession] = None,
+                 media_pool: Optional[ProcessPoolExecutor] = None):
+        self.config = config
+        self.bot = Bot(token=config.BOT_TOKEN, session=session or TunedAiohttpSession(config))
+        self.router = Router(name=f"tenant-{self.bot.id}")
+        self.post_manager = PostManager(config)
+        self.analytics = ModerationAnalytics()
+        self._restored_fsm: Dict[StorageKey, MemoryStorageRecord] = {}
+        self._restored_retries: List[tuple[PendingPost, int, str, int]] = []
+        self._load_snapshot()
+        self.publisher = Publisher(self.bot, config)
+        self.publisher.restore_retries(self._restored_retries)
+        self._restored_retries = []
+        self.comment_sessions = CommentSessionManager(config)
+        self.audience = AudienceIndex(config.AUDIENCE_FILE)
+        self.digest = NotificationDigest(config)
+        self.overflow = OverflowQueue(config.OVERFLOW_FILE, config.OVERFLOW_COMPACT_BYTES)
+        self.audit = AuditLog(config.AUDIT_DIR, config.AUDIT_SEGMENT_BYTES)
+        self.archive = PostArchive(config.ARCHIVE_FILE)
+        self.media = MediaAnalyzer(config, media_pool)
+        self.cards = CardRenderer(self.bot, self._render_card, config.CARD_EDIT_WINDOW_SECONDS)
+        self.burst = BurstDetector(config)
+        self._digest_batch: List[Submission] = []
+        self._digest_timer: Optional[asyncio.Task] = None
+        self._refill_event = asyncio.Event()
+        AudienceMiddleware.attach(self.bot, self.audience)
+        self.breaker = CircuitBreakerMiddleware.attach(self.bot, config)
+        self._drain_limiter = RateLimiter(config.BREAKER_DRAIN_PER_MINUTE / 60)
+        self._drain_throttled = False  # очередь ожидания пополнилась из-за сбоя API — разбирать постепенно
+        self._broadcast_task: Optional[asyncio.Task] = None
+        self._background_tasks: List[asyncio.Task] = []
+        self._bulk_jobs: set[asyncio.Task] = set()
+        self._bulk_selection: Dict[int, set[int]] = {}
+        self._search_queries: Dict[int, str] = {}  # admin_id -> последний запрос /search
+        self._inflight: set[asyncio.Task] = set()
+        self._profiler: Optional[SamplingProfiler] = None
+        self._profile_task: Optional[asyncio.Task] = None
+        self.watchdog: Optional[LoopWatchdog] = None  # один на процесс, создаёт запускающий
         
         self._register_handlers()
         
     def _register_handlers(self):
         """Регистрация всех обработчиков с правильным порядком"""
+        # В общем диспетчере арендаторов роутер принимает только апдейты своего бота
+        self.router.message.filter(self._is_own_update)
+        self.router.callback_query.filter(self._is_own_update)
+        self.router.message.outer_middleware(self._inflight_middleware)
+        self.router.callback_query.outer_middleware(self._inflight_middleware)
+        self.router.message.outer_middleware(self._audience_seen_middleware)
+        self.router.message.middleware(self._profile_middleware)
+        self.router.callback_query.middleware(self._profile_middleware)
+        
         # Команды
-        self.dp.message.register(self._cmd_start, Command("start"))
-        self.dp.message.register(self._cmd_help, Command("help"))
-        self.dp.message.register(self._cmd_admin, Command("adminpanel"))
-        self.dp.message.register(self._cmd_cancel, Command("cancel"))
+        self.router.message.register(self._cmd_start, Command("start"))
+        self.router.message.register(self._cmd_help, Command("help"))
+        self.router.message.register(self._cmd_status, Command("status"))
+        self.router.message.register(self._cmd_admin, Command("adminpanel"))
+        self.router.message.register(self._cmd_profile, Command("profile"))
+        self.router.message.register(self._cmd_cancel, Command("cancel"))
+        self.router.message.register(self._cmd_audit, Command("audit"))
+        self.router.message.register(self._cmd_search, Command("search"))
+        
+        # Решение ответом на карточку: «+ текст» / «- причина» (раньше FSM и приёма контента)
+        self.router.message.register(self._handle_card_reply, self._card_reply_filter)
         
         # Обработка комментариев (ДОЛЖНЫ БЫТЬ ПЕРВЫМИ!)
-        self.dp.message.register(self._handle_approve_comment, CommentStates.waiting_for_approve_comment)
-        self.dp.message.register(self._handle_reject_comment, CommentStates.waiting_for_reject_comment)
+        self.router.message.register(self._handle_comment, self._comment_session_filter)
         
         # Обработка ввода админ-панели (ДОЛЖНЫ БЫТЬ ПЕРВЫМИ!)
-        self.dp.message.register(self._handle_admin_input, StateFilter(AdminStates))
+        self.router.message.register(self._handle_admin_input, StateFilter(AdminStates))
         
         # Приём контента (только приватные чаты, когда не в состоянии)
-        self.dp.message.register(self._handle_content, 
+        self.router.message.register(self._handle_content, 
                                 F.chat.type == 'private',
                                 StateFilter(None))  # Только когда не в состоянии
         
         # Обработка действий модераторов
-        self.dp.callback_query.register(self._approve_post, F.data.startswith("approve_") & ~F.data.contains("comment"))
-        self.dp.callback_query.register(self._reject_post, F.data.startswith("reject_") & ~F.data.contains("comment"))
-        self.dp.callback_query.register(self._approve_with_comment_start, F.data.startswith("approve_comment_"))
-        self.dp.callback_query.register(self._reject_with_comment_start, F.data.startswith("reject_comment_"))
+        self.router.callback_query.register(self._approve_post, F.data.startswith("approve_") & ~F.data.contains("comment"))
+        self.router.callback_query.register(self._reject_post, F.data.startswith("reject_") & ~F.data.contains("comment"))
+        self.router.callback_query.register(self._approve_with_comment_start, F.data.startswith("approve_comment_"))
+        self.router.callback_query.register(self._reject_with_comment_start, F.data.startswith("reject_comment_"))
         
         # Обработка отмены ввода
-        self.dp.callback_query.register(self._cancel_input, F.data == "cancel_input")
+        self.router.callback_query.register(self._cancel_input, F.data == "cancel_input")
         
         # Вспомогательные колбеки
-        self.dp.callback_query.register(self._show_rules, F.data == "show_rules")
-        self.dp.callback_query.register(self._how_to_send, F.data == "how_to_send")
+        self.router.callback_query.register(self._show_rules, F.data == "show_rules")
+        self.router.callback_query.register(self._how_to_send, F.data == "how_to_send")
         
         # Админ-панель
-        self.dp.callback_query.register(self._admin_stats, F.data == "admin_stats")
-        self.dp.callback_query.register(self._admin_limits, F.data == "admin_limits")
-        self.dp.callback_query.register(self._admin_moderators, F.data == "admin_moderators")
-        self.dp.callback_query.register(self._admin_admins, F.data == "admin_admins")
-        self.dp.callback_query.register(self._admin_cleanup, F.data == "admin_cleanup")
-        self.dp.callback_query.register(self._admin_broadcast, F.data == "admin_broadcast")
-        self.dp.callback_query.register(self._admin_save, F.data == "admin_save")
-        self.dp.callback_query.register(self._admin_close, F.data == "admin_close")
-        self.dp.callback_query.register(self._admin_back, F.data == "admin_back")
+        self.router.callback_query.register(self._admin_stats, F.data == "admin_stats")
+        self.router.callback_query.register(self._admin_report, F.data == "admin_report")
+        self.router.callback_query.register(self._admin_shards, F.data == "admin_shards")
+        self.router.callback_query.register(self._queue_by_user, F.data == "queue_by_user")
+        self.router.callback_query.register(self._admin_queue, F.data.regexp(r"^queue_\d+_(all|photo|video)_\d+$"))
+        self.router.callback_query.register(self._queue_toggle_select, F.data.startswith("qsel_"))
+        self.router.callback_query.register(self._search_page, F.data.startswith("srch_"))
+        self.router.callback_query.register(self._search_resend, F.data.startswith("arch_"))
+        self.router.callback_query.register(self._admin_bulk, F.data == "admin_bulk")
+        self.router.callback_query.register(self._bulk_by_user, F.data == "bulk_by_user")
+        self.router.callback_query.register(self._bulk_by_age, F.data == "bulk_by_age")
+        self.router.callback_query.register(self._bulk_selected, F.data.in_({"bulk_sel_approve", "bulk_sel_reject"}))
+        self.router.callback_query.register(self._bulk_clear_selection, F.data.startswith("bulk_sel_clear_"))
+        self.router.callback_query.register(self._admin_limits, F.data == "admin_limits")
+        self.router.callback_query.register(self._admin_moderators, F.data == "admin_moderators")
+        self.router.callback_query.register(self._admin_admins, F.data == "admin_admins")
+        self.router.callback_query.register(self._admin_cleanup, F.data == "admin_cleanup")
+        self.router.callback_query.register(self._admin_broadcast, F.data == "admin_broadcast")
+        self.router.callback_query.register(self._admin_save, F.data == "admin_save")
+        self.router.callback_query.register(self._admin_close, F.data == "admin_close")
+        self.router.callback_query.register(self._admin_back, F.data == "admin_back")
         
         # Настройки
-        self.dp.callback_query.register(self._set_photo_size, F.data == "set_photo_size")
-        self.dp.callback_query.register(self._set_video_size, F.data == "set_video_size")
-        self.dp.callback_query.register(self._set_pending_limit, F.data == "set_pending_limit")
-        self.dp.callback_query.register(self._set_cleanup_interval, F.data == "set_cleanup_interval")
+        self.router.callback_query.register(self._set_photo_size, F.data == "set_photo_size")
+        self.router.callback_query.register(self._set_video_size, F.data == "set_video_size")
+        self.router.callback_query.register(self._set_pending_limit, F.data == "set_pending_limit")
+        self.router.callback_query.register(self._set_cleanup_interval, F.data == "set_cleanup_interval")
         
         # Управление пользователями
-        self.dp.callback_query.register(self._add_moderator, F.data == "add_moderator")
-        self.dp.callback_query.register(self._remove_moderator, F.data == "remove_moderator")
-        self.dp.callback_query.register(self._list_moderators, F.data == "list_moderators")
-        self.dp.callback_query.register(self._add_admin, F.data == "add_admin")
-        self.dp.callback_query.register(self._remove_admin, F.data == "remove_admin")
-        self.dp.callback_query.register(self._list_admins, F.data == "list_admins")
+        self.router.callback_query.register(self._add_moderator, F.data == "add_moderator")
+        self.router.callback_query.register(self._remove_moderator, F.data == "remove_moderator")
+        self.router.callback_query.register(self._list_moderators, F.data == "list_moderators")
+        self.router.callback_query.register(self._add_admin, F.data == "add_admin")
+        self.router.callback_query.register(self._remove_admin, F.data == "remove_admin")
+        self.router.callback_query.register(self._list_admins, F.data == "list_admins")
+    
+    def _is_own_update(self, _, bot: Bot) -> bool:
+        return bot.id == self.bot.id
+    
+    async def _inflight_middleware(self, handler, event, data: Dict[str, Any]):
+        """Учитывает обрабатываемые апдейты, чтобы дождаться их при остановке"""
+        if data['bot'].id != self.bot.id:
+            return await handler(event, data)
+        task = asyncio.current_task()
+        self._inflight.add(task)
+        try:
+            return await handler(event, data)
+        finally:
+            self._inflight.discard(task)
+    
+    async def _profile_middleware(self, handler, event, data: Dict[str, Any]):
+        """Время обработчиков во время /profile; без замера — только проверка атрибута"""
+        if self._profiler is None:
+            return await handler(event, data)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            if self._profiler is not None:
+                self._profiler.record_handler(data['handler'].callback.__name__, time.perf_counter() - started)
+    
+    async def _audience_seen_middleware(self, handler, event: Message, data: Dict[str, Any]):
+        """Обновляет «последний визит» известных пользователей в личке"""
+        if data['bot'].id == self.bot.id and event.chat.type == 'private' and event.from_user:
+            self.audience.touch(event.from_user.id, create=False)
+        return await handler(event, data)
     
     # ================== КОМАНДЫ ==================
     async def _cmd_start(self, message: Message, state: FSMContext):
@@ -389,18 +3217,55 @@ class MemesModerationBot:
             "2. Бот скрывает твоё имя и передаёт модераторам\n"
             "3. Модераторы видят только твой ID (не аккаунт)\n"
             "4. Рассмотрение занимает до 24 часов\n"
-            "5. Одобренные посты публикуются в теме «❶ Мемы подписчиков»\n\n"
+            "5. Одобренные посты публикуются в теме «❶ Мемы подписчиков»\n"
+            "6. /status — место твоих предложек в очереди\n\n"
             "<b>Технические требования:</b>\n"
-            f"• Фото: до {BotConfig.MAX_PHOTO_SIZE_MB}МБ\n"
-            f"• Видео: до {BotConfig.MAX_VIDEO_SIZE_MB}МБ, формат MP4\n\n"
+            f"• Фото: до {self.config.MAX_PHOTO_SIZE_MB}МБ\n"
+            f"• Видео: до {self.config.MAX_VIDEO_SIZE_MB}МБ, формат MP4\n\n"
             "❌ <b>Не принимаем:</b> текст, GIF, документы, аудио, стикеры"
         )
         
         await message.answer(help_text, parse_mode="HTML")
     
+    @staticmethod
+    def _format_eta(eta: Optional[timedelta]) -> str:
+        if eta is None:
+            return "до 24 часов"
+        minutes = int(eta.total_seconds() // 60)
+        if minutes < 60:
+            return f"~{max(1, minutes)} мин"
+        if minutes < 48 * 60:
+            return f"~{round(minutes / 60)} ч"
+        return f"~{round(minutes / 1440)} дн"
+    
+    def _queue_status_text(self, post_id: int) -> str:
+        position = self.post_manager.get_queue_position(post_id)
+        if position is None:
+            return ""
+        eta = self._format_eta(self.post_manager.estimate_wait(position))
+        return f"📍 Место в очереди: <b>{position}</b>\n⏱ Примерное ожидание: <b>{eta}</b>"
+    
+    async def _cmd_status(self, message: Message, state: FSMContext):
+        """Команда /status — очередь предложек пользователя"""
+        await state.clear()
+        posts = self.post_manager.get_user_pending(message.from_user.id)
+        if not posts:
+            await message.answer("📭 У тебя нет предложек на рассмотрении.")
+            return
+        
+        lines = [f"📋 <b>Твои предложки на рассмотрении: {len(posts)}</b>\n"]
+        for post in posts[:self.config.QUEUE_PAGE_SIZE]:
+            position = self.post_manager.get_queue_position(post.original_message_id)
+            eta = self._format_eta(self.post_manager.estimate_wait(position))
+            kind = "📸" if post.content_type == ContentType.PHOTO else "🎥"
+            lines.append(
+                f"{kind} от {post.timestamp.strftime('%d.%m %H:%M')} — место <b>{position}</b>, ожидание {eta}"
+            )
+        await message.answer("\n".join(lines), parse_mode="HTML")
+    
     async def _cmd_admin(self, message: Message, state: FSMContext):
         """Секретная команда /adminpanel"""
-        if message.from_user.id not in BotConfig.ADMIN_IDS:
+        if message.from_user.id not in self.config.ADMIN_IDS:
             await message.answer("⛔ У вас нет доступа к админ-панели.")
             return
         
@@ -420,14 +3285,18 @@ class MemesModerationBot:
         """Команда отмены /cancel"""
         current_state = await state.get_state()
         if current_state is None:
-            await message.answer("❌ Нет активного действия для отмены.")
+            closed = self.comment_sessions.close_all(message.from_user.id, message.chat.id)
+            if closed:
+                await message.answer(f"✅ Отменено черновиков комментариев: {closed}.")
+            else:
+                await message.answer("❌ Нет активного действия для отмены.")
             return
         
         await state.clear()
         await message.answer("✅ Действие отменено.")
         
         # Если это админ, возвращаем в админ-панель
-        if message.from_user.id in BotConfig.ADMIN_IDS:
+        if message.from_user.id in self.config.ADMIN_IDS:
             await message.answer(
                 "⚙️ <b>Админ-панель управления ботом</b>\n\n"
                 "Выберите действие:",
@@ -442,7 +3311,7 @@ class MemesModerationBot:
         if message.text and message.text.startswith('/'):
             return
         
-        is_valid, file_id_or_error = ContentValidator.is_allowed_content(message)
+        is_valid, file_id_or_error = ContentValidator.is_allowed_content(message, self.config)
         
         if not is_valid:
             error_msg = file_id_or_error or (
@@ -455,36 +3324,64 @@ class MemesModerationBot:
             await message.answer(error_msg, parse_mode="HTML")
             return
         
-        # Подтверждение пользователю
-        await message.reply(
-            "✅ <b>Принято!</b>\n\n"
-            "Твоя предложка отправлена модераторам на рассмотрение. "
-            "Это может занять до 24 часов.",
-            parse_mode="HTML"
-        )
+        submission = Submission.from_message(message, file_id_or_error)
+        self.audience.touch(submission.user_id)
+        self.publisher.file_ids.remember(message)
+        
+        priority = self.post_manager.get_priority(submission.user_id)
+        if priority == PostManager.PRIORITY_LOW:
+            in_review = len(self.post_manager.get_user_pending(submission.user_id)) + self.overflow.count_for(submission.user_id)
+            if in_review >= self.config.THROTTLED_MAX_PENDING:
+                await message.reply(
+                    "⏳ <b>Подожди решения по предыдущим предложкам.</b>\n\n"
+                    "Сейчас можно держать на рассмотрении не больше "
+                    f"{self.config.THROTTLED_MAX_PENDING}. Проверить очередь: /status",
+                    parse_mode="HTML"
+                )
+                return
         
         try:
-            content_type = ContentType.PHOTO if message.photo else ContentType.VIDEO
-            mod_caption = self._create_moderation_caption(message)
+            if self.post_manager.can_auto_approve(submission.user_id) and await self._auto_approve(submission):
+                await message.reply(
+                    "⚡ <b>Опубликовано!</b>\n\nТебе доверяют модераторы, поэтому предложка вышла без очереди.",
+                    parse_mode="HTML"
+                )
+                return
             
-            sent_msg = await self._send_to_moderators(
-                content_type=content_type,
-                file_id=file_id_or_error,
-                caption=mod_caption,
-                reply_markup=KeyboardFactory.get_moderation_kb(message.message_id)
-            )
+            if self._moderation_degraded():
+                # Не ждём таймаутов Bot API: предложка подождёт на диске, ответ — сразу
+                position = await self.overflow.push(submission)
+                self._drain_throttled = True
+                logging.info(f"Пост {submission.message_id} от {submission.user_id} отложен: Bot API недоступен")
+                await message.reply(
+                    "⏳ <b>Принято!</b>\n\n"
+                    "Telegram сейчас отвечает с перебоями, поэтому модераторы получат предложку чуть позже.\n"
+                    f"📍 Место в очереди ожидания: <b>{position}</b>",
+                    parse_mode="HTML"
+                )
+                return
+            
+            # Пока есть очередь ожидания, новые предложки встают за ней
+            if len(self.overflow) or not await self.post_manager.reserve_slot():
+                position = await self.overflow.push(submission)
+                self._refill_event.set()
+                logging.info(f"Пост {submission.message_id} от {submission.user_id} отложен: очередь заполнена")
+                await message.reply(
+                    "⏳ <b>Принято, но очередь модерации сейчас заполнена.</b>\n\n"
+                    "Твоя предложка сохранена и будет передана модераторам, как только освободится место.\n"
+                    f"📍 Место в очереди ожидания: <b>{position}</b>",
+                    parse_mode="HTML"
+                )
+                return
             
-            if sent_msg:
-                await self.post_manager.add_post(
-                    user_id=message.from_user.id,
-                    username=message.from_user.username,
-                    original_msg_id=message.message_id,
-                    mod_msg_id=sent_msg.message_id,
-                    content_type=content_type,
-                    file_id=file_id_or_error,
-                    caption=message.caption
+            if await self._dispatch_submission(submission, reserved=True):
+                # Подтверждение пользователю
+                await message.reply(
+                    "✅ <b>Принято!</b>\n\n"
+                    "Твоя предложка отправлена модераторам на рассмотрение.\n"
+                    f"{self._queue_status_text(message.message_id)}",
+                    parse_mode="HTML"
                 )
-                logging.info(f"Пост {message.message_id} от {message.from_user.id} отправлен модераторам")
             else:
                 await message.reply("⚠️ Произошла ошибка при отправке модераторам. Попробуй позже.")
                 
@@ -495,347 +3392,1311 @@ class MemesModerationBot:
             logging.error(f"Неизвестная ошибка: {e}")
             await message.reply("⚠️ Внутренняя ошибка бота.")
     
-    def _create_moderation_caption(self, message: Message) -> str:
+    async def _dispatch_submission(self, submission: Submission, reserved: bool = False) -> bool:
+        """Отправить карточку модераторам и поставить пост в очередь"""
+        if not reserved and not await self.post_manager.reserve_slot():
+            return False
+        
+        post_id = submission.message_id
+        try:
+            mod_caption = self._create_moderation_caption(submission)
+            if duplicate := await asyncio.to_thread(self.archive.find_duplicate, submission.file_unique_id):
+                published_at = datetime.fromtimestamp(duplicate['decided_at']).strftime('%d.%m.%Y')
+                mod_caption += f"\n⚠️ <b>Уже публиковалось</b> {published_at} (#{duplicate['post_id']})"
+            # Альбомы-дайджесты только в общем чате: у шардов своя раздача по модераторам
+            if self.burst.record() and not self.post_manager.shards.enabled:
+                sent = await self._enqueue_digest(submission, mod_caption)  # альбом уйдёт позже, в фоне
+            else:
+                sent = await self._send_card(submission, mod_caption)
+            if not sent:
+                return False
+            post_data = await self.post_manager.get_post(post_id)
+            self.analytics.record_submission(submission.user_id)
+            self.audit.append({
+                'event': 'submit', 'post': post_id, 'user': submission.user_id,
+                'type': submission.content_type.value, 'shard': post_data.shard_id if post_data else None
+            })
+            self.media.submit(post_id, submission)
+            logging.info(f"Пост {post_id} от {submission.user_id} отправлен модераторам")
+            return True
+        finally:
+            self.post_manager.release_slot()
+    
+    async def _send_card(self, submission: Submission, mod_caption: str) -> bool:
+        """Отдельная карточка с кнопками: в шард модератора или в общий чат"""
+        post_id = submission.message_id
+        shards = self.post_manager.shards
+        shard = shards.assign(post_id, blocked_chats=self._blocked_shard_chats()) if shards.enabled else None
+        
+        reply_markup = KeyboardFactory.get_moderation_kb(post_id)
+        sent_msg = await self._send_to_moderators(
+            content_type=submission.content_type,
+            file_id=submission.file_id,
+            caption=mod_caption,
+            reply_markup=reply_markup,
+            chat_id=shard.chat_id if shard else None,
+            thread_id=shard.thread_id if shard else None
+        )
+        if not sent_msg:
+            self.post_manager.shards.release(post_id)
+            return False
+        self.cards.remember(sent_msg.chat.id, sent_msg.message_id, mod_caption, reply_markup)
+        
+        await self.post_manager.add_post(
+            user_id=submission.user_id,
+            username=submission.username,
+            original_msg_id=post_id,
+            mod_msg_id=sent_msg.message_id,
+            content_type=submission.content_type,
+            file_id=submission.file_id,
+            caption=submission.caption,
+            mod_chat_id=sent_msg.chat.id,
+            mod_thread_id=shard.thread_id if shard else None,
+            moderation_caption=mod_caption,
+            shard_id=shard.shard_id if shard else None,
+            file_unique_id=submission.file_unique_id
+        )
+        return True
+    
+    async def _enqueue_digest(self, submission: Submission, mod_caption: str) -> bool:
+        """Поставить пост в очередь сразу, а карточку отправить в ближайшем дайджесте"""
+        if not await self.post_manager.add_post(
+            user_id=submission.user_id,
+            username=submission.username,
+            original_msg_id=submission.message_id,
+            mod_msg_id=0,
+            content_type=submission.content_type,
+            file_id=submission.file_id,
+            caption=submission.caption,
+            moderation_caption=mod_caption,
+            file_unique_id=submission.file_unique_id,
+            digest_message_id=0  # клавиатура ещё не отправлена
+        ):
+            return False
+        self._digest_batch.append(submission)
+        if len(self._digest_batch) >= self.config.BURST_DIGEST_SIZE:
+            if self._digest_timer:
+                self._digest_timer.cancel()
+                self._digest_timer = None
+            self._spawn_digest()
+        elif not self._digest_timer:
+            self._digest_timer = asyncio.create_task(self._digest_deadline())
+        return True
+    
+    def _spawn_digest(self):
+        """Отправить накопленный дайджест фоновой задачей (её дождётся drain)"""
+        if not self._digest_batch:
+            return
+        batch, self._digest_batch = self._digest_batch, []
+        task = asyncio.create_task(self._send_digest(batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+    
+    async def _digest_deadline(self):
+        """Отправить неполный дайджест по истечении BURST_DIGEST_WAIT_SECONDS"""
+        await asyncio.sleep(self.config.BURST_DIGEST_WAIT_SECONDS)
+        self._digest_timer = None
+        self._spawn_digest()
+    
+    def _flush_digest(self):
+        """Отправить накопленный дайджест, не дожидаясь таймера (при остановке)"""
+        if self._digest_timer:
+            self._digest_timer.cancel()
+            self._digest_timer = None
+        self._spawn_digest()
+    
+    async def _send_digest(self, batch: List[Submission]):
+        """Альбом предложек и одно сообщение с компактной клавиатурой на все элементы"""
+        items = []
+        for submission in batch:
+            post_data = await self.post_manager.get_post(submission.message_id)
+            if post_data and not post_data.is_processed:  # решённые из списка очереди карточка не нужна
+                items.append((submission, post_data))
+        if len(items) < 2:  # альбом — от двух элементов
+            for submission, post_data in items:
+                await self._send_digest_fallback(submission, post_data)
+            return
+        
+        media = [
+            (InputMediaPhoto if post_data.content_type == ContentType.PHOTO else InputMediaVideo)(
+                media=post_data.file_id, caption=post_data.moderation_caption, parse_mode="HTML"
+            )
+            for _, post_data in items
+        ]
+        try:
+            messages = await self.bot.send_media_group(chat_id=self.config.MODERATORS_CHAT_ID, media=media)
+        except TelegramAPIError as e:
+            logging.error(f"Ошибка отправки дайджеста из {len(items)} постов: {e}")
+            for submission, post_data in items:
+                await self._send_digest_fallback(submission, post_data)
+            return
+        
+        for (_, post_data), sent_msg in zip(items, messages):
+            self.publisher.file_ids.remember(sent_msg)
+            self.cards.remember(sent_msg.chat.id, sent_msg.message_id, post_data.moderation_caption, None)
+            await self.post_manager.attach_card(post_data.original_message_id, sent_msg.chat.id, sent_msg.message_id)
+        
+        chat_id = messages[0].chat.id
+        post_ids = [post_data.original_message_id for _, post_data in items]
+        text, reply_markup = self._render_digest([post_data for _, post_data in items])
+        try:
+            kb_msg = await self.bot.send_message(
+                chat_id=chat_id,
+                text=text,
+                parse_mode="HTML",
+                reply_markup=reply_markup,
+                reply_to_message_id=messages[0].message_id
+            )
+            self.cards.remember(chat_id, kb_msg.message_id, text, reply_markup)
+            self.post_manager.attach_digest(chat_id, kb_msg.message_id, post_ids)
+        except TelegramAPIError as e:
+            # Посты остаются в очереди: их можно решить ответом на элемент альбома или из списка
+            logging.error(f"Ошибка отправки клавиатуры дайджеста: {e}")
+        
+        for _, post_data in items:
+            if post_data.decision:  # решён, пока альбом отправлялся
+                self._update_card(post_data)
+        logging.info(f"Дайджест из {len(items)} постов отправлен модераторам")
+    
+    async def _send_digest_fallback(self, submission: Submission, post_data: PendingPost):
+        """Обычная карточка вместо альбома; не ушла и она — пост возвращается в очередь ожидания"""
+        post_data.digest_message_id = None
+        caption, reply_markup = self._render_card(post_data)
+        sent_msg = await self._send_to_moderators(
+            content_type=post_data.content_type,
+            file_id=post_data.file_id,
+            caption=caption,
+            reply_markup=reply_markup
+        )
+        if sent_msg:
+            self.cards.remember(sent_msg.chat.id, sent_msg.message_id, caption, reply_markup)
+            await self.post_manager.attach_card(post_data.original_message_id, sent_msg.chat.id, sent_msg.message_id)
+            return
+        if await self.post_manager.withdraw_post(post_data.original_message_id):
+            await self.overflow.push(submission)
+            self._refill_event.set()
+            logging.warning(f"Пост {submission.message_id} возвращён в очередь ожидания: карточка не отправлена")
+    
+    def _render_digest(self, posts: List[PendingPost]) -> tuple[str, Optional[InlineKeyboardMarkup]]:
+        """Сообщение дайджеста: статус каждого элемента альбома и кнопки для нерешённых"""
+        icons = {"approve": "✅", "reject": "❌", "expire": "⌛"}
+        lines = [f"📚 <b>Дайджест: {len(posts)} предложек</b>", "Номер на кнопке — номер в альбоме.", ""]
+        for number, post in enumerate(posts, 1):
+            author = f"@{html.quote(post.username)}" if post.username else f"ID {post.user_id}"
+            lines.append(f"{number}. {icons.get(post.decision, '⏳')} {author} (#{post.original_message_id})")
+        undecided = [(number, post.original_message_id) for number, post in enumerate(posts, 1) if not post.decision]
+        return "\n".join(lines), KeyboardFactory.get_digest_kb(undecided)
+    
+    def _card_chat_blocked(self, chat_id: int) -> bool:
+        return any(self.breaker.blocked(self.bot.id, api_method, chat_id) for api_method in ('sendPhoto', 'sendVideo'))
+    
+    def _blocked_shard_chats(self) -> set[int]:
+        return {chat_id for chat_id in self.post_manager.shards.active_chats() if self._card_chat_blocked(chat_id)}
+    
+    def _moderation_degraded(self) -> bool:
+        """Отправка карточки сейчас будет отклонена предохранителем: при шардах — во всех чатах шардов"""
+        shards = self.post_manager.shards
+        if shards.enabled:
+            return self._blocked_shard_chats() == shards.active_chats()
+        return self._card_chat_blocked(self.config.MODERATORS_CHAT_ID)
+    
+    async def _refill_from_overflow(self):
+        """Переносит предложки из очереди ожидания по мере освобождения мест"""
+        while len(self.overflow) and not self._moderation_degraded():
+            if self._drain_throttled:
+                # После восстановления API не вываливаем накопившееся разом
+                await self._drain_limiter.acquire()
+            if not await self.post_manager.reserve_slot():
+                return
+            submission = await self.overflow.pop()
+            if submission is None:  # очередь успели разобрать, пока ждали места
+                self.post_manager.release_slot()
+                return
+            if not await self._dispatch_submission(submission, reserved=True):
+                # Модераторам отправить не удалось — возвращаем в конец и ждём следующего цикла
+                await self.overflow.push(submission)
+                return
+            
+            with suppress(TelegramAPIError):
+                await self.bot.send_message(
+                    chat_id=submission.user_id,
+                    text=(
+                        "📨 <b>Твоя предложка передана модераторам!</b>\n\n"
+                        f"{self._queue_status_text(submission.message_id)}"
+                    ),
+                    parse_mode="HTML",
+                    reply_to_message_id=submission.message_id,
+                    allow_sending_without_reply=True
+                )
+        if not len(self.overflow):
+            self._drain_throttled = False
+    
+    async def _overflow_loop(self):
+        """Фоновое пополнение очереди модерации из очереди ожидания"""
+        while True:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._refill_event.wait(), timeout=30)
+            self._refill_event.clear()
+            try:
+                await self._refill_from_overflow()
+            except Exception as e:
+                logging.error(f"Ошибка пополнения очереди модерации: {e}")
+    
+    async def _media_analysis_loop(self):
+        """Фоновый анализ медиа: пометки появляются на карточке после её отправки"""
+        while True:
+            post_id, submission = await self.media.queue.get()
+            try:
+                await self._analyze_submission(post_id, submission)
+            except Exception as e:
+                logging.warning(f"Анализ медиа поста {post_id} не удался: {e}")
+    
+    async def _analyze_submission(self, post_id: int, submission: Submission):
+        result = self.media.cached(submission.file_unique_id)
+        fresh = False
+        if result is None and submission.preview_file_id:
+            buffer = await self.bot.download(submission.preview_file_id)
+            result = await self.media.analyze(buffer.getvalue())
+            self.media.remember(submission.file_unique_id, result)
+            fresh = True
+        notes = self.media.describe(post_id, submission, result)
+        # Повтор того же файла из кеша уже есть в истории под первым постом
+        if fresh and 'blank' not in result['flags']:
+            self.media.add_hash(post_id, result['dhash'], submission.submitted_at.timestamp())
+        if notes:
+            await self._annotate_card(post_id, notes)
+    
+    async def _annotate_card(self, post_id: int, notes: List[str]):
+        """Дописать результаты автопроверки в карточку модерации"""
+        post_data = await self.post_manager.get_post(post_id)
+        if not post_data:
+            return
+        post_data.moderation_caption += f"\n🔍 <b>Автопроверка:</b> {'; '.join(notes)}"
+        self._update_card(post_data)
+    
+    async def _auto_approve(self, submission: Submission) -> bool:
+        """Публикация без модерации для авторов с высокой репутацией"""
+        post_data = PendingPost(
+            user_id=submission.user_id,
+            username=submission.username,
+            original_message_id=submission.message_id,
+            moderator_message_id=0,
+            content_type=submission.content_type,
+            file_id=submission.file_id,
+            caption=submission.caption,
+            timestamp=submission.submitted_at,
+            is_processed=True,
+            moderator_chat_id=self.config.MODERATORS_CHAT_ID,
+            moderation_caption=self._create_moderation_caption(submission),
+            decision="auto",
+            file_unique_id=submission.file_unique_id,
+            priority=PostManager.PRIORITY_TRUSTED
+        )
+        if not await self._publish_to_group(post_data):
+            return False  # публикация не удалась — пусть решают модераторы
+        
+        self.post_manager.record_auto_approval(submission.user_id)
+        self.analytics.record_submission(submission.user_id)
+        self.audit.append({'event': 'submit', 'post': post_data.original_message_id, 'user': post_data.user_id,
+                           'type': post_data.content_type.value, 'auto': True})
+        await asyncio.to_thread(self.archive.add, post_data, "approved", None)
+        
+        # Карточка без кнопок: модераторы видят публикацию, повторы доставки её обновляют
+        caption = self._render_decided_caption(post_data)
+        if sent_msg := await self._send_to_moderators(
+            content_type=post_data.content_type,
+            file_id=post_data.file_id,
+            caption=caption,
+            reply_markup=None
+        ):
+            post_data.moderator_message_id = sent_msg.message_id
+            self.cards.remember(sent_msg.chat.id, sent_msg.message_id, caption, None)
+        logging.info(f"Пост {post_data.original_message_id} от {post_data.user_id} опубликован без модерации")
+        return True
+    
+    def _reputation_line(self, user_id: int) -> str:
+        score, weight = self.post_manager.get_reputation(user_id)
+        if weight < self.config.REPUTATION_MIN_DECISIONS:
+            return "🆕 Репутация: мало решений\n"
+        badge = {
+            PostManager.PRIORITY_TRUSTED: "⭐ доверенный",
+            PostManager.PRIORITY_LOW: "🐢 часто отклоняют",
+        }.get(self.post_manager.get_priority(user_id), "обычный")
+        return f"📈 Репутация: {score:.0%} ({badge})\n"
+    
+    def _create_moderation_caption(self, submission: Submission) -> str:
         """Создает подпись для модераторов"""
-        user = message.from_user
-        content_type = "Фото" if message.photo else "Видео"
-        original_caption = f"\n✏️ Подпись: {message.caption}" if message.caption else ""
+        content_type = "Фото" if submission.content_type == ContentType.PHOTO else "Видео"
+        original_caption = f"\n✏️ Подпись: {submission.caption}" if submission.caption else ""
         
         return (
-            f"📨 <b>Новая предложка #{message.message_id}</b>\n"
+            f"📨 <b>Новая предложка #{submission.message_id}</b>\n"
             f"└ Тип: {content_type}\n"
             f"👤 <b>Отправитель:</b>\n"
-            f"├ ID: <code>{user.id}</code>\n"
-            f"├ Имя: {html.quote(user.first_name or '')}\n"
-            f"└ Юзернейм: @{user.username if user.username else 'нет'}\n"
+            f"├ ID: <code>{submission.user_id}</code>\n"
+            f"├ Имя: {html.quote(submission.first_name or '')}\n"
+            f"└ Юзернейм: @{submission.username if submission.username else 'нет'}\n"
+            f"{self._reputation_line(submission.user_id)}"
             f"{original_caption}"
-            f"⏰ Время: {datetime.now().strftime('%H:%M:%S')}"
+            f"⏰ Время: {submission.submitted_at.strftime('%H:%M:%S')}"
         )
     
     async def _send_to_moderators(self, content_type: ContentType, file_id: str, 
-                                 caption: str, reply_markup: InlineKeyboardMarkup) -> Optional[Message]:
-        """Отправляет контент в чат модераторов"""
+                                 caption: str, reply_markup: Optional[InlineKeyboardMarkup],
+                                 chat_id: Optional[int] = None, thread_id: Optional[int] = None) -> Optional[Message]:
+        """Отправляет контент в чат модераторов (или в шард модератора)"""
         try:
             if content_type == ContentType.PHOTO:
-                return await self.bot.send_photo(
-                    chat_id=BotConfig.MODERATORS_CHAT_ID,
+                sent = await self.bot.send_photo(
+                    chat_id=chat_id or self.config.MODERATORS_CHAT_ID,
+                    message_thread_id=thread_id,
                     photo=file_id,
                     caption=caption,
                     parse_mode="HTML",
                     reply_markup=reply_markup
                 )
             else:
-                return await self.bot.send_video(
-                    chat_id=BotConfig.MODERATORS_CHAT_ID,
+                sent = await self.bot.send_video(
+                    chat_id=chat_id or self.config.MODERATORS_CHAT_ID,
+                    message_thread_id=thread_id,
                     video=file_id,
                     caption=caption,
                     parse_mode="HTML",
                     reply_markup=reply_markup
                 )
+            self.publisher.file_ids.remember(sent)
+            return sent
         except TelegramAPIError as e:
             logging.error(f"Ошибка отправки модераторам: {e}")
             return None
     
     # ================== МОДЕРАЦИЯ ==================
     async def _check_moderator_permission(self, callback: CallbackQuery) -> bool:
-        if callback.from_user.id not in BotConfig.MODERATORS:
+        if callback.from_user.id not in self.config.MODERATORS:
             await callback.answer("❌ Ты не модератор!", show_alert=True)
             return False
         return True
     
-    async def _update_moderator_message(self, callback: CallbackQuery, post_data: PendingPost, action: str, comment: str = ""):
+    def _render_decided_caption(self, post_data: PendingPost) -> str:
+        """Подпись карточки после решения: решение, комментарий, статусы доставки"""
+        if post_data.decision == "approve":
+            emoji = "✅"
+            action_text = "ОДОБРЕНО"
+        elif post_data.decision == "auto":
+            emoji = "⚡"
+            action_text = "ОПУБЛИКОВАНО БЕЗ МОДЕРАЦИИ"
+        elif post_data.decision == "expire":
+            emoji = "⌛"
+            action_text = "СРОК РАССМОТРЕНИЯ ИСТЁК"
+        else:
+            emoji = "❌"
+            action_text = "ОТКЛОНЕНО"
+        
+        comment_text = f"\n💬 Комментарий: {post_data.decision_comment}" if post_data.decision_comment else ""
+        
+        delivery_lines = []
+        for dest_id, status in post_data.deliveries.items():
+            dest = self.publisher.get_destination(dest_id)
+            label = html.quote(dest.label) if dest else f"#{dest_id}"
+            icon = {'ok': "✅", 'retry': "🔄", 'failed': "⚠️"}.get(status, "❔")
+            delivery_lines.append(f"\n📤 {label}: {icon}")
+        
+        decided_by = f" @{post_data.decided_by}" if post_data.decided_by else ""
+        return (
+            f"<s>{post_data.moderation_caption}</s>\n\n"
+            f"{emoji} <b>{action_text}</b>{decided_by}"
+            f"{comment_text}"
+            f"{''.join(delivery_lines)}"
+        )
+    
+    def _render_card(self, post_data: PendingPost) -> tuple[str, Optional[InlineKeyboardMarkup]]:
+        """Желаемое состояние карточки: до решения — с кнопками, после — без"""
+        if post_data.decision:
+            return self._render_decided_caption(post_data), None
+        if post_data.digest_message_id is not None:
+            return post_data.moderation_caption, None  # кнопки элемента альбома — в сообщении дайджеста
+        return post_data.moderation_caption, KeyboardFactory.get_moderation_kb(post_data.original_message_id)
+    
+    def _update_card(self, post_data: PendingPost):
+        """Перерисовать карточку поста и, для элемента альбома, клавиатуру его дайджеста"""
+        if not post_data.moderator_message_id:
+            return  # карточка ещё ждёт отправки дайджеста
+        self.cards.update(post_data)
+        if post_data.digest_message_id:
+            chat_id, digest_message_id = post_data.moderator_chat_id, post_data.digest_message_id
+            self.cards.refresh_text(
+                chat_id, digest_message_id,
+                lambda: self._render_digest(self.post_manager.get_digest_posts(chat_id, digest_message_id))
+            )
+    
+    def _update_moderator_message(self, moderator: User, post_data: PendingPost, action: str, comment: str = ""):
+        post_data.decision = action
+        post_data.decided_by = html.quote(moderator.username or moderator.first_name or 'модератор')
+        post_data.decided_by_id = moderator.id
+        post_data.decision_comment = comment
+        self._update_card(post_data)
+    
+    async def _publish_to_group(self, post_data: PendingPost, comment: str = "") -> bool:
+        """Опубликовать во все места; True, если хотя бы одно получило пост"""
+        deliveries = await self.publisher.publish(post_data, comment)
+        return any(status == 'ok' for status in deliveries.values())
+    
+    async def _publish_retry_loop(self):
+        """Отложенные повторы неудавшихся доставок с обновлением карточек"""
+        while True:
+            await asyncio.sleep(self.config.PUBLISH_RETRY_INTERVAL_SECONDS)
+            if len(self.publisher):
+                await self._retry_deliveries()
+    
+    async def _retry_deliveries(self):
+        for post_data in await self.publisher.retry_pending():
+            self._update_card(post_data)
+            if post_data.decision == "approve":
+                await self._archive_approval(post_data)
+    
+    async def _send_user_notification(self, user_id: int, notes: List[DecisionNote]) -> bool:
         try:
-            await self.bot.edit_message_reply_markup(
-                chat_id=BotConfig.MODERATORS_CHAT_ID,
-                message_id=post_data.moderator_message_id,
-                reply_markup=None
+            await self.bot.send_message(
+                chat_id=user_id,
+                text=NotificationDigest.render(notes),
+                parse_mode="HTML"
             )
-            
-            username = html.quote(callback.from_user.username or callback.from_user.first_name or 'модератор')
-            
+            return True
+        except TelegramAPIError as e:
+            logging.error(f"Не удалось уведомить пользователя {user_id}: {e}")
+            return False
+    
+    async def _notify_user_decision(self, post_data: PendingPost, approved: bool, comment: str = "") -> bool:
+        """Уведомить автора сразу или положить решение в дайджест"""
+        if not self.audience.is_reachable(post_data.user_id):
+            return False
+        
+        note = DecisionNote(post_id=post_data.original_message_id, approved=approved, comment=comment)
+        if self.config.DIGEST_WINDOW_SECONDS <= 0:
+            return await self._send_user_notification(post_data.user_id, [note])
+        
+        self.digest.add(post_data.user_id, note)
+        return True
+    
+    async def _digest_loop(self):
+        """Отправка накопленных дайджестов по таймеру"""
+        while True:
+            await asyncio.sleep(self.digest.tick_seconds)
+            for user_id, notes in self.digest.due():
+                await self._send_user_notification(user_id, notes)
+    
+    async def _apply_decision(self, post_data: PendingPost, action: str, moderator: User, comment: str = "") -> bool:
+        """Обновить карточку и опубликовать пост или уведомить автора"""
+        self._refill_event.set()
+        latency = (datetime.now() - post_data.timestamp).total_seconds()
+        self.analytics.record_decision(
+            moderator.id, moderator.username or moderator.first_name or str(moderator.id), action == "approve", latency
+        )
+        self.audit.append({
+            'event': 'decision', 'post': post_data.original_message_id, 'user': post_data.user_id,
+            'mod': moderator.id, 'action': action, 'comment': comment,
+            'latency': round(latency)
+        })
+        if action == "approve":
+            # Сначала публикуем, чтобы статусы доставки попали в ту же правку карточки
+            published = await self._publish_to_group(post_data, comment)
+            self._update_moderator_message(moderator, post_data, action, comment)
+            await self._archive_approval(post_data)
+            if published:
+                await self._notify_user_decision(post_data, True, comment)
+            return published
+        await asyncio.to_thread(self.archive.add, post_data, self.ARCHIVE_OUTCOMES[action], moderator.id, comment)
+        self._update_moderator_message(moderator, post_data, action, comment)
+        return await self._notify_user_decision(post_data, False, comment)
+    
+    async def _archive_approval(self, post_data: PendingPost):
+        """Записать одобрение в архив по итогам доставки: неопубликованное не считается дублем"""
+        statuses = set(post_data.deliveries.values())
+        if post_data.archived or ('retry' in statuses and 'ok' not in statuses):
+            return  # итог решат отложенные повторы
+        post_data.archived = True
+        outcome = 'approved' if 'ok' in statuses else 'publish_failed'
+        await asyncio.to_thread(
+            self.archive.add, post_data, outcome, post_data.decided_by_id, post_data.decision_comment
+        )
+    
+    def _card_reply_filter(self, message: Message) -> bool | Dict[str, Any]:
+        """Ответ «+ …» или «- …» на карточку модерации"""
+        reply = message.reply_to_message
+        if not reply or not message.text or message.text.lstrip()[:1] not in ("+", "-"):
+            return False
+        post_data = self.post_manager.get_post_by_card(message.chat.id, reply.message_id)
+        if not post_data:
+            return False
+        return {'post_data': post_data}
+    
+    async def _handle_card_reply(self, message: Message, post_data: PendingPost):
+        """Одобрение/отклонение ответом на карточку без FSM"""
+        if message.from_user.id not in self.config.MODERATORS:
+            await message.reply("❌ Ты не модератор!")
+            return
+        
+        text = message.text.lstrip()
+        action = "approve" if text[0] == "+" else "reject"
+        comment = text[1:].strip()[:self.config.MAX_COMMENT_LENGTH]
+        post_id = post_data.original_message_id
+        
+        if not await self.post_manager.claim_posts([post_id], approved=action == "approve"):
+            await message.reply("Предожка уже обработана или устарела.")
+            return
+        
+        success = await self._apply_decision(post_data, action, message.from_user, comment)
+        logging.info(f"Пост {post_id}: {action} ответом на карточку от {message.from_user.id}")
+        
+        if not success:
             if action == "approve":
-                emoji = "✅"
-                action_text = "ОДОБРЕНО"
+                await message.reply("⚠️ Ошибка при публикации в группу.")
             else:
-                emoji = "❌"
-                action_text = "ОТКЛОНЕНО"
-            
-            comment_text = f"\n💬 Комментарий: {comment}" if comment else ""
-            
-            new_caption = (
-                f"<s>{callback.message.caption or ''}</s>\n\n"
-                f"{emoji} <b>{action_text}</b> @{username}"
-                f"{comment_text}"
+                await message.reply("❌ Предожка отклонена. Не удалось уведомить пользователя.")
+    
+    async def _approve_post(self, callback: CallbackQuery):
+        if not await self._check_moderator_permission(callback):
+            return
+        
+        post_id = int(callback.data.split("_")[1])
+        claimed = await self.post_manager.claim_posts([post_id], approved=True)
+        
+        if not claimed:
+            await callback.answer("Предожка уже обработана или устарела.")
+            return
+        
+        success = await self._apply_decision(claimed[0], "approve", callback.from_user)
+        
+        if success:
+            await callback.answer("✅ Предожка одобрена и опубликована!")
+            logging.info(f"Пост {post_id} одобрен {callback.from_user.id}")
+        else:
+            await callback.answer("⚠️ Ошибка при публикации в группу.", show_alert=True)
+    
+    async def _reject_post(self, callback: CallbackQuery):
+        if not await self._check_moderator_permission(callback):
+            return
+        
+        post_id = int(callback.data.split("_")[1])
+        claimed = await self.post_manager.claim_posts([post_id], approved=False)
+        
+        if not claimed:
+            await callback.answer("Предожка уже обработана.")
+            return
+        
+        user_notified = await self._apply_decision(claimed[0], "reject", callback.from_user)
+        
+        if user_notified:
+            await callback.answer("❌ Предожка отклонена. Пользователь получит уведомление.")
+            logging.info(f"Пост {post_id} отклонен {callback.from_user.id}")
+        else:
+            await callback.answer("❌ Предожка отклонена. Не удалось уведомить пользователя.", show_alert=True)
+    
+    async def _start_comment_session(self, callback: CallbackQuery, action: str):
+        """Открыть черновик комментария модератора к посту"""
+        if not await self._check_moderator_permission(callback):
+            return
+        
+        post_id = int(callback.data.split("_")[2])
+        post_data = await self.post_manager.get_post(post_id)
+        
+        if not post_data or post_data.is_processed:
+            await callback.answer("Предожка уже обработана или устарела.")
+            return
+        
+        session = self.comment_sessions.open(callback.from_user.id, post_id, action, callback.message.chat.id)
+        
+        if action == "approve":
+            prompt = (
+                f"💬 <b>Введите комментарий для публикации #{post_id}:</b>\n\n"
+                "Этот комментарий будет отображен вместе с постом в группе.\n"
+                "Быстрее: ответьте на карточку сообщением «+ текст».\n"
             )
-            
-            await self.bot.edit_message_caption(
-                chat_id=BotConfig.MODERATORS_CHAT_ID,
-                message_id=post_data.moderator_message_id,
-                caption=new_caption,
-                parse_mode="HTML"
+        else:
+            prompt = (
+                f"📝 <b>Введите причину отклонения #{post_id}:</b>\n\n"
+                "Этот комментарий будет отправлен пользователю.\n"
+                "Быстрее: ответьте на карточку сообщением «- причина».\n"
             )
-                    
-        except TelegramBadRequest as e:
-            if "message is not modified" not in str(e):
-                logging.warning(f"Не удалось обновить сообщение модерации: {e}")
+        
+        prompt_msg = await callback.message.answer(
+            f"{prompt}"
+            "Если открыто несколько черновиков — отвечайте на это сообщение.\n"
+            "Используйте /cancel для отмены.",
+            parse_mode="HTML",
+            reply_markup=KeyboardFactory.get_cancel_kb()
+        )
+        self.comment_sessions.attach_prompt(session, prompt_msg.message_id)
+        await callback.answer()
+    
+    async def _approve_with_comment_start(self, callback: CallbackQuery):
+        await self._start_comment_session(callback, "approve")
+    
+    async def _reject_with_comment_start(self, callback: CallbackQuery):
+        await self._start_comment_session(callback, "reject")
+    
+    def _comment_session_filter(self, message: Message, raw_state: Optional[str] = None) -> bool | Dict[str, Any]:
+        """Текст модератора, относящийся к открытому черновику комментария"""
+        if not message.text or message.text.startswith('/') or not message.from_user:
+            return False
+        reply_to = message.reply_to_message.message_id if message.reply_to_message else None
+        session = self.comment_sessions.resolve(message.from_user.id, message.chat.id, reply_to)
+        if not session:
+            return False
+        # Ввод в админ-панели не перехватываем, если это не явный ответ на запрос комментария
+        if raw_state is not None and session.prompt_message_id != reply_to:
+            return False
+        return {'session': session}
+    
+    async def _handle_comment(self, message: Message, session: CommentSession):
+        """Завершить черновик комментария: одобрить или отклонить пост"""
+        self.comment_sessions.close(session)
+        post_id = session.post_id
+        post_data = await self.post_manager.get_post(post_id)
+        
+        if not post_data or not await self.post_manager.claim_posts([post_id], approved=session.action == "approve"):
+            await message.answer("Предожка уже обработана или устарела.")
+            return
+        
+        comment = message.text[:self.config.MAX_COMMENT_LENGTH]
+        success = await self._apply_decision(post_data, session.action, message.from_user, comment)
+        
+        if session.action == "approve":
+            if success:
+                await message.answer(f"✅ Предожка #{post_id} одобрена с комментарием!")
+                logging.info(f"Пост {post_id} одобрен с комментарием {message.from_user.id}")
+            else:
+                await message.answer("⚠️ Ошибка при публикации в группу.")
+        else:
+            if success:
+                await message.answer(f"❌ Предожка #{post_id} отклонена с комментарием.")
+                logging.info(f"Пост {post_id} отклонен с комментарием {message.from_user.id}")
+            else:
+                await message.answer("❌ Предожка отклонена. Не удалось уведомить пользователя.")
+    
+    async def _cancel_input(self, callback: CallbackQuery, state: FSMContext):
+        if session := self.comment_sessions.get_by_prompt(callback.message.chat.id, callback.message.message_id):
+            self.comment_sessions.close(session)
+        else:
+            await state.clear()
+        await callback.message.edit_text(
+            "❌ Действие отменено.",
+            reply_markup=None
+        )
+        await callback.answer()
+    
+    async def _comment_session_loop(self):
+        """Истечение брошенных черновиков комментариев"""
+        while True:
+            await asyncio.sleep(self.comment_sessions.tick_seconds)
+            for session in self.comment_sessions.expire():
+                if session.prompt_message_id is None:
+                    continue
+                with suppress(TelegramAPIError):
+                    await self.bot.edit_message_text(
+                        chat_id=session.chat_id,
+                        message_id=session.prompt_message_id,
+                        text=f"⌛ Время на комментарий к #{session.post_id} истекло.",
+                        reply_markup=None
+                    )
+    
+    # ================== ШАРДИРОВАНИЕ ==================
+    async def _reassign_post(self, post_data: PendingPost) -> bool:
+        """Переотправить карточку поста в другой шард"""
+        post_id = post_data.original_message_id
+        shard = self.post_manager.shards.assign(post_id, exclude=post_data.shard_id,
+                                                blocked_chats=self._blocked_shard_chats())
+        if not shard:
+            return False
+        
+        sent_msg = None
+        try:
+            sent_msg = await self._send_to_moderators(
+                content_type=post_data.content_type,
+                file_id=self.publisher.file_ids.resolve(post_data.file_unique_id, post_data.file_id),
+                caption=post_data.moderation_caption,
+                reply_markup=KeyboardFactory.get_moderation_kb(post_id),
+                chat_id=shard.chat_id,
+                thread_id=shard.thread_id
+            )
+        finally:
+            if not sent_msg:
+                # Карточка не ушла — пост по-прежнему числится за старым шардом
+                self.post_manager.shards.restore(post_id, post_data.shard_id)
+        if not sent_msg:
+            return False
+        
+        old_chat_id, old_message_id = post_data.moderator_chat_id, post_data.moderator_message_id
+        await self.post_manager.reassign_post(post_id, shard, sent_msg.message_id)
+        self.cards.remember(sent_msg.chat.id, sent_msg.message_id, *self._render_card(post_data))
+        self.cards.replace(
+            old_chat_id, old_message_id,
+            f"<s>{post_data.moderation_caption}</s>\n\n↪️ <b>Передано другому модератору</b>", None
+        )
+        
+        logging.info(f"Пост {post_id} переназначен на шард #{shard.shard_id} (модератор {shard.moderator_id})")
+        return True
+    
+    async def _shard_rebalance_loop(self):
+        """Фоновая переотправка постов, на которые не ответили вовремя"""
+        while True:
+            await asyncio.sleep(60)
+            if not self.post_manager.shards.enabled:
+                continue
+            
+            for post_data in self.post_manager.get_overdue_assignments():
+                try:
+                    await self._reassign_post(post_data)
+                except Exception as e:
+                    logging.error(f"Ошибка переназначения поста {post_data.original_message_id}: {e}")
+    
+    @staticmethod
+    def _card_link(post_data: PendingPost) -> str:
+        """Ссылка на карточку в супергруппе (в личных шардах — просто номер)"""
+        chat = str(post_data.moderator_chat_id)
+        if not chat.startswith("-100"):
+            return f"#{post_data.original_message_id}"
+        thread = f"{post_data.moderator_thread_id}/" if post_data.moderator_thread_id else ""
+        return f'<a href="https://t.me/c/{chat[4:]}/{thread}{post_data.moderator_message_id}">#{post_data.original_message_id}</a>'
     
-    async def _publish_to_group(self, post_data: PendingPost, comment: str = ""):
+    async def _send_deadline_reminder(self, post_ids: List[int]):
+        """Одно сообщение модераторам со всеми зависшими постами"""
+        posts = [
+            post for post_id in post_ids
+            if (post := await self.post_manager.get_post(post_id)) and not post.is_processed
+        ]
+        if not posts:
+            return
+        
+        posts.sort(key=lambda post: post.timestamp)
+        now = datetime.now()
+        lines = [f"⏰ <b>Ждут решения: {len(posts)}</b>\n"]
+        for post in posts[:self.REMINDER_MAX_LINES]:
+            age = self._format_eta(now - post.timestamp).lstrip('~')
+            lines.append(f"• {self._card_link(post)} — {age}")
+        if len(posts) > self.REMINDER_MAX_LINES:
+            lines.append(f"…и ещё {len(posts) - self.REMINDER_MAX_LINES}")
+        
         try:
-            caption = comment if comment else None
-            
-            if post_data.content_type == ContentType.PHOTO:
-                await self.bot.send_photo(
-                    chat_id=BotConfig.MAIN_GROUP_ID,
-                    message_thread_id=BotConfig.MAIN_GROUP_THREAD_ID,
-                    photo=post_data.file_id,
-                    caption=caption,
-                    parse_mode="HTML" if caption else None
-                )
-            else:
-                await self.bot.send_video(
-                    chat_id=BotConfig.MAIN_GROUP_ID,
-                    message_thread_id=BotConfig.MAIN_GROUP_THREAD_ID,
-                    video=post_data.file_id,
-                    caption=caption,
-                    parse_mode="HTML" if caption else None
-                )
-            
-            return True
+            await self.bot.send_message(
+                chat_id=self.config.MODERATORS_CHAT_ID,
+                text="\n".join(lines),
+                parse_mode="HTML",
+                disable_web_page_preview=True
+            )
         except TelegramAPIError as e:
-            logging.error(f"Ошибка публикации в группу: {e}")
-            return False
+            logging.error(f"Не удалось отправить напоминание модераторам: {e}")
     
-    async def _notify_user_rejection(self, post_data: PendingPost, comment: str = ""):
+    async def _expire_post(self, post_data: PendingPost) -> bool:
+        """Снять кнопки с карточки и сообщить автору об истечении срока"""
+        self._update_card(post_data)
+        self.analytics.record_expiry()
+        self.audit.append({'event': 'expire', 'post': post_data.original_message_id, 'user': post_data.user_id})
+        await asyncio.to_thread(self.archive.add, post_data, "expired", None)
+        if not self.audience.is_reachable(post_data.user_id):
+            return True
         try:
-            comment_text = f"\n\n<b>Комментарий модератора:</b>\n{comment}" if comment else ""
-            
             await self.bot.send_message(
                 chat_id=post_data.user_id,
                 text=(
-                    "❌ <b>Ваша предложка была отклонена модератором</b>\n\n"
-                    "Не расстраивайся! Попробуй отправить что-то другое."
-                    f"{comment_text}"
+                    "⌛ <b>Твоя предложка не дождалась модерации</b>\n\n"
+                    f"За {self.config.CLEANUP_INTERVAL_HOURS} ч её никто не рассмотрел, и она снята с очереди. "
+                    "Можешь прислать её ещё раз."
                 ),
-                parse_mode="HTML"
+                parse_mode="HTML",
+                reply_to_message_id=post_data.original_message_id,
+                allow_sending_without_reply=True
             )
-            return True
         except TelegramAPIError as e:
-            logging.error(f"Не удалось уведомить пользователя {post_data.user_id}: {e}")
-            return False
+            logging.warning(f"Не удалось уведомить {post_data.user_id} об истечении срока: {e}")
+        return True
     
-    async def _approve_post(self, callback: CallbackQuery):
-        if not await self._check_moderator_permission(callback):
-            return
-        
-        post_id = int(callback.data.split("_")[1])
-        post_data = await self.post_manager.get_post(post_id)
-        
-        if not post_data or post_data.is_processed:
-            await callback.answer("Предожка уже обработана или устарела.")
-            return
-        
-        await self._update_moderator_message(callback, post_data, "approve")
-        success = await self._publish_to_group(post_data)
-        
-        if success:
-            await callback.answer("✅ Предожка одобрена и опубликована!")
-            logging.info(f"Пост {post_id} одобрен {callback.from_user.id}")
-        else:
-            await callback.answer("⚠️ Ошибка при публикации в группу.", show_alert=True)
-        
-        await self.post_manager.mark_approved(post_id)
+    async def _deadline_loop(self):
+        """Напоминания о зависших постах и снятие просроченных"""
+        executor = BulkExecutor(self.config.BULK_RATE_PER_SECOND, self.config.BULK_CONCURRENCY)
+        last_cleanup = time.monotonic()
+        while True:
+            await asyncio.sleep(self.post_manager.deadlines.tick_seconds)
+            try:
+                reminders, expired = self.post_manager.deadlines.advance()
+                if reminders:
+                    await self._send_deadline_reminder(reminders)
+                if expired_posts := await self.post_manager.expire_posts(expired):
+                    self._refill_event.set()
+                    await executor.run(expired_posts, self._expire_post)
+                if time.monotonic() - last_cleanup > 3600:
+                    last_cleanup = time.monotonic()
+                    await self.post_manager._cleanup_old_posts()
+            except Exception as e:
+                logging.error(f"Ошибка планировщика сроков: {e}")
     
-    async def _reject_post(self, callback: CallbackQuery):
-        if not await self._check_moderator_permission(callback):
+    # ================== МАССОВЫЕ ДЕЙСТВИЯ ==================
+    async def _start_bulk_job(self, moderator: User, chat_id: int, post_ids: List[int], action: str):
+        """Забрать посты одной транзакцией и запустить пакетную обработку"""
+        posts = await self.post_manager.claim_posts(post_ids, approved=action == "approve")
+        if not posts:
+            await self.bot.send_message(chat_id, "ℹ️ Нет подходящих необработанных постов.")
             return
         
-        post_id = int(callback.data.split("_")[1])
-        post_data = await self.post_manager.get_post(post_id)
-        
-        if not post_data or post_data.is_processed:
-            await callback.answer("Предожка уже обработана.")
-            return
+        status = await self.bot.send_message(chat_id, f"⏳ Массовое действие: 0/{len(posts)}")
+        task = asyncio.create_task(self._run_bulk_job(moderator, status, posts, action))
+        self._bulk_jobs.add(task)
+        task.add_done_callback(self._bulk_jobs.discard)
+    
+    async def _run_bulk_job(self, moderator: User, status: Message, posts: List[PendingPost], action: str):
+        """Обновить карточки, опубликовать/уведомить и показывать прогресс"""
+        executor = BulkExecutor(self.config.BULK_RATE_PER_SECOND, self.config.BULK_CONCURRENCY)
+        action_text = "Одобрение" if action == "approve" else "Отклонение"
+        last_report = 0.0
         
-        await self._update_moderator_message(callback, post_data, "reject")
-        user_notified = await self._notify_user_rejection(post_data)
+        async def report(done: int, failed: int, total: int):
+            nonlocal last_report
+            if done + failed < total and time.monotonic() - last_report < 2:
+                return
+            last_report = time.monotonic()
+            with suppress(TelegramAPIError):
+                await status.edit_text(f"⏳ {action_text}: {done + failed}/{total} (ошибок: {failed})")
         
-        if user_notified:
-            await callback.answer("❌ Предожка отклонена. Пользователь уведомлен.")
-            logging.info(f"Пост {post_id} отклонен {callback.from_user.id}")
-        else:
-            await callback.answer("❌ Предожка отклонена. Не удалось уведомить пользователя.", show_alert=True)
+        # Правка карточки и публикация (или уведомление) — по одному вызову
+        done, failed = await executor.run(
+            posts,
+            lambda post: self._apply_decision(post, action, moderator),
+            cost=2,
+            on_progress=report
+        )
         
-        await self.post_manager.mark_rejected(post_id)
+        with suppress(TelegramAPIError):
+            await status.edit_text(
+                f"✅ {action_text} завершено\n\n"
+                f"• Обработано: {done}\n"
+                f"• С ошибками: {failed}"
+            )
+        logging.info(f"Массовое действие {action} от {moderator.id}: {done} успешно, {failed} с ошибками")
     
-    async def _approve_with_comment_start(self, callback: CallbackQuery, state: FSMContext):
-        if not await self._check_moderator_permission(callback):
+    async def _admin_bulk(self, callback: CallbackQuery, state: FSMContext):
+        if callback.from_user.id not in self.config.ADMIN_IDS:
+            await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
-        post_id = int(callback.data.split("_")[2])
-        post_data = await self.post_manager.get_post(post_id)
-        
-        if not post_data or post_data.is_processed:
-            await callback.answer("Предожка уже обработана или устарела.")
+        await state.clear()
+        await callback.message.edit_text(
+            "🧰 <b>Массовые действия</b>\n\n"
+            f"Постов в очереди: {self.post_manager.get_queue_page(0, 0)[1]}\n"
+            "Выберите действие:",
+            parse_mode="HTML",
+            reply_markup=KeyboardFactory.get_bulk_kb()
+        )
+        await callback.answer()
+    
+    async def _bulk_by_user(self, callback: CallbackQuery, state: FSMContext):
+        if callback.from_user.id not in self.config.ADMIN_IDS:
+            await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
-        await state.set_state(CommentStates.waiting_for_approve_comment)
-        await state.update_data(post_id=post_id, moderator_id=callback.from_user.id)
-        
+        await state.set_state(AdminStates.waiting_bulk_user)
         await callback.message.answer(
-            "💬 <b>Введите комментарий для публикации:</b>\n\n"
-            "Этот комментарий будет отображен вместе с постом в группе.\n"
+            "❌ <b>Отклонить все предложки пользователя</b>\n\n"
+            "Введите ID пользователя:\n"
             "Используйте /cancel для отмены.",
             parse_mode="HTML",
             reply_markup=KeyboardFactory.get_cancel_kb()
         )
         await callback.answer()
     
-    async def _reject_with_comment_start(self, callback: CallbackQuery, state: FSMContext):
-        if not await self._check_moderator_permission(callback):
-            return
-        
-        post_id = int(callback.data.split("_")[2])
-        post_data = await self.post_manager.get_post(post_id)
-        
-        if not post_data or post_data.is_processed:
-            await callback.answer("Предожка уже обработана.")
+    async def _bulk_by_age(self, callback: CallbackQuery, state: FSMContext):
+        if callback.from_user.id not in self.config.ADMIN_IDS:
+            await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
-        await state.set_state(CommentStates.waiting_for_reject_comment)
-        await state.update_data(post_id=post_id, moderator_id=callback.from_user.id)
-        
+        await state.set_state(AdminStates.waiting_bulk_age)
         await callback.message.answer(
-            "📝 <b>Введите причину отклонения:</b>\n\n"
-            "Этот комментарий будет отправлен пользователю.\n"
+            "⏳ <b>Отклонить всё старше N часов</b>\n\n"
+            "Введите возраст в часах:\n"
             "Используйте /cancel для отмены.",
             parse_mode="HTML",
             reply_markup=KeyboardFactory.get_cancel_kb()
         )
         await callback.answer()
     
-    async def _handle_approve_comment(self, message: Message, state: FSMContext):
-        data = await state.get_data()
-        post_id = data.get('post_id')
-        moderator_id = data.get('moderator_id')
-        
-        # Проверяем, что сообщение от того же модератора
-        if message.from_user.id != moderator_id:
-            await message.answer("❌ Это не ваш запрос на комментарий.")
+    async def _queue_toggle_select(self, callback: CallbackQuery):
+        if callback.from_user.id not in self.config.ADMIN_IDS:
+            await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
-        if not post_id:
-            await message.answer("Ошибка: данные поста не найдены.")
-            await state.clear()
+        _, post_id, offset, content_filter, user_id = callback.data.split("_")
+        selected = self._bulk_selection.setdefault(callback.from_user.id, set())
+        selected.symmetric_difference_update({int(post_id)})
+        
+        text, reply_markup = self._render_queue_page(int(offset), content_filter, int(user_id), callback.from_user.id)
+        with suppress(TelegramBadRequest):
+            await callback.message.edit_text(text, parse_mode="HTML", reply_markup=reply_markup)
+        await callback.answer()
+    
+    async def _bulk_selected(self, callback: CallbackQuery):
+        if callback.from_user.id not in self.config.ADMIN_IDS:
+            await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
-        post_data = await self.post_manager.get_post(post_id)
-        if not post_data or post_data.is_processed:
-            await message.answer("Предожка уже обработана или устарела.")
-            await state.clear()
+        selected = self._bulk_selection.pop(callback.from_user.id, set())
+        action = "approve" if callback.data == "bulk_sel_approve" else "reject"
+        await callback.answer()
+        await self._start_bulk_job(callback.from_user, callback.message.chat.id, sorted(selected), action)
+    
+    async def _bulk_clear_selection(self, callback: CallbackQuery):
+        if callback.from_user.id not in self.config.ADMIN_IDS:
+            await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
-        comment = message.text[:BotConfig.MAX_COMMENT_LENGTH]
+        self._bulk_selection.pop(callback.from_user.id, None)
+        offset, content_filter, user_id = callback.data.split("_")[3:]
+        text, reply_markup = self._render_queue_page(int(offset), content_filter, int(user_id), callback.from_user.id)
+        with suppress(TelegramBadRequest):
+            await callback.message.edit_text(text, parse_mode="HTML", reply_markup=reply_markup)
+        await callback.answer()
+    
+    # ================== РАССЫЛКА ==================
+    async def _run_broadcast(self, source: Message):
+        """Копирует сообщение админа всем доступным получателям"""
+        limiter = RateLimiter(self.config.BROADCAST_RATE_PER_SECOND)
+        sent = failed = 0
         
-        # Создаем fake callback для обновления сообщения
-        class FakeCallback:
-            def __init__(self, user, message_text):
-                self.from_user = user
-                self.message = type('obj', (object,), {'caption': message_text})()
-                self.data = f"approve_{post_id}"
-            
-            async def answer(self, text, show_alert=False):
-                pass
+        for user_id in self.audience.iter_recipients():
+            await limiter.acquire()
+            try:
+                await self.bot.copy_message(
+                    chat_id=user_id,
+                    from_chat_id=source.chat.id,
+                    message_id=source.message_id
+                )
+                sent += 1
+            except TelegramAPIError as e:
+                # 403 уже учтён AudienceMiddleware
+                logging.warning(f"Рассылка: не удалось отправить {user_id}: {e}")
+                failed += 1
         
-        fake_callback = FakeCallback(message.from_user, "")
-        await self._update_moderator_message(fake_callback, post_data, "approve", comment)
+        logging.info(f"Рассылка от {source.from_user.id} завершена: {sent} доставлено, {failed} ошибок")
+        with suppress(TelegramAPIError):
+            await source.answer(
+                "📢 <b>Рассылка завершена</b>\n\n"
+                f"• Доставлено: {sent}\n"
+                f"• Ошибок: {failed}",
+                parse_mode="HTML"
+            )
+    
+    async def _audience_flush_loop(self):
+        """Периодическое сохранение индекса аудитории вне event loop"""
+        while True:
+            await asyncio.sleep(30)
+            if (data := self.audience.dump()) is not None:
+                try:
+                    await asyncio.to_thread(self.audience.write, data)
+                except OSError as e:
+                    logging.error(f"Ошибка сохранения индекса аудитории: {e}")
+    
+    async def _audit_compact_loop(self):
+        """Периодическое слияние старых сегментов журнала аудита"""
+        while True:
+            await asyncio.sleep(3600)
+            try:
+                await self.audit.compact(self.config.AUDIT_COMPACT_SEGMENTS)
+            except OSError as e:
+                logging.error(f"Ошибка сжатия журнала аудита: {e}")
+    
+    @staticmethod
+    def _format_audit_record(record: Dict[str, Any]) -> str:
+        when = datetime.fromtimestamp(record['ts']).strftime('%d.%m %H:%M')
+        if record['event'] == 'submit':
+            return f"📥 {when} — #{record['post']} прислал <code>{record['user']}</code>"
+        if record['event'] == 'expire':
+            return f"⌛ {when} — #{record['post']} снят по истечении срока"
+        icon = "✅" if record['action'] == "approve" else "❌"
+        line = (
+            f"{icon} {when} — #{record['post']} решил <code>{record['mod']}</code> "
+            f"через {MemesModerationBot._format_eta(timedelta(seconds=record['latency'])).lstrip('~')}"
+        )
+        if record.get('comment'):
+            line += f"\n    💬 {html.quote(record['comment'][:100])}"
+        return line
+    
+    async def _cmd_audit(self, message: Message, command: CommandObject):
+        """Команда /audit <post_id> или /audit mod <id> — история решений"""
+        if message.from_user.id not in self.config.ADMIN_IDS:
+            await message.answer("⛔ Нет доступа!")
+            return
         
-        success = await self._publish_to_group(post_data, comment)
+        args = (command.args or "").split()
+        try:
+            if len(args) == 2 and args[0] == "mod":
+                moderator_id = int(args[1])
+                title = f"🧾 <b>Последние решения модератора</b> <code>{moderator_id}</code>"
+                records = self.audit.moderator_history(moderator_id, self.config.QUEUE_PAGE_SIZE)
+            elif len(args) == 1:
+                post_id = int(args[0].lstrip('#'))
+                title = f"🧾 <b>История поста #{post_id}</b>"
+                records = self.audit.post_history(post_id)
+            else:
+                raise ValueError
+        except ValueError:
+            await message.answer("Использование: /audit &lt;номер поста&gt; или /audit mod &lt;id модератора&gt;", parse_mode="HTML")
+            return
         
-        if success:
-            await message.answer(f"✅ Предожка одобрена с комментарием!")
-            logging.info(f"Пост {post_id} одобрен с комментарием {message.from_user.id}")
-        else:
-            await message.answer("⚠️ Ошибка при публикации в группу.")
+        if not records:
+            await message.answer("📭 В журнале аудита ничего не найдено.")
+            return
+        lines = [title, ""] + [self._format_audit_record(record) for record in records]
+        await message.answer("\n".join(lines), parse_mode="HTML")
+    
+    async def _render_search_page(self, query: str, offset: int) -> tuple[str, Optional[InlineKeyboardMarkup]]:
+        page_size = self.config.QUEUE_PAGE_SIZE
+        rows, has_next = await asyncio.to_thread(self.archive.search, query, offset, page_size)
+        if not rows:
+            return f"🔎 По запросу «{html.quote(query)}» ничего не найдено.", None
         
-        await self.post_manager.mark_approved(post_id)
-        await state.clear()
+        lines = [f"🔎 <b>Архив: «{html.quote(query)}»</b>\n"]
+        for number, row in enumerate(rows, start=offset + 1):
+            kind = "📸" if row['content_type'] == ContentType.PHOTO.value else "🎥"
+            outcome = {'approved': "✅", 'publish_failed': "⚠️", 'expired': "⌛"}.get(row['outcome'], "❌")
+            decided = datetime.fromtimestamp(row['decided_at']).strftime('%d.%m.%Y')
+            text = row['caption'] or row['comment'] or ""
+            lines.append(
+                f"{number}. {kind}{outcome} {decided} #{row['post_id']} от <code>{row['user_id']}</code>"
+                + (f" — {html.quote(text[:60])}" if text else "")
+            )
+        keyboard = KeyboardFactory.get_search_kb([row['id'] for row in rows], offset, has_next, page_size)
+        return "\n".join(lines), keyboard
     
-    async def _handle_reject_comment(self, message: Message, state: FSMContext):
-        data = await state.get_data()
-        post_id = data.get('post_id')
-        moderator_id = data.get('moderator_id')
+    async def _cmd_search(self, message: Message, command: CommandObject):
+        """Команда /search <текст> [user:<id>] [since:<ДД.ММ.ГГГГ>] — поиск по архиву"""
+        if message.from_user.id not in self.config.ADMIN_IDS:
+            await message.answer("⛔ Нет доступа!")
+            return
+        
+        query = (command.args or "").strip()
+        if not query:
+            await message.answer(
+                "Использование: /search &lt;текст&gt; [user:&lt;id&gt;] [since:&lt;ДД.ММ.ГГГГ&gt;]",
+                parse_mode="HTML"
+            )
+            return
         
-        if message.from_user.id != moderator_id:
-            await message.answer("❌ Это не ваш запрос на комментарий.")
+        self._search_queries[message.from_user.id] = query
+        text, reply_markup = await self._render_search_page(query, 0)
+        await message.answer(text, parse_mode="HTML", reply_markup=reply_markup)
+    
+    async def _search_page(self, callback: CallbackQuery):
+        if callback.from_user.id not in self.config.ADMIN_IDS:
+            await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
-        if not post_id:
-            await message.answer("Ошибка: данные поста не найдены.")
-            await state.clear()
+        query = self._search_queries.get(callback.from_user.id)
+        if not query:
+            await callback.answer("Поиск устарел, повтори /search", show_alert=True)
             return
         
-        post_data = await self.post_manager.get_post(post_id)
-        if not post_data or post_data.is_processed:
-            await message.answer("Предожка уже обработана.")
-            await state.clear()
+        text, reply_markup = await self._render_search_page(query, int(callback.data.split("_")[1]))
+        with suppress(TelegramBadRequest):
+            await callback.message.edit_text(text, parse_mode="HTML", reply_markup=reply_markup)
+        await callback.answer()
+    
+    async def _search_resend(self, callback: CallbackQuery):
+        """Переслать медиа из архива по file_id"""
+        if callback.from_user.id not in self.config.ADMIN_IDS:
+            await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
-        comment = message.text[:BotConfig.MAX_COMMENT_LENGTH]
+        row = await asyncio.to_thread(self.archive.get, int(callback.data.split("_")[1]))
+        if not row:
+            await callback.answer("Запись не найдена", show_alert=True)
+            return
         
-        class FakeCallback:
-            def __init__(self, user, message_text):
-                self.from_user = user
-                self.message = type('obj', (object,), {'caption': message_text})()
-                self.data = f"reject_{post_id}"
-            
-            async def answer(self, text, show_alert=False):
-                pass
+        caption = f"#{row['post_id']} от <code>{row['user_id']}</code>"
+        if row['caption']:
+            caption += f"\n✏️ {html.quote(row['caption'])}"
+        file_id = self.publisher.file_ids.resolve(row['file_unique_id'], row['file_id'])
+        try:
+            if row['content_type'] == ContentType.PHOTO.value:
+                await callback.message.answer_photo(file_id, caption=caption, parse_mode="HTML")
+            else:
+                await callback.message.answer_video(file_id, caption=caption, parse_mode="HTML")
+            await callback.answer()
+        except TelegramBadRequest as e:
+            logging.error(f"Не удалось переслать пост из архива {row['id']}: {e}")
+            await callback.answer("⚠️ Файл больше недоступен", show_alert=True)
+    
+    async def _cmd_profile(self, message: Message, command: CommandObject):
+        """Команда /profile [секунд] — сэмплирующий профиль цикла событий"""
+        if message.from_user.id not in self.config.ADMIN_IDS:
+            await message.answer("⛔ Нет доступа!")
+            return
         
-        fake_callback = FakeCallback(message.from_user, "")
-        await self._update_moderator_message(fake_callback, post_data, "reject", comment)
+        try:
+            seconds = int(command.args or self.PROFILE_DEFAULT_SECONDS)
+            if not 1 <= seconds <= self.PROFILE_MAX_SECONDS:
+                raise ValueError
+        except ValueError:
+            await message.answer(f"Использование: /profile [секунд, 1–{self.PROFILE_MAX_SECONDS}]")
+            return
+        if self._profiler is not None:
+            await message.answer("⏳ Замер уже идёт, дождись отчёта.")
+            return
         
-        user_notified = await self._notify_user_rejection(post_data, comment)
+        self._profiler = SamplingProfiler(threading.get_ident())
+        self._profiler.start()
+        self._profile_task = asyncio.create_task(self._run_profile(message.chat.id, seconds))
+        await message.answer(f"⏱ Профилирую {seconds} с, отчёт придёт сюда.")
+    
+    async def _run_profile(self, chat_id: int, seconds: int):
+        profiler = self._profiler
+        peak_tasks = 0
+        try:
+            for _ in range(seconds):
+                await asyncio.sleep(1)
+                peak_tasks = max(peak_tasks, len(asyncio.all_tasks()))
+        finally:
+            self._profiler = None
+            profiler.stop()
         
-        if user_notified:
-            await message.answer(f"❌ Предожка отклонена с комментарием.")
-            logging.info(f"Пост {post_id} отклонен с комментарием {message.from_user.id}")
-        else:
-            await message.answer("❌ Предожка отклонена. Не удалось уведомить пользователя.")
+        tasks = Counter(getattr(task.get_coro(), '__qualname__', task.get_name()) for task in asyncio.all_tasks())
+        busy = profiler.total_us - profiler.idle_us
+        lines = [
+            f"⏱ <b>Профиль за {seconds} с</b>",
+            f"Сэмплов: {profiler.samples}, цикл простаивал {profiler.idle_us / max(profiler.total_us, 1):.0%}",
+            "",
+            "🔥 <b>Горячие функции</b> (своё время / с вызовами, от занятого):",
+        ]
+        lines += [f"• <code>{html.quote(label)}</code> — {own / busy:.1%} / {total / busy:.1%}"
+                  for label, own, total in profiler.hot_functions()] or ["• цикл почти не был занят"]
+        lines += ["", f"🧵 <b>Задачи asyncio:</b> сейчас {sum(tasks.values())}, пик {peak_tasks}"]
+        lines += [f"• {html.quote(name)} × {count}" for name, count in tasks.most_common(10)]
+        lines += ["", "🐢 <b>Самые долгие обработчики:</b>"]
+        lines += [f"• {html.quote(name)} — {duration * 1000:.0f} мс"
+                  for duration, name in profiler.slowest_handlers()] or ["• апдейтов не было"]
         
-        await self.post_manager.mark_rejected(post_id)
-        await state.clear()
+        try:
+            await self.bot.send_message(chat_id, "\n".join(lines), parse_mode="HTML")
+            if busy:
+                await self.bot.send_document(
+                    chat_id,
+                    BufferedInputFile(profiler.collapsed().encode(), filename=f"profile-{datetime.now():%Y%m%d-%H%M%S}.folded"),
+                    caption="Стеки для flamegraph.pl / speedscope"
+                )
+        except TelegramAPIError as e:
+            logging.error(f"Не удалось отправить профиль: {e}")
     
-    async def _cancel_input(self, callback: CallbackQuery, state: FSMContext):
-        await state.clear()
-        await callback.message.edit_text(
-            "❌ Действие отменено.",
-            reply_markup=None
-        )
-        await callback.answer()
+    def _breaker_line(self) -> str:
+        """Строка статистики о предохранителях Bot API"""
+        states = {'open': 'разомкнут', 'half_open': 'проба'}
+        tripped = self.breaker.status(self.bot.id)
+        rejected = self.breaker.rejected.get(self.bot.id, 0)
+        if not tripped:
+            return f"• Bot API: <b>в норме</b> (отклонено запросов: {rejected})\n"
+        listed = ', '.join(f"{html.quote(label)} — {states[state]}" for label, state in tripped)
+        return f"• Bot API: <b>⚠️ деградация</b> ({listed}; отклонено запросов: {rejected})\n"
+    
+    def _loop_lag_line(self) -> str:
+        if not self.watchdog:
+            return ""
+        return (f"• Задержка цикла событий: <b>{self.watchdog.lag * 1000:.0f} мс</b> "
+                f"(макс. {self.watchdog.max_lag * 1000:.0f} мс, зависаний {self.watchdog.stalls})\n")
+    
+    async def alert_loop_stall(self, lag: float, stack: Optional[str]):
+        """Предупредить админов о зависании цикла событий"""
+        text = f"🐢 <b>Цикл событий простоял {lag:.1f} с</b> — все обработчики ждали.\n"
+        if stack:
+            text += f"\nЧто его держало:\n<pre>{html.quote(stack[-3000:])}</pre>"
+        else:
+            text += "\nСтек снять не успели, подробности в логе."
+        for admin_id in self.config.ADMIN_IDS:
+            with suppress(TelegramAPIError):
+                await self.bot.send_message(admin_id, text, parse_mode="HTML")
+    
+    @staticmethod
+    def _format_duration(seconds: Optional[float]) -> str:
+        if seconds is None:
+            return "—"
+        if seconds < 60:
+            return f"{round(seconds)} с"
+        return MemesModerationBot._format_eta(timedelta(seconds=seconds)).lstrip('~')
+    
+    def _analytics_report_text(self) -> str:
+        percentiles = self.analytics.latency_percentiles()
+        lines = [
+            "📈 <b>Отчёт по модерации</b>\n",
+            f"⏱ Время до решения: p50 {self._format_duration(percentiles['p50'])}, "
+            f"p90 {self._format_duration(percentiles['p90'])}, p99 {self._format_duration(percentiles['p99'])}",
+            f"📦 Решений: {self.analytics.latency.count}, истёк срок: {self.analytics.expired}\n",
+            "<b>Модераторы:</b>",
+        ]
+        for row in self.analytics.moderator_rows()[:10]:
+            lines.append(
+                f"• {html.quote(row['name'])}: {row['decisions']} решений, "
+                f"одобряет {row['approval_rate']:.0%}, медиана {self._format_duration(row['p50'])}"
+            )
+        if days := self.analytics.approval_by_day()[-7:]:
+            lines.append("\n<b>Одобрено по дням:</b>")
+            lines.extend(f"• {day[8:10]}.{day[5:7]}: {rate:.0%} из {total}" for day, rate, total in days)
+        if submitters := self.analytics.top_submitters(5):
+            lines.append("\n<b>Самые активные авторы:</b>")
+            lines.extend(f"• <code>{user_id}</code>: {count}" for user_id, count in submitters)
+        return "\n".join(lines)
+    
+    async def _admin_report(self, callback: CallbackQuery):
+        """Отчёт с графиками: PNG рисуется в потоке, чтобы не блокировать event loop"""
+        if callback.from_user.id not in self.config.ADMIN_IDS:
+            await callback.answer("⛔ Нет доступа!", show_alert=True)
+            return
+        
+        await callback.answer("📈 Готовлю отчёт...")
+        text = self._analytics_report_text()
+        fd, path = tempfile.mkstemp(suffix='.png')
+        os.close(fd)
+        try:
+            rendered = await asyncio.to_thread(ModerationAnalytics.render_report, self.analytics.report_data(), path)
+            if rendered:
+                await callback.message.answer_photo(FSInputFile(path, filename='report.png'))
+            await callback.message.answer(text, parse_mode="HTML")
+        except Exception as e:
+            logging.error(f"Ошибка построения отчёта: {e}")
+            await callback.message.answer(text, parse_mode="HTML")
+        finally:
+            with suppress(OSError):
+                os.remove(path)
     
     # ================== АДМИН-ПАНЕЛЬ ==================
     async def _admin_stats(self, callback: CallbackQuery, state: FSMContext):
-        if callback.from_user.id not in BotConfig.ADMIN_IDS:
+        if callback.from_user.id not in self.config.ADMIN_IDS:
             await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
         await state.clear()
         stats = self.post_manager.get_stats()
+        audience = self.audience.get_counts()
+        percentiles = self.analytics.latency_percentiles()
         
         stats_text = (
             "📊 <b>Статистика бота</b>\n\n"
             f"• Постов в очереди: <b>{stats['pending_posts']}</b>\n"
+            f"• В очереди ожидания (на диске): <b>{len(self.overflow)}</b>\n"
             f"• Уникальных пользователей: <b>{stats['unique_users']}</b>\n"
+            f"• Аудитория рассылки: <b>{audience['reachable']}</b> (недоступны: {audience['unreachable']})\n"
             f"• Всего отправлено: <b>{stats['total_submitted']}</b>\n"
             f"• Одобрено: <b>{stats['total_approved']}</b>\n"
-            f"• Отклонено: <b>{stats['total_rejected']}</b>\n\n"
-            f"• Модераторов: <b>{len(BotConfig.MODERATORS)}</b>\n"
-            f"• Администраторов: <b>{len(BotConfig.ADMIN_IDS)}</b>\n\n"
+            f"• Отклонено: <b>{stats['total_rejected']}</b>\n"
+            f"• Истёк срок: <b>{self.analytics.expired}</b>\n"
+            f"• Время до решения p50/p90/p99: <b>{' / '.join(self._format_duration(value) for value in percentiles.values())}</b>\n"
+            f"• Открытых черновиков комментариев: <b>{len(self.comment_sessions)}</b>\n"
+            f"{self._loop_lag_line()}"
+            f"• Правок карточек: <b>{self.cards.edits}</b> (запрошено {self.cards.requested}, без изменений {self.cards.skipped})\n"
+            f"• Приём: <b>{self.burst.rate()}</b>/мин, дайджесты {'включены' if self.burst.active else 'выключены'} (порог {self.config.BURST_RATE_PER_MINUTE}/мин)\n"
+            f"• Анализ медиа: в очереди <b>{self.media.queue.qsize()}</b>, пропущено <b>{self.media.dropped}</b>\n"
+            f"{self._breaker_line()}\n"
+            f"• Модераторов: <b>{len(self.config.MODERATORS)}</b>\n"
+            f"• Администраторов: <b>{len(self.config.ADMIN_IDS)}</b>\n\n"
             f"<b>Текущие настройки:</b>\n"
-            f"• Макс. размер фото: <b>{BotConfig.MAX_PHOTO_SIZE_MB} МБ</b>\n"
-            f"• Макс. размер видео: <b>{BotConfig.MAX_VIDEO_SIZE_MB} МБ</b>\n"
-            f"• Макс. очередь: <b>{BotConfig.MAX_PENDING_POSTS}</b>\n"
-            f"• Очистка через: <b>{BotConfig.CLEANUP_INTERVAL_HOURS} ч</b>"
+            f"• Макс. размер фото: <b>{self.config.MAX_PHOTO_SIZE_MB} МБ</b>\n"
+            f"• Макс. размер видео: <b>{self.config.MAX_VIDEO_SIZE_MB} МБ</b>\n"
+            f"• Макс. очередь: <b>{self.config.MAX_PENDING_POSTS}</b>\n"
+            f"• Очистка через: <b>{self.config.CLEANUP_INTERVAL_HOURS} ч</b>"
         )
         
         await callback.message.edit_text(
@@ -845,8 +4706,109 @@ class MemesModerationBot:
         )
         await callback.answer()
     
+    async def _admin_shards(self, callback: CallbackQuery, state: FSMContext):
+        if callback.from_user.id not in self.config.ADMIN_IDS:
+            await callback.answer("⛔ Нет доступа!", show_alert=True)
+            return
+        
+        await state.clear()
+        depths = self.post_manager.get_shard_depths()
+        mode = "шарды модераторов" if self.config.REVIEW_MODE == 'sharded' else "общий чат"
+        strategy = "по нагрузке" if self.config.SHARD_STRATEGY == 'least_loaded' else "взвешенный round-robin"
+        
+        lines = [
+            "🗂 <b>Очереди модерации</b>\n",
+            f"• Режим: <b>{mode}</b>",
+            f"• Распределение: <b>{strategy}</b>",
+            f"• Переназначение через: <b>{self.config.SHARD_REASSIGN_MINUTES} мин</b>\n",
+            f"• Общий чат: <b>{depths.get(None, 0)}</b>"
+        ]
+        for shard in self.post_manager.shards.get_shards():
+            status = "" if shard.moderator_id in self.config.MODERATORS else " (не модератор)"
+            thread = f"/{shard.thread_id}" if shard.thread_id else ""
+            lines.append(
+                f"• #{shard.shard_id} <code>{shard.moderator_id}</code>{status} → "
+                f"<code>{shard.chat_id}{thread}</code>, вес {shard.weight}: "
+                f"<b>{depths.get(shard.shard_id, 0)}</b>"
+            )
+        
+        await callback.message.edit_text(
+            "\n".join(lines),
+            parse_mode="HTML",
+            reply_markup=KeyboardFactory.get_admin_panel_kb()
+        )
+        await callback.answer()
+    
+    def _render_queue_page(self, offset: int, content_filter: str, user_id: int,
+                           admin_id: Optional[int] = None) -> tuple[str, InlineKeyboardMarkup]:
+        """Текст и клавиатура страницы очереди"""
+        content_type = None if content_filter == "all" else ContentType(content_filter)
+        posts, total = self.post_manager.get_queue_page(
+            offset, self.config.QUEUE_PAGE_SIZE,
+            user_id=user_id or None,
+            content_type=content_type
+        )
+        
+        filters = []
+        if content_type:
+            filters.append("фото" if content_type == ContentType.PHOTO else "видео")
+        if user_id:
+            filters.append(f"пользователь <code>{user_id}</code>")
+        filter_text = f"\nФильтр: {', '.join(filters)}" if filters else ""
+        
+        lines = [f"📋 <b>Очередь модерации</b> ({total}){filter_text}\n"]
+        now = datetime.now()
+        for number, post in enumerate(posts, start=offset + 1):
+            age_hours = int((now - post.timestamp).total_seconds() // 3600)
+            kind = "📸" if post.content_type == ContentType.PHOTO else "🎥"
+            caption = f" — {html.quote(post.caption[:40])}" if post.caption else ""
+            lines.append(
+                f"{number}. {kind} #{post.original_message_id} • <code>{post.user_id}</code> • "
+                f"{post.timestamp.strftime('%d.%m %H:%M')} ({age_hours} ч){caption}"
+            )
+        if not posts:
+            lines.append("Очередь пуста.")
+        
+        selected = self._bulk_selection.get(admin_id, set())
+        if selected:
+            lines.append(f"\nВыбрано: <b>{len(selected)}</b>")
+        
+        return "\n".join(lines), KeyboardFactory.get_queue_kb(
+            offset, total, content_filter, user_id, self.config.QUEUE_PAGE_SIZE,
+            post_ids=[post.original_message_id for post in posts],
+            selected=selected
+        )
+    
+    async def _admin_queue(self, callback: CallbackQuery, state: FSMContext):
+        if callback.from_user.id not in self.config.ADMIN_IDS:
+            await callback.answer("⛔ Нет доступа!", show_alert=True)
+            return
+        
+        await state.clear()
+        _, offset, content_filter, user_id = callback.data.split("_")
+        text, reply_markup = self._render_queue_page(int(offset), content_filter, int(user_id), callback.from_user.id)
+        
+        with suppress(TelegramBadRequest):
+            await callback.message.edit_text(text, parse_mode="HTML", reply_markup=reply_markup)
+        await callback.answer()
+    
+    async def _queue_by_user(self, callback: CallbackQuery, state: FSMContext):
+        if callback.from_user.id not in self.config.ADMIN_IDS:
+            await callback.answer("⛔ Нет доступа!", show_alert=True)
+            return
+        
+        await state.set_state(AdminStates.waiting_queue_user)
+        await callback.message.answer(
+            "👤 <b>Фильтр очереди по пользователю</b>\n\n"
+            "Введите ID пользователя:\n"
+            "Используйте /cancel для отмены.",
+            parse_mode="HTML",
+            reply_markup=KeyboardFactory.get_cancel_kb()
+        )
+        await callback.answer()
+    
     async def _admin_limits(self, callback: CallbackQuery, state: FSMContext):
-        if callback.from_user.id not in BotConfig.ADMIN_IDS:
+        if callback.from_user.id not in self.config.ADMIN_IDS:
             await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
@@ -860,40 +4822,41 @@ class MemesModerationBot:
         await callback.answer()
     
     async def _admin_moderators(self, callback: CallbackQuery, state: FSMContext):
-        if callback.from_user.id not in BotConfig.ADMIN_IDS:
+        if callback.from_user.id not in self.config.ADMIN_IDS:
             await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
         await state.clear()
         await callback.message.edit_text(
             "👥 <b>Управление модераторами</b>\n\n"
-            f"Текущее количество: {len(BotConfig.MODERATORS)}",
+            f"Текущее количество: {len(self.config.MODERATORS)}",
             parse_mode="HTML",
             reply_markup=KeyboardFactory.get_moderators_kb()
         )
         await callback.answer()
     
     async def _admin_admins(self, callback: CallbackQuery, state: FSMContext):
-        if callback.from_user.id not in BotConfig.ADMIN_IDS:
+        if callback.from_user.id not in self.config.ADMIN_IDS:
             await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
         await state.clear()
         await callback.message.edit_text(
             "🛠️ <b>Управление администраторами</b>\n\n"
-            f"Текущее количество: {len(BotConfig.ADMIN_IDS)}",
+            f"Текущее количество: {len(self.config.ADMIN_IDS)}",
             parse_mode="HTML",
             reply_markup=KeyboardFactory.get_admins_kb()
         )
         await callback.answer()
     
     async def _admin_cleanup(self, callback: CallbackQuery, state: FSMContext):
-        if callback.from_user.id not in BotConfig.ADMIN_IDS:
+        if callback.from_user.id not in self.config.ADMIN_IDS:
             await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
         await state.clear()
         count = await self.post_manager.cleanup_all_pending()
+        self._refill_event.set()
         
         await callback.message.edit_text(
             f"🧹 <b>Очередь очищена</b>\n\n"
@@ -904,7 +4867,7 @@ class MemesModerationBot:
         await callback.answer()
     
     async def _admin_broadcast(self, callback: CallbackQuery, state: FSMContext):
-        if callback.from_user.id not in BotConfig.ADMIN_IDS:
+        if callback.from_user.id not in self.config.ADMIN_IDS:
             await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
@@ -920,12 +4883,12 @@ class MemesModerationBot:
         await callback.answer()
     
     async def _admin_save(self, callback: CallbackQuery, state: FSMContext):
-        if callback.from_user.id not in BotConfig.ADMIN_IDS:
+        if callback.from_user.id not in self.config.ADMIN_IDS:
             await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
         await state.clear()
-        BotConfig.save_config()
+        self.config.save_config()
         await callback.answer("✅ Конфигурация сохранена в файл!")
     
     async def _admin_close(self, callback: CallbackQuery, state: FSMContext):
@@ -934,7 +4897,7 @@ class MemesModerationBot:
         await callback.answer()
     
     async def _admin_back(self, callback: CallbackQuery, state: FSMContext):
-        if callback.from_user.id not in BotConfig.ADMIN_IDS:
+        if callback.from_user.id not in self.config.ADMIN_IDS:
             await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
@@ -949,13 +4912,13 @@ class MemesModerationBot:
     
     # ================== НАСТРОЙКИ ==================
     async def _set_photo_size(self, callback: CallbackQuery, state: FSMContext):
-        if callback.from_user.id not in BotConfig.ADMIN_IDS:
+        if callback.from_user.id not in self.config.ADMIN_IDS:
             await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
         await state.set_state(AdminStates.waiting_photo_size)
         await callback.message.answer(
-            f"📸 <b>Текущий максимальный размер фото: {BotConfig.MAX_PHOTO_SIZE_MB} МБ</b>\n\n"
+            f"📸 <b>Текущий максимальный размер фото: {self.config.MAX_PHOTO_SIZE_MB} МБ</b>\n\n"
             "Введите новый размер в МБ (1-100):\n"
             "Используйте /cancel для отмены.",
             parse_mode="HTML",
@@ -964,13 +4927,13 @@ class MemesModerationBot:
         await callback.answer()
     
     async def _set_video_size(self, callback: CallbackQuery, state: FSMContext):
-        if callback.from_user.id not in BotConfig.ADMIN_IDS:
+        if callback.from_user.id not in self.config.ADMIN_IDS:
             await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
         await state.set_state(AdminStates.waiting_video_size)
         await callback.message.answer(
-            f"🎥 <b>Текущий максимальный размер видео: {BotConfig.MAX_VIDEO_SIZE_MB} МБ</b>\n\n"
+            f"🎥 <b>Текущий максимальный размер видео: {self.config.MAX_VIDEO_SIZE_MB} МБ</b>\n\n"
             "Введите новый размер в МБ (1-500):\n"
             "Используйте /cancel для отмены.",
             parse_mode="HTML",
@@ -979,13 +4942,13 @@ class MemesModerationBot:
         await callback.answer()
     
     async def _set_pending_limit(self, callback: CallbackQuery, state: FSMContext):
-        if callback.from_user.id not in BotConfig.ADMIN_IDS:
+        if callback.from_user.id not in self.config.ADMIN_IDS:
             await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
         await state.set_state(AdminStates.waiting_pending_limit)
         await callback.message.answer(
-            f"📁 <b>Текущий максимальный размер очереди: {BotConfig.MAX_PENDING_POSTS}</b>\n\n"
+            f"📁 <b>Текущий максимальный размер очереди: {self.config.MAX_PENDING_POSTS}</b>\n\n"
             "Введите новый лимит (10-1000):\n"
             "Используйте /cancel для отмены.",
             parse_mode="HTML",
@@ -994,13 +4957,13 @@ class MemesModerationBot:
         await callback.answer()
     
     async def _set_cleanup_interval(self, callback: CallbackQuery, state: FSMContext):
-        if callback.from_user.id not in BotConfig.ADMIN_IDS:
+        if callback.from_user.id not in self.config.ADMIN_IDS:
             await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
         await state.set_state(AdminStates.waiting_cleanup_interval)
         await callback.message.answer(
-            f"⏰ <b>Текущий интервал очистки: {BotConfig.CLEANUP_INTERVAL_HOURS} часов</b>\n\n"
+            f"⏰ <b>Текущий интервал очистки: {self.config.CLEANUP_INTERVAL_HOURS} часов</b>\n\n"
             "Введите новый интервал в часах (1-720):\n"
             "Используйте /cancel для отмены.",
             parse_mode="HTML",
@@ -1009,7 +4972,7 @@ class MemesModerationBot:
         await callback.answer()
     
     async def _add_moderator(self, callback: CallbackQuery, state: FSMContext):
-        if callback.from_user.id not in BotConfig.ADMIN_IDS:
+        if callback.from_user.id not in self.config.ADMIN_IDS:
             await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
@@ -1024,7 +4987,7 @@ class MemesModerationBot:
         await callback.answer()
     
     async def _remove_moderator(self, callback: CallbackQuery, state: FSMContext):
-        if callback.from_user.id not in BotConfig.ADMIN_IDS:
+        if callback.from_user.id not in self.config.ADMIN_IDS:
             await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
@@ -1040,19 +5003,19 @@ class MemesModerationBot:
         await callback.answer()
     
     async def _list_moderators(self, callback: CallbackQuery, state: FSMContext):
-        if callback.from_user.id not in BotConfig.ADMIN_IDS:
+        if callback.from_user.id not in self.config.ADMIN_IDS:
             await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
         await state.clear()
-        if not BotConfig.MODERATORS:
+        if not self.config.MODERATORS:
             await callback.answer("Список модераторов пуст!", show_alert=True)
             return
         
-        moderators_list = "\n".join([f"• <code>{mod_id}</code>" for mod_id in BotConfig.MODERATORS])
+        moderators_list = "\n".join([f"• <code>{mod_id}</code>" for mod_id in self.config.MODERATORS])
         await callback.message.edit_text(
             f"📋 <b>Список модераторов</b>\n\n"
-            f"Количество: {len(BotConfig.MODERATORS)}\n\n"
+            f"Количество: {len(self.config.MODERATORS)}\n\n"
             f"{moderators_list}",
             parse_mode="HTML",
             reply_markup=KeyboardFactory.get_moderators_kb()
@@ -1060,7 +5023,7 @@ class MemesModerationBot:
         await callback.answer()
     
     async def _add_admin(self, callback: CallbackQuery, state: FSMContext):
-        if callback.from_user.id not in BotConfig.ADMIN_IDS:
+        if callback.from_user.id not in self.config.ADMIN_IDS:
             await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
@@ -1076,7 +5039,7 @@ class MemesModerationBot:
         await callback.answer()
     
     async def _remove_admin(self, callback: CallbackQuery, state: FSMContext):
-        if callback.from_user.id not in BotConfig.ADMIN_IDS:
+        if callback.from_user.id not in self.config.ADMIN_IDS:
             await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
@@ -1092,19 +5055,19 @@ class MemesModerationBot:
         await callback.answer()
     
     async def _list_admins(self, callback: CallbackQuery, state: FSMContext):
-        if callback.from_user.id not in BotConfig.ADMIN_IDS:
+        if callback.from_user.id not in self.config.ADMIN_IDS:
             await callback.answer("⛔ Нет доступа!", show_alert=True)
             return
         
         await state.clear()
-        if not BotConfig.ADMIN_IDS:
+        if not self.config.ADMIN_IDS:
             await callback.answer("Список администраторов пуст!", show_alert=True)
             return
         
-        admins_list = "\n".join([f"• <code>{admin_id}</code>" for admin_id in BotConfig.ADMIN_IDS])
+        admins_list = "\n".join([f"• <code>{admin_id}</code>" for admin_id in self.config.ADMIN_IDS])
         await callback.message.edit_text(
             f"📋 <b>Список администраторов</b>\n\n"
-            f"Количество: {len(BotConfig.ADMIN_IDS)}\n\n"
+            f"Количество: {len(self.config.ADMIN_IDS)}\n\n"
             f"{admins_list}",
             parse_mode="HTML",
             reply_markup=KeyboardFactory.get_admins_kb()
@@ -1121,7 +5084,7 @@ class MemesModerationBot:
             if current_state == AdminStates.waiting_photo_size:
                 size = int(message.text)
                 if 1 <= size <= 100:
-                    BotConfig.MAX_PHOTO_SIZE_MB = size
+                    self.config.MAX_PHOTO_SIZE_MB = size
                     await message.answer(f"✅ Макс. размер фото установлен: {size} МБ")
                 else:
                     await message.answer("❌ Размер должен быть от 1 до 100 МБ")
@@ -1129,7 +5092,7 @@ class MemesModerationBot:
             elif current_state == AdminStates.waiting_video_size:
                 size = int(message.text)
                 if 1 <= size <= 500:
-                    BotConfig.MAX_VIDEO_SIZE_MB = size
+                    self.config.MAX_VIDEO_SIZE_MB = size
                     await message.answer(f"✅ Макс. размер видео установлен: {size} МБ")
                 else:
                     await message.answer("❌ Размер должен быть от 1 до 500 МБ")
@@ -1137,7 +5100,7 @@ class MemesModerationBot:
             elif current_state == AdminStates.waiting_pending_limit:
                 limit = int(message.text)
                 if 10 <= limit <= 1000:
-                    BotConfig.MAX_PENDING_POSTS = limit
+                    self.config.MAX_PENDING_POSTS = limit
                     await message.answer(f"✅ Макс. размер очереди установлен: {limit}")
                 else:
                     await message.answer("❌ Лимит должен быть от 10 до 1000")
@@ -1145,7 +5108,8 @@ class MemesModerationBot:
             elif current_state == AdminStates.waiting_cleanup_interval:
                 interval = int(message.text)
                 if 1 <= interval <= 720:
-                    BotConfig.CLEANUP_INTERVAL_HOURS = interval
+                    self.config.CLEANUP_INTERVAL_HOURS = interval
+                    self.post_manager.reschedule_deadlines()
                     await message.answer(f"✅ Интервал очистки установлен: {interval} часов")
                 else:
                     await message.answer("❌ Интервал должен быть от 1 до 720 часов")
@@ -1155,13 +5119,13 @@ class MemesModerationBot:
                 action = data.get('action', 'add')
                 
                 if action == "remove":
-                    if mod_id in BotConfig.MODERATORS:
-                        BotConfig.MODERATORS.remove(mod_id)
+                    if mod_id in self.config.MODERATORS:
+                        self.config.MODERATORS.remove(mod_id)
                         await message.answer(f"✅ Модератор {mod_id} удален")
                     else:
                         await message.answer(f"❌ Модератор {mod_id} не найден")
                 else:
-                    BotConfig.MODERATORS.add(mod_id)
+                    self.config.MODERATORS.add(mod_id)
                     await message.answer(f"✅ Модератор {mod_id} добавлен")
             
             elif current_state == AdminStates.waiting_admin_id:
@@ -1169,20 +5133,46 @@ class MemesModerationBot:
                 action = data.get('action', 'add')
                 
                 if action == "remove":
-                    if admin_id in BotConfig.ADMIN_IDS:
-                        if len(BotConfig.ADMIN_IDS) > 1:
-                            BotConfig.ADMIN_IDS.remove(admin_id)
+                    if admin_id in self.config.ADMIN_IDS:
+                        if len(self.config.ADMIN_IDS) > 1:
+                            self.config.ADMIN_IDS.remove(admin_id)
                             await message.answer(f"✅ Администратор {admin_id} удален")
                         else:
                             await message.answer("❌ Нельзя удалить последнего администратора!")
                     else:
                         await message.answer(f"❌ Администратор {admin_id} не найден")
                 else:
-                    BotConfig.ADMIN_IDS.add(admin_id)
+                    self.config.ADMIN_IDS.add(admin_id)
                     await message.answer(f"✅ Администратор {admin_id} добавлен")
             
+            elif current_state == AdminStates.waiting_queue_user:
+                user_id = int(message.text)
+                await state.clear()
+                text, reply_markup = self._render_queue_page(0, "all", user_id, message.from_user.id)
+                await message.answer(text, parse_mode="HTML", reply_markup=reply_markup)
+                return
+            
+            elif current_state == AdminStates.waiting_bulk_user:
+                user_id = int(message.text)
+                post_ids = self.post_manager.find_posts(user_id=user_id)
+                await self._start_bulk_job(message.from_user, message.chat.id, post_ids, "reject")
+            
+            elif current_state == AdminStates.waiting_bulk_age:
+                hours = int(message.text)
+                if hours < 1:
+                    await message.answer("❌ Возраст должен быть не меньше 1 часа")
+                else:
+                    post_ids = self.post_manager.find_posts(older_than_hours=hours)
+                    await self._start_bulk_job(message.from_user, message.chat.id, post_ids, "reject")
+            
             elif current_state == AdminStates.waiting_broadcast:
-                await message.answer("✅ Сообщение принято для рассылки. (Функция в разработке)")
+                if self._broadcast_task and not self._broadcast_task.done():
+                    await message.answer("⏳ Предыдущая рассылка ещё идёт, попробуйте позже.")
+                else:
+                    self._broadcast_task = asyncio.create_task(self._run_broadcast(message))
+                    await message.answer(
+                        f"✅ Рассылка запущена. Получателей: {self.audience.get_counts()['reachable']}"
+                    )
             
             else:
                 await message.answer("❌ Неизвестное состояние")
@@ -1224,25 +5214,122 @@ class MemesModerationBot:
         await callback.answer()
     
     # ================== ЗАПУСК ==================
-    async def run(self):
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler('bot.log', encoding='utf-8'),
-                logging.StreamHandler()
-            ]
-        )
-        
+    def start_background(self):
+        """Запуск фоновых задач бота"""
+        self._background_tasks.append(asyncio.create_task(self._shard_rebalance_loop()))
+        self._background_tasks.append(asyncio.create_task(self._comment_session_loop()))
+        self._background_tasks.append(asyncio.create_task(self._audience_flush_loop()))
+        self._background_tasks.append(asyncio.create_task(self._digest_loop()))
+        self._background_tasks.append(asyncio.create_task(self._overflow_loop()))
+        self._background_tasks.append(asyncio.create_task(self._publish_retry_loop()))
+        self._background_tasks.append(asyncio.create_task(self._audit_compact_loop()))
+        self._background_tasks.append(asyncio.create_task(self._deadline_loop()))
+        if self.media.enabled:
+            for _ in range(self.config.MEDIA_ANALYSIS_WORKERS):
+                self._background_tasks.append(asyncio.create_task(self._media_analysis_loop()))
+    
+    async def drain(self):
+        """Дождаться обработчиков и массовых операций, не дольше SHUTDOWN_DRAIN_SECONDS"""
+        self._flush_digest()  # не ждём таймера дайджеста; его отправку дождёмся вместе с обработчиками
+        pending = set(self._inflight) | set(self._bulk_jobs)
+        if self._broadcast_task and not self._broadcast_task.done():
+            pending.add(self._broadcast_task)
+        if pending:
+            logging.info(f"Ожидание {len(pending)} незавершённых задач перед остановкой")
+            _, unfinished = await asyncio.wait(pending, timeout=self.config.SHUTDOWN_DRAIN_SECONDS)
+            for task in unfinished:
+                task.cancel()
+            if unfinished:
+                logging.warning(f"Прервано по таймауту задач: {len(unfinished)}")
+                await asyncio.wait(unfinished)
+        # Отложенные правки карточек уходят последними
+        await self.cards.flush()
+    
+    def save_snapshot(self, storage: MemoryStorage):
+        """Снимок очереди и FSM-состояний для быстрого рестарта"""
+        fsm = {key: record for key, record in storage.storage.items() if key.bot_id == self.bot.id}
+        try:
+            data = pickle.dumps(
+                {
+                    'version': self.SNAPSHOT_VERSION, 'posts': self.post_manager, 'fsm': fsm, 'analytics': self.analytics,
+                    'retries': self.publisher.dump_retries()  # в том же pickle: посты остаются общими объектами
+                },
+                protocol=pickle.HIGHEST_PROTOCOL
+            )
+            tmp_path = f"{self.config.SNAPSHOT_FILE}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.config.SNAPSHOT_FILE)
+            with suppress(OSError):
+                os.remove(f"{self.config.SNAPSHOT_FILE}.bak")  # новый снимок записан — старый не нужен
+            logging.info(
+                f"Снимок состояния сохранён: {self.post_manager.get_stats()['pending_posts']} постов, "
+                f"{len(fsm)} FSM-записей, {len(self.publisher)} отложенных доставок"
+            )
+        except Exception as e:
+            logging.error(f"Ошибка сохранения снимка состояния: {e}")
+    
+    def _load_snapshot(self):
+        if not os.path.exists(self.config.SNAPSHOT_FILE):
+            return
+        try:
+            with open(self.config.SNAPSHOT_FILE, 'rb') as f:
+                snapshot = pickle.load(f)
+            if snapshot.get('version') != self.SNAPSHOT_VERSION:
+                raise ValueError(f"версия снимка {snapshot.get('version')}")
+            snapshot['posts'].bind_config(self.config)
+            self.post_manager = snapshot['posts']
+            self._restored_fsm = snapshot['fsm']
+            self.analytics = snapshot.get('analytics') or self.analytics
+            self._restored_retries = snapshot.get('retries', [])
+            logging.info(f"Состояние восстановлено из снимка: {self.post_manager.get_stats()['pending_posts']} постов")
+        except Exception as e:
+            # Не удаляем: очередь из несовместимого снимка можно вытащить вручную
+            bad_path = f"{self.config.SNAPSHOT_FILE}.bad"
+            logging.error(f"Снимок состояния не загружен: {e}; файл сохранён как {bad_path}")
+            with suppress(OSError):
+                os.replace(self.config.SNAPSHOT_FILE, bad_path)
+            return
+        # Снимок одноразовый: после аварийного падения старое состояние не должно воскреснуть само,
+        # но до следующего сохранения лежит в .bak — его можно вернуть вручную
+        with suppress(OSError):
+            os.replace(self.config.SNAPSHOT_FILE, f"{self.config.SNAPSHOT_FILE}.bak")
+    
+    def restore_fsm(self, storage: MemoryStorage):
+        """Вернуть FSM-состояния из снимка в хранилище диспетчера"""
+        storage.storage.update(self._restored_fsm)
+        self._restored_fsm = {}
+    
+    async def stop_background(self):
+        """Остановка фоновых задач и сброс состояния на диск"""
+        for task in self._background_tasks:
+            task.cancel()
+        self._background_tasks.clear()
+        if self._profile_task and not self._profile_task.done():
+            self._profile_task.cancel()
+        self.media.shutdown()
+        for user_id, notes in self.digest.drain():
+            await self._send_user_notification(user_id, notes)
+        self.overflow.close()
+        self.audit.close()
+        self.archive.close()
+        if (data := self.audience.dump()) is not None:
+            self.audience.write(data)
+    
+    def print_banner(self):
         self._validate_config()
         
         print("=" * 50)
         print("🤖 Бот модерации мемов запущен")
-        print(f"👮 Модераторов: {len(BotConfig.MODERATORS)}")
-        print(f"🛠️ Администраторов: {len(BotConfig.ADMIN_IDS)}")
-        print(f"💬 Чат модерации: {BotConfig.MODERATORS_CHAT_ID}")
-        print(f"📢 Основная группа: {BotConfig.MAIN_GROUP_ID}")
-        print(f"🧵 Тема публикаций: {BotConfig.MAIN_GROUP_THREAD_ID}")
+        print(f"👮 Модераторов: {len(self.config.MODERATORS)}")
+        print(f"🛠️ Администраторов: {len(self.config.ADMIN_IDS)}")
+        print(f"💬 Чат модерации: {self.config.MODERATORS_CHAT_ID}")
+        for dest in self.publisher.get_destinations():
+            print(f"📢 Публикация: {dest.label}")
+        if self.config.MEDIA_ANALYSIS_ENABLED:
+            print(f"🔍 Анализ медиа: {'включён' if self.media.enabled else 'выключен (нет Pillow)'}")
+        if self.config.LIVENESS_PORT:
+            print(f"🩺 Liveness: http://{self.config.LIVENESS_HOST}:{self.config.LIVENESS_PORT}/healthz")
         print("=" * 50)
         print("✅ Принимает только: Фото и Видео")
         print("✅ 4 кнопки модерации: одобрить/отклонить с комментариями")
@@ -1250,26 +5337,106 @@ class MemesModerationBot:
         print("✅ Админ-панель с настройками")
         print("✅ FSM состояния работают корректно")
         print("=" * 50)
+    
+    async def run(self):
+        setup_logging()
+        self.print_banner()
         
-        await self.dp.start_polling(
-            self.bot,
-            allowed_updates=self.dp.resolve_used_update_types(),
-            skip_updates=True
-        )
+        storage = MemoryStorage()
+        self.restore_fsm(storage)
+        dp = Dispatcher(storage=storage)
+        dp.include_router(self.router)
+        self.start_background()
+        self.watchdog = LoopWatchdog(self.config, self.alert_loop_stall)
+        watchdog_task = asyncio.create_task(self.watchdog.run())
+        try:
+            # SIGINT/SIGTERM останавливают только приём апдейтов, сессия нужна для дренажа
+            await dp.start_polling(
+                self.bot,
+                allowed_updates=dp.resolve_used_update_types(),
+                skip_updates=True,
+                close_bot_session=False
+            )
+        finally:
+            watchdog_task.cancel()
+            await self.drain()
+            await self.stop_background()
+            self.save_snapshot(storage)
+            await self.bot.session.close()
     
     def _validate_config(self):
         required = ['BOT_TOKEN', 'MODERATORS_CHAT_ID', 'MAIN_GROUP_ID', 'MODERATORS', 'ADMIN_IDS']
         for attr in required:
-            if not getattr(BotConfig, attr, None):
+            if not getattr(self.config, attr, None):
                 raise ValueError(f"Не задана обязательная конфигурация: {attr}")
         
-        if BotConfig.MODERATORS_CHAT_ID >= 0:
+        if self.config.MODERATORS_CHAT_ID >= 0:
             logging.warning("MODERATORS_CHAT_ID должен быть отрицательным для групп/супергрупп")
         
+        if self.config.REVIEW_MODE == 'sharded' and not self.post_manager.shards.enabled:
+            logging.warning("Включён режим шардов, но нет активных шардов — используется общий чат")
+        
         print("✓ Конфигурация валидна")
 
+class MultiTenantRunner:
+    """Несколько ботов в одном процессе: общие пулы соединений и процессов анализа, общий диспетчер"""
+    
+    def __init__(self, configs: List[type[BotConfig]]):
+        self.session = TunedAiohttpSession(BotConfig)
+        # Процессы запускаются при первом анализе; один пул на все арендаторы, а не по пулу на каждого
+        self.media_pool = ProcessPoolExecutor(max_workers=BotConfig.MEDIA_ANALYSIS_WORKERS) if any(
+            config.MEDIA_ANALYSIS_ENABLED for config in configs
+        ) else None
+        self.bots = [MemesModerationBot(config, session=self.session, media_pool=self.media_pool) for config in configs]
+    
+    async def _alert_loop_stall(self, lag: float, stack: Optional[str]):
+        """Цикл общий, поэтому о зависании узнают админы всех арендаторов"""
+        await asyncio.gather(*(bot.alert_loop_stall(lag, stack) for bot in self.bots))
+    
+    async def run(self):
+        setup_logging()
+        for bot in self.bots:
+            bot.print_banner()
+        
+        storage = MemoryStorage()
+        dp = Dispatcher(storage=storage)
+        watchdog = LoopWatchdog(BotConfig, self._alert_loop_stall)
+        for bot in self.bots:
+            bot.restore_fsm(storage)
+            dp.include_router(bot.router)
+            bot.start_background()
+            bot.watchdog = watchdog
+        watchdog_task = asyncio.create_task(watchdog.run())
+        try:
+            await dp.start_polling(
+                *(bot.bot for bot in self.bots),
+                allowed_updates=dp.resolve_used_update_types(),
+                skip_updates=True,
+                close_bot_session=False
+            )
+        finally:
+            watchdog_task.cancel()
+            await asyncio.gather(*(bot.drain() for bot in self.bots))
+            for bot in self.bots:
+                await bot.stop_background()
+                bot.save_snapshot(storage)
+            if self.media_pool is not None:
+                self.media_pool.shutdown(wait=False, cancel_futures=True)
+            await self.session.close()
+
+def setup_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('bot.log', encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
+
 def main():
-    bot = MemesModerationBot()
+    tenants = BotConfig.load_tenants()
+    bot = MultiTenantRunner(tenants) if tenants else MemesModerationBot()
     
     try:
         asyncio.run(bot.run())
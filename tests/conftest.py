@@ -0,0 +1,84 @@
+import asyncio
+import importlib.util
+import os
+import sys
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_spec = importlib.util.spec_from_file_location("botmoderka", os.path.join(ROOT, "botmoderka — копия.py"))
+botmoderka = sys.modules["botmoderka"] = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(botmoderka)
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Файлы состояния (очереди, журналы, конфиги арендаторов) — во временном каталоге"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def bm():
+    return botmoderka
+
+
+@pytest.fixture
+def config(bm):
+    return bm.BotConfig.for_tenant('test', bot_token='123456:TEST', moderators_chat_id=-100, moderators={10, 11})
+
+
+@pytest.fixture
+def moderation_bot(bm, config):
+    """Бот без сети: вызовы Bot API тесты подменяют сами"""
+    bot = bm.MemesModerationBot(config)
+    yield bot
+    bot.overflow.close()
+    bot.audit.close()
+    bot.archive.close()
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def make_submission(bm, message_id, user_id=1, content_type=None):
+    return bm.Submission(
+        user_id=user_id, username=f'user{user_id}', first_name=None, message_id=message_id,
+        content_type=content_type or bm.ContentType.PHOTO, file_id=f'file-{message_id}',
+        file_unique_id=f'unique-{message_id}'
+    )
+
+
+def moderator(user_id=10):
+    return types.SimpleNamespace(id=user_id, username=f'mod{user_id}', first_name='Mod')
+
+
+class FakeBot:
+    """Bot без сети: записывает вызовы; handler(name, kwargs) может вернуть ответ или бросить ошибку"""
+    
+    id = 42
+    
+    def __init__(self, handler=None):
+        self.handler = handler
+        self.calls = []
+        self._message_id = 1000
+    
+    async def _call(self, name, kwargs):
+        self.calls.append((name, kwargs))
+        if self.handler and (result := await self.handler(name, kwargs)) is not None:
+            return result
+        self._message_id += 1
+        return types.SimpleNamespace(
+            message_id=self._message_id, chat=types.SimpleNamespace(id=kwargs.get('chat_id')), photo=None, video=None
+        )
+    
+    def __getattr__(self, name):
+        async def method(**kwargs):
+            return await self._call(name, kwargs)
+        return method
+    
+    async def __call__(self, method):
+        return await self._call(method.__api_method__, method.model_dump())
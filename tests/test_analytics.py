@@ -0,0 +1,29 @@
+import random
+
+import pytest
+
+
+@pytest.mark.parametrize('accuracy', [0.01, 0.05])
+def test_quantile_sketch_stays_within_relative_accuracy(bm, accuracy):
+    rng = random.Random(7)
+    values = [rng.lognormvariate(4, 1.5) for _ in range(5000)] + [0] * 50
+    sketch = bm.QuantileSketch(relative_accuracy=accuracy)
+    for value in values:
+        sketch.add(value)
+    
+    values.sort()
+    assert sketch.count == len(values)
+    for q in (0.0, 0.25, 0.5, 0.9, 0.99, 1.0):
+        exact = values[int(q * (len(values) - 1))]
+        estimate = sketch.quantile(q)
+        assert abs(estimate - exact) <= accuracy * exact + 1e-9, q
+
+
+def test_quantile_sketch_empty_and_zeros(bm):
+    sketch = bm.QuantileSketch()
+    assert sketch.quantile(0.5) is None
+    sketch.add(0)
+    sketch.add(-3)
+    sketch.add(10)
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1.0) == pytest.approx(10, rel=0.01)
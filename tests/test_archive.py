@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+
+from conftest import moderator, run
+
+
+def archived_post(bm, post_id, caption, user_id=1, file_unique_id=None):
+    return bm.PendingPost(
+        user_id=user_id, username=None, original_message_id=post_id, moderator_message_id=0,
+        content_type=bm.ContentType.PHOTO, file_id='file', caption=caption, file_unique_id=file_unique_id,
+        timestamp=datetime.now() - timedelta(hours=1)
+    )
+
+
+def test_parse_query_splits_filters_and_words(bm):
+    match, user_id, since = bm.PostArchive.parse_query('котики user:42 since:01.02.2024 "ab')
+    assert match == '"котики"* "ab"'
+    assert user_id == 42
+    assert since == datetime(2024, 2, 1).timestamp()
+
+
+def test_parse_query_cuts_long_words_and_ignores_bad_filters(bm):
+    match, user_id, since = bm.PostArchive.parse_query('программирование user:abc since:32.13.2024')
+    assert match == '"программ"* "user:abc"*'
+    assert user_id is None and since is None
+
+
+def test_search_matches_prefixes_and_filters_by_author(bm):
+    archive = bm.PostArchive('archive.db')
+    archive.add(archived_post(bm, 1, 'Рыжие котики спят'), 'approved', 10)
+    archive.add(archived_post(bm, 2, 'Собака и кот', user_id=2), 'rejected', 10, comment='баян')
+    archive.add(archived_post(bm, 3, 'Котёнок', user_id=2), 'approved', 11)
+
+    rows, has_next = archive.search('котик')
+    assert [row['post_id'] for row in rows] == [1] and not has_next
+    rows, _ = archive.search('кот user:2')
+    assert [row['post_id'] for row in rows] == [3, 2]
+    rows, _ = archive.search('собака user:1')
+    assert rows == []
+    rows, _ = archive.search('баян')
+    assert [row['post_id'] for row in rows] == [2]
+    rows, has_next = archive.search('', limit=2)
+    assert [row['post_id'] for row in rows] == [3, 2] and has_next
+    archive.close()
+
+
+def test_find_duplicate_returns_only_published(bm):
+    archive = bm.PostArchive('archive.db')
+    archive.add(archived_post(bm, 1, '', file_unique_id='same'), 'rejected', 10)
+    assert archive.find_duplicate('same') is None
+    archive.add(archived_post(bm, 2, '', file_unique_id='same'), 'approved', 10)
+    assert archive.find_duplicate('same')['post_id'] == 2
+    assert archive.find_duplicate(None) is None
+    archive.close()
+
+
+def decided(bm, bot, statuses):
+    """Бот, у которого доставка в каждое место возвращает заданные статусы по очереди"""
+    bot._update_card = lambda post: None
+
+    async def deliver(dest, post, comment):
+        return statuses[dest.dest_id].pop(0)
+
+    async def notify(post, approved, comment=""):
+        return True
+
+    bot.publisher._deliver = deliver
+    bot._notify_user_decision = notify
+    return archived_post(bm, 9, 'мем', file_unique_id='same')
+
+
+def outcomes(bot):
+    return [(row['outcome'], row['moderator_id'], row['comment']) for row in bot.archive.search('', limit=50)[0]]
+
+
+def test_rejection_is_archived_as_rejected(bm, moderation_bot):
+    post = decided(bm, moderation_bot, {})
+    run(moderation_bot._apply_decision(post, 'reject', moderator(10), 'баян'))
+    assert outcomes(moderation_bot) == [('rejected', 10, 'баян')]
+
+
+def test_approval_is_archived_only_after_delivery(bm, moderation_bot):
+    post = decided(bm, moderation_bot, {0: ['retry', 'retry', 'ok']})
+    assert not run(moderation_bot._apply_decision(post, 'approve', moderator(11), 'огонь'))
+    assert outcomes(moderation_bot) == []  # доставка отложена — в архиве пока ничего
+    assert moderation_bot.archive.find_duplicate('same') is None
+    
+    run(moderation_bot._retry_deliveries())
+    assert outcomes(moderation_bot) == []
+    run(moderation_bot._retry_deliveries())
+    assert outcomes(moderation_bot) == [('approved', 11, 'огонь')]
+    assert moderation_bot.archive.find_duplicate('same')['post_id'] == 9
+    run(moderation_bot._retry_deliveries())
+    assert len(outcomes(moderation_bot)) == 1
+
+
+def test_undelivered_approval_is_not_a_duplicate(bm, moderation_bot):
+    post = decided(bm, moderation_bot, {0: ['failed']})
+    run(moderation_bot._apply_decision(post, 'approve', moderator(10)))
+    assert outcomes(moderation_bot) == [('publish_failed', 10, None)]
+    assert moderation_bot.archive.find_duplicate('same') is None
@@ -0,0 +1,49 @@
+def test_audience_index_roundtrip(bm):
+    audience = bm.AudienceIndex('audience.bin')
+    for user_id in (30, 10, 20, 40):
+        audience.touch(user_id)
+    audience.mark_unreachable(20)
+    audience.mark_unreachable(40, deactivated=True)
+    audience.mark_unreachable(999)  # неизвестный пользователь не добавляется
+    audience.write(audience.dump())
+    assert audience.dump() is None  # без изменений снимок не нужен
+
+    restored = bm.AudienceIndex('audience.bin')
+    assert list(restored.iter_recipients()) == [10, 30]
+    assert restored.get_counts() == {'total': 4, 'reachable': 2, 'unreachable': 2}
+    assert not restored.is_reachable(20)
+    assert restored.is_reachable(999)
+
+
+def test_touch_makes_user_reachable_again(bm):
+    audience = bm.AudienceIndex('audience.bin')
+    audience.touch(5)
+    audience.mark_unreachable(5)
+    audience.touch(5, create=False)
+    audience.touch(6, create=False)
+    assert audience.is_reachable(5)
+    assert len(audience) == 1
+
+
+def test_recipients_iterator_survives_inserts(bm):
+    audience = bm.AudienceIndex('audience.bin')
+    for user_id in range(0, 100, 10):
+        audience.touch(user_id)
+    seen = []
+    for user_id in audience.iter_recipients():
+        seen.append(user_id)
+        if user_id % 10 == 0:
+            audience.touch(user_id - 1)  # перед курсором: в эту рассылку не попадает
+            audience.touch(user_id + 5)  # после курсора: попадает один раз
+    assert seen == sorted(set(range(0, 100, 10)) | set(range(5, 100, 10)))
+
+
+def test_foreign_or_truncated_file_is_ignored(bm, workdir):
+    (workdir / 'audience.bin').write_bytes(bm.AuditLog.INDEX_MAGIC + b'\0' * 28)
+    assert len(bm.AudienceIndex('audience.bin')) == 0
+
+    audience = bm.AudienceIndex('good.bin')
+    audience.touch(1)
+    data = audience.dump()
+    (workdir / 'cut.bin').write_bytes(data[:-1])
+    assert len(bm.AudienceIndex('cut.bin')) == 0
@@ -0,0 +1,64 @@
+import os
+
+from conftest import run
+
+
+def fill(audit, count):
+    for i in range(count):
+        audit.append({'event': 'decision', 'post': i % 5, 'mod': 100 + i % 2, 'action': 'approve', 'n': i})
+
+
+def test_history_spans_sealed_and_active_segments(bm):
+    audit = bm.AuditLog('audit', segment_bytes=300)
+    fill(audit, 40)
+    assert len(audit._sealed) > 1
+    assert [record['n'] for record in audit.post_history(3)] == list(range(3, 40, 5))
+    latest = audit.moderator_history(101, limit=4)
+    assert [record['n'] for record in latest] == [39, 37, 35, 33]
+    audit.close()
+
+
+def test_restart_reuses_indexes_and_rebuilds_bad_ones(bm):
+    audit = bm.AuditLog('audit', segment_bytes=300)
+    fill(audit, 40)
+    sealed = audit._sealed[0].path
+    audit.close()
+    with open(bm.AuditLog.index_path(sealed), 'r+b') as f:
+        f.write(b'AUD1')  # чужая магия — индекс строится заново
+
+    restored = bm.AuditLog('audit', segment_bytes=300)
+    assert restored._index_valid(sealed)
+    assert [record['n'] for record in restored.post_history(0)] == list(range(0, 40, 5))
+    restored.close()
+
+
+def test_compaction_merges_oldest_segments(bm):
+    audit = bm.AuditLog('audit', segment_bytes=200)
+    fill(audit, 60)
+    before = len(audit._sealed)
+    expected = audit.post_history(2)
+    run(audit.compact(max_segments=2))
+    assert len(audit._sealed) == 2 < before
+    assert audit.post_history(2) == expected
+    names = sorted(os.listdir('audit'))
+    assert sum(1 for name in names if name.endswith('.jsonl')) == 3
+    audit.close()
+
+    restored = bm.AuditLog('audit', segment_bytes=200)
+    assert restored.post_history(2) == expected
+    restored.close()
+
+
+def test_interrupted_compaction_is_discarded(bm):
+    audit = bm.AuditLog('audit', segment_bytes=200)
+    fill(audit, 60)
+    expected = audit.post_history(1)
+    segments = audit.compaction_candidates(2)
+    merged = audit.compact_files(segments)
+    audit.close()
+    os.remove(bm.AuditLog.index_path(merged))  # сбой до записи индекса
+
+    restored = bm.AuditLog('audit', segment_bytes=200)
+    assert not os.path.exists(merged)
+    assert restored.post_history(1) == expected
+    restored.close()
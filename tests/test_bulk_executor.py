@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from conftest import run
+
+real_sleep = asyncio.sleep
+
+
+@pytest.fixture
+def clock(bm, monkeypatch):
+    """Виртуальное время: ожидание ограничителя сдвигает часы, а не спит"""
+    class Clock:
+        now = 0.0
+
+    async def sleep(seconds):
+        Clock.now += seconds + 1e-9  # как у настоящих часов: после сна время строго больше
+        await real_sleep(0)
+
+    monkeypatch.setattr(bm.time, 'monotonic', lambda: Clock.now)
+    monkeypatch.setattr(bm.asyncio, 'sleep', sleep)
+    return Clock
+
+
+def test_rate_limit_counts_item_cost(bm, clock):
+    async def worker(item):
+        return True
+
+    executor = bm.BulkExecutor(rate_per_second=10, concurrency=5)
+    assert run(executor.run(list(range(30)), worker)) == (30, 0)
+    assert clock.now == pytest.approx(2.0)  # первые 10 — из полного ведра
+    clock.now = 100.0
+    executor = bm.BulkExecutor(rate_per_second=10, concurrency=5)
+    run(executor.run(list(range(30)), worker, cost=2))
+    assert clock.now == pytest.approx(105.0)
+
+
+def test_concurrency_is_capped(bm, clock):
+    active = peak = 0
+
+    async def worker(item):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        for _ in range(3):
+            await real_sleep(0)
+        active -= 1
+        return True
+
+    assert run(bm.BulkExecutor(rate_per_second=1000, concurrency=3).run(list(range(20)), worker)) == (20, 0)
+    assert peak == 3
+
+
+def test_failures_and_broken_progress_do_not_stop_the_job(bm, clock):
+    reports = []
+
+    async def worker(item):
+        if item % 4 == 0:
+            raise RuntimeError('boom')
+        return item % 4 != 1
+
+    async def on_progress(done, failed, total):
+        reports.append((done, failed, total))
+        if len(reports) == 2:
+            raise RuntimeError('report failed')
+
+    done, failed = run(bm.BulkExecutor(rate_per_second=1000, concurrency=4).run(list(range(12)), worker, on_progress=on_progress))
+    assert (done, failed) == (6, 6)
+    assert len(reports) == 12 and reports[-1] == (6, 6, 12)
+    assert [d + f for d, f, _ in reports] == list(range(1, 13))
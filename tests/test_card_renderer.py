@@ -0,0 +1,108 @@
+import asyncio
+import types
+
+from aiogram.exceptions import TelegramBadRequest
+
+from conftest import FakeBot, run
+
+
+def renderer(bm, handler=None):
+    bot = FakeBot(handler)
+    cards = bm.CardRenderer(bot, lambda post: (post.caption, None), window_seconds=0.01)
+    return bot, cards
+
+
+def card(caption, chat_id=-100, message_id=1):
+    return types.SimpleNamespace(moderator_chat_id=chat_id, moderator_message_id=message_id, caption=caption)
+
+
+def test_burst_of_updates_becomes_one_edit_rendered_at_flush_time(bm):
+    bot, cards = renderer(bm)
+    post = card('v0')
+
+    async def scenario():
+        waiters = [cards.update(post) for _ in range(5)]
+        post.caption = 'v5'  # подпись берётся в момент правки, а не постановки
+        await asyncio.gather(*waiters)
+
+    run(scenario())
+    (name, kwargs), = bot.calls
+    assert name == 'edit_message_caption' and kwargs['caption'] == 'v5'
+    assert (cards.requested, cards.edits, cards.skipped) == (5, 1, 0)
+
+
+def test_edits_matching_the_card_are_skipped(bm):
+    bot, cards = renderer(bm)
+
+    async def scenario():
+        cards.remember(-100, 1, 'same', None)
+        await cards.replace(-100, 1, 'same', None)
+        await cards.refresh_text(-100, 2, lambda: ('digest', None))
+        await cards.refresh_text(-100, 2, lambda: ('digest', None))
+
+    run(scenario())
+    assert [name for name, _ in bot.calls] == ['edit_message_text']
+    assert cards.skipped == 2
+
+
+def test_update_during_edit_is_sent_after_it(bm):
+    async def scenario():
+        editing, release = asyncio.Event(), asyncio.Event()
+
+        async def slow(name, kwargs):
+            editing.set()
+            await release.wait()
+
+        bot, cards = renderer(bm, slow)
+        post = card('first')
+        first = cards.update(post)
+        await editing.wait()
+        post.caption = 'second'
+        second = cards.update(post)
+        release.set()
+        await first
+        await second
+        await cards.flush()
+        return bot
+
+    bot = run(scenario())
+    assert [kwargs['caption'] for _, kwargs in bot.calls] == ['first', 'second']
+
+
+def test_not_modified_is_remembered_and_other_errors_are_retried(bm):
+    async def handler(name, kwargs):
+        if kwargs['caption'] == 'stale':
+            raise TelegramBadRequest(None, 'Bad Request: message is not modified')
+        if kwargs['caption'] == 'gone':
+            raise TelegramBadRequest(None, 'Bad Request: message to edit not found')
+
+    bot, cards = renderer(bm, handler)
+
+    async def scenario():
+        for caption in ('stale', 'stale', 'gone', 'gone'):
+            await cards.replace(-100, 1, caption, None)
+
+    run(scenario())
+    assert [kwargs['caption'] for _, kwargs in bot.calls] == ['stale', 'gone', 'gone']
+    assert cards.edits == 0 and cards.skipped == 1
+
+
+def test_cards_are_flushed_independently(bm):
+    bot, cards = renderer(bm)
+
+    async def scenario():
+        for message_id in (1, 2, 3):
+            cards.update(card(f'card {message_id}', message_id=message_id))
+        await cards.flush()
+
+    run(scenario())
+    assert sorted(kwargs['message_id'] for _, kwargs in bot.calls) == [1, 2, 3]
+    assert not cards._flushers and not cards._desired and not cards._waiters
+
+
+def test_known_cards_are_bounded(bm, monkeypatch):
+    monkeypatch.setattr(bm.CardRenderer, 'KNOWN_CARDS', 2)
+    _, cards = renderer(bm)
+    for message_id in (1, 2, 1, 3):
+        cards.remember(-100, message_id, 'x', None)
+    assert list(cards._sent) == [(-100, 1), (-100, 3)]  # вытесняется давно не тронутая
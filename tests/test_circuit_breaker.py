@@ -0,0 +1,147 @@
+from types import SimpleNamespace
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError, TelegramRetryAfter
+from aiogram.methods import GetMe, SendMessage
+
+from conftest import run
+
+
+@pytest.fixture
+def clock(bm, monkeypatch):
+    class Clock:
+        now = 1000.0
+    monkeypatch.setattr(bm.time, 'monotonic', lambda: Clock.now)
+    return Clock
+
+
+def test_breaker_opens_at_threshold_and_probes_once(bm, clock):
+    breaker = bm.CircuitBreaker(threshold=3, open_seconds=30)
+    assert not breaker.failure() and not breaker.failure()
+    assert breaker.state == 'closed' and not breaker.blocked()
+    assert breaker.failure()
+    assert breaker.state == 'open' and breaker.blocked()
+    
+    clock.now += 30
+    assert breaker.state == 'half_open' and not breaker.blocked()
+    breaker.acquire()
+    assert breaker.blocked()  # второй запрос ждёт исхода пробного
+
+
+def test_failed_probe_reopens_breaker(bm, clock):
+    breaker = bm.CircuitBreaker(threshold=1, open_seconds=30)
+    assert breaker.failure()
+    clock.now += 30
+    breaker.acquire()
+    assert not breaker.failure()  # уже был разомкнут — повторно не сообщаем
+    breaker.probing = False
+    assert breaker.state == 'open'
+    assert breaker.opened_until == clock.now + 30
+
+
+class FakeApi:
+    """make_request, который отвечает заранее заданными исходами"""
+    
+    def __init__(self):
+        self.outcomes = []
+        self.calls = []
+    
+    async def __call__(self, bot, method):
+        self.calls.append(method)
+        outcome = self.outcomes.pop(0) if self.outcomes else True
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+class MiddlewareList(list):
+    """Как менеджер middleware сессии: перечисляется и регистрирует вызовом"""
+    
+    def __call__(self, middleware):
+        self.append(middleware)
+
+
+@pytest.fixture
+def middleware(bm, config):
+    return bm.CircuitBreakerMiddleware(config.for_tenant('breaker', BREAKER_FAILURE_THRESHOLD=2))
+
+
+def call(middleware, api, method, bot_id=1):
+    return run(middleware(api, SimpleNamespace(id=bot_id), method))
+
+
+def test_network_failures_open_method_and_success_closes(bm, clock, middleware):
+    api = FakeApi()
+    method = SendMessage(chat_id=5, text='x')
+    for _ in range(2):
+        api.outcomes.append(TelegramNetworkError(method, 'timeout'))
+        with pytest.raises(TelegramNetworkError):
+            call(middleware, api, method)
+    assert middleware.blocked(1, 'sendMessage', 6)
+    
+    with pytest.raises(bm.CircuitOpenError):
+        call(middleware, api, SendMessage(chat_id=6, text='x'))
+    assert middleware.rejected == {1: 1} and len(api.calls) == 2
+    
+    clock.now += middleware.config.BREAKER_OPEN_SECONDS
+    assert call(middleware, api, method) is True
+    assert middleware.methods == {} and middleware.chats == {}
+    assert middleware.status(1) == []
+
+
+def test_retry_after_blocks_only_that_chat(bm, clock, middleware):
+    api = FakeApi()
+    method = SendMessage(chat_id=5, text='x')
+    api.outcomes.append(TelegramRetryAfter(method, 'flood', retry_after=12))
+    with pytest.raises(TelegramRetryAfter):
+        call(middleware, api, method)
+    
+    assert middleware.blocked(1, 'sendMessage', 5)
+    assert not middleware.blocked(1, 'sendMessage', 6)
+    assert not middleware.blocked(2, 'sendMessage', 5)  # другой бот — своя квота
+    assert middleware.status(1) == [('чат 5', 'open')]
+    assert middleware.status(2) == []
+    clock.now += 12
+    assert not middleware.blocked(1, 'sendMessage', 5)
+
+
+def test_client_error_counts_as_recovery(bm, clock, middleware):
+    api = FakeApi()
+    method = SendMessage(chat_id=5, text='x')
+    api.outcomes += [TelegramNetworkError(method, 'timeout'), TelegramBadRequest(method, 'chat not found')]
+    with pytest.raises(TelegramNetworkError):
+        call(middleware, api, method)
+    assert middleware.methods[(1, 'sendMessage')].failures == 1
+    with pytest.raises(TelegramBadRequest):
+        call(middleware, api, method)
+    assert middleware.methods == {} and middleware.chats == {}
+
+
+def test_exempt_methods_bypass_breakers(bm, clock, middleware):
+    api = FakeApi()
+    method = GetMe()
+    for _ in range(5):
+        api.outcomes.append(TelegramNetworkError(method, 'timeout'))
+        with pytest.raises(TelegramNetworkError):
+            call(middleware, api, method)
+    assert middleware.methods == {}
+    assert call(middleware, api, method) is True
+
+
+def test_tenants_sharing_a_session_have_separate_breakers(bm, config, clock):
+    session = SimpleNamespace(middleware=MiddlewareList())
+    strict = SimpleNamespace(id=1, session=session)
+    lenient = SimpleNamespace(id=2, session=session)
+    middleware = bm.CircuitBreakerMiddleware.attach(strict, config.for_tenant('a', BREAKER_FAILURE_THRESHOLD=1))
+    assert bm.CircuitBreakerMiddleware.attach(lenient, config.for_tenant('b', BREAKER_FAILURE_THRESHOLD=3)) is middleware
+    assert session.middleware == [middleware]
+
+    api = FakeApi()
+    for bot in (strict, lenient):
+        method = SendMessage(chat_id=5, text='x')
+        api.outcomes.append(TelegramNetworkError(method, 'timeout'))
+        with pytest.raises(TelegramNetworkError):
+            run(middleware(api, bot, method))
+    assert middleware.blocked(1, 'sendMessage', 6)  # порог первого арендатора — 1
+    assert not middleware.blocked(2, 'sendMessage', 6)  # у второго свой порог и свои сбои
+    assert run(middleware(api, lenient, SendMessage(chat_id=6, text='x'))) is True
@@ -0,0 +1,59 @@
+import pytest
+
+
+@pytest.fixture
+def clock(bm, monkeypatch):
+    class Clock:
+        now = 1000.0
+    monkeypatch.setattr(bm.time, 'monotonic', lambda: Clock.now)
+    return Clock
+
+
+@pytest.fixture
+def sessions(bm, config, clock):
+    return bm.CommentSessionManager(config.for_tenant('comments', COMMENT_SESSION_MINUTES=1), tick_seconds=5)
+
+
+def test_reopening_replaces_draft_and_its_prompt(sessions):
+    old = sessions.open(10, 1, 'approve', chat_id=-100)
+    sessions.attach_prompt(old, 500)
+    new = sessions.open(10, 1, 'reject', chat_id=-100)
+    assert sessions.get_by_prompt(-100, 500) is None
+    sessions.close(old)  # устаревший объект не закрывает новый черновик
+    assert sessions.resolve(10, -100, None) is new
+
+
+def test_reply_to_prompt_wins_over_latest_draft(sessions):
+    first = sessions.open(10, 1, 'approve', chat_id=-100)
+    sessions.attach_prompt(first, 501)
+    second = sessions.open(10, 2, 'reject', chat_id=-100)
+    sessions.attach_prompt(second, 502)
+    assert sessions.resolve(10, -100, 501) is first
+    assert sessions.resolve(10, -100, None) is second
+    assert sessions.resolve(10, -100, 999) is second  # ответ не на запрос — последний черновик
+    assert sessions.resolve(11, -100, 501) is None  # чужой запрос не подхватывается
+    assert sessions.resolve(10, -200, None) is None
+
+
+def test_close_all_only_touches_one_chat(sessions):
+    sessions.open(10, 1, 'approve', chat_id=-100)
+    sessions.open(10, 2, 'approve', chat_id=-100)
+    other_chat = sessions.open(10, 3, 'approve', chat_id=10)
+    assert sessions.close_all(10, -100) == 2
+    assert sessions.resolve(10, -100, None) is None
+    assert sessions.resolve(10, 10, None) is other_chat
+    assert sessions.close_all(10, 10) == 1
+    assert sessions._by_moderator == {} and sessions._sessions == {}
+
+
+def test_drafts_expire_after_timeout(sessions, clock):
+    expired = sessions.open(10, 1, 'approve', chat_id=-100)
+    sessions.attach_prompt(expired, 500)
+    clock.now += 30
+    kept = sessions.open(10, 2, 'approve', chat_id=-100)
+    clock.now += 30
+    assert sessions.expire() == [expired]
+    assert sessions.get_by_prompt(-100, 500) is None
+    assert sessions.resolve(10, -100, None) is kept
+    clock.now += 30
+    assert sessions.expire() == [kept]
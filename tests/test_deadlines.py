@@ -0,0 +1,93 @@
+import pytest
+
+
+@pytest.fixture
+def clock(bm, monkeypatch):
+    """Подменённые монотонные часы: clock.now двигается вручную"""
+    class Clock:
+        now = 1000.0
+    monkeypatch.setattr(bm.time, 'monotonic', lambda: Clock.now)
+    return Clock
+
+
+def test_timer_wheel_fires_on_rounded_up_tick(bm):
+    wheel = bm.TimerWheel(tick_seconds=1.0, slots=8)
+    start = wheel._last_tick
+    wheel.schedule('a', 2.5, now=start)
+    wheel.schedule('b', 1, now=start)
+    assert len(wheel) == 2 and 'a' in wheel
+    
+    assert wheel.advance(start + 0.9) == []
+    assert wheel.advance(start + 1) == ['b']
+    assert wheel.advance(start + 2) == []
+    assert wheel.advance(start + 3) == ['a']
+    assert len(wheel) == 0
+
+
+def test_timer_wheel_counts_rounds_beyond_slot_count(bm):
+    wheel = bm.TimerWheel(tick_seconds=1.0, slots=4)
+    start = wheel._last_tick
+    wheel.schedule('far', 10, now=start)
+    wheel.schedule('near', 2, now=start)
+    
+    assert wheel.advance(start + 9) == ['near']
+    assert 'far' in wheel
+    assert wheel.advance(start + 10) == ['far']
+
+
+def test_timer_wheel_cancel_and_reschedule(bm):
+    wheel = bm.TimerWheel(tick_seconds=1.0, slots=8)
+    start = wheel._last_tick
+    wheel.schedule('a', 1, now=start)
+    wheel.schedule('b', 1, now=start)
+    wheel.cancel('b')
+    wheel.cancel('missing')
+    wheel.schedule('a', 5, now=start)
+    
+    assert wheel.advance(start + 4) == []
+    assert wheel.advance(start + 5) == ['a']
+
+
+def test_timer_wheel_counts_idle_time_before_first_advance(bm):
+    wheel = bm.TimerWheel(tick_seconds=1.0, slots=8)
+    start = wheel._last_tick
+    wheel.schedule('early', 3, now=start)
+    wheel.schedule('late', 3, now=start + 2.5)  # колесо простояло, advance() ещё не вызывался
+    
+    assert wheel.advance(start + 3) == ['early']
+    assert wheel.advance(start + 5) == []
+    assert wheel.advance(start + 6) == ['late']
+
+
+def test_timer_wheel_never_fires_before_delay(bm):
+    wheel = bm.TimerWheel(tick_seconds=1.0, slots=4)
+    start = wheel._last_tick
+    for step in range(40):
+        now = start + step * 0.3
+        fired = wheel.advance(now)
+        assert all(now >= due for due in fired)
+        wheel.schedule(now + 2.2, 2.2, now=now)
+    assert all(due <= start + 40 * 0.3 for due in wheel.advance(start + 40 * 0.3))
+
+
+def test_deadline_scheduler_reminds_then_expires(bm, clock):
+    scheduler = bm.DeadlineScheduler([600, 60, 300], tick_seconds=30)
+    scheduler.track(1)
+    scheduler.track(2, age_seconds=120)
+    scheduler.track(3, age_seconds=900)
+    assert len(scheduler) == 3
+    
+    clock.now += 30
+    assert scheduler.advance() == ([], [3])
+    clock.now += 30
+    assert scheduler.advance() == ([1], [])
+    clock.now += 150
+    assert scheduler.advance() == ([2], [])
+    clock.now += 90
+    assert scheduler.advance() == ([1], [])
+    clock.now += 270
+    assert scheduler.advance() == ([], [2])
+    scheduler.untrack(1)
+    clock.now += 3600
+    assert scheduler.advance() == ([], [])
+    assert len(scheduler) == 0
@@ -0,0 +1,101 @@
+import asyncio
+import types
+
+from conftest import moderator, run
+
+
+def callback(data, user_id=10):
+    answers = []
+
+    async def answer(text=None, show_alert=False):
+        answers.append(text)
+
+    return types.SimpleNamespace(data=data, from_user=moderator(user_id), answer=answer, answers=answers)
+
+
+def card_reply(text, user_id=10):
+    replies = []
+
+    async def reply(text, **kwargs):
+        replies.append(text)
+
+    return types.SimpleNamespace(text=text, from_user=moderator(user_id), reply=reply, replies=replies)
+
+
+def setup(bm, bot):
+    applied = []
+
+    async def apply_decision(post_data, action, moderator_user, comment=""):
+        applied.append((post_data.original_message_id, action))
+        await asyncio.sleep(0.01)  # решение занимает время: публикация, уведомление
+        return True
+
+    bot._apply_decision = apply_decision
+    return applied
+
+
+async def add(bot, bm, post_id):
+    await bot.post_manager.add_post(
+        user_id=1, username=None, original_msg_id=post_id, mod_msg_id=500 + post_id,
+        content_type=bm.ContentType.PHOTO, file_id='file'
+    )
+    return await bot.post_manager.get_post(post_id)
+
+
+def test_button_presses_and_card_reply_decide_once(bm, moderation_bot):
+    applied = setup(bm, moderation_bot)
+
+    async def scenario():
+        post = await add(moderation_bot, bm, 1)
+        await asyncio.gather(
+            moderation_bot._approve_post(callback('approve_1')),
+            moderation_bot._reject_post(callback('reject_1', user_id=11)),
+            moderation_bot._handle_card_reply(card_reply('+ годно'), post),
+            moderation_bot._approve_post(callback('approve_1', user_id=11)),
+        )
+
+    run(scenario())
+    assert len(applied) == 1
+    stats = moderation_bot.post_manager.get_stats()
+    assert stats['total_approved'] + stats['total_rejected'] == 1
+
+
+def test_button_after_expiry_is_refused(bm, moderation_bot):
+    applied = setup(bm, moderation_bot)
+    press = callback('approve_1')
+
+    async def scenario():
+        await add(moderation_bot, bm, 1)
+        assert await moderation_bot.post_manager.expire_posts([1])
+        await moderation_bot._approve_post(press)
+
+    run(scenario())
+    assert applied == []
+    assert press.answers == ["Предожка уже обработана или устарела."]
+
+
+def test_non_moderator_cannot_decide(bm, moderation_bot):
+    applied = setup(bm, moderation_bot)
+
+    async def scenario():
+        await add(moderation_bot, bm, 1)
+        await moderation_bot._approve_post(callback('approve_1', user_id=99))
+
+    run(scenario())
+    assert applied == []
+    assert moderation_bot.post_manager.get_queue_position(1) == 1
+
+
+def test_mark_decisions_are_counted_once(bm, config):
+    manager = bm.PostManager(config)
+
+    async def scenario():
+        await manager.add_post(user_id=1, username=None, original_msg_id=1, mod_msg_id=2,
+                               content_type=bm.ContentType.PHOTO, file_id='file')
+        assert await manager.claim_posts([1], approved=False)
+        await manager.mark_approved(1)
+        await manager.mark_rejected(1)
+
+    run(scenario())
+    stats = manager.get_stats()
+    assert (stats['total_approved'], stats['total_rejected']) == (0, 1)
@@ -0,0 +1,46 @@
+from conftest import run
+from test_post_manager import add, assert_indexes_consistent
+
+
+def test_withdraw_post_forgets_undecided_post(bm, config):
+    manager = bm.PostManager(config)
+
+    async def scenario():
+        for post_id in range(1, 4):
+            await add(manager, bm, post_id, user_id=5)
+        await manager.claim_posts([3], approved=True)
+        assert manager._user_stats[5]['submitted'] == 3
+        
+        post = await manager.withdraw_post(1)
+        assert post.original_message_id == 1
+        assert await manager.withdraw_post(1) is None
+        assert await manager.withdraw_post(3) is None  # решённый пост не отзывается
+        assert 1 not in manager._pending_posts
+        assert manager._user_stats[5]['submitted'] == 2
+        assert manager.find_posts(user_id=5) == [2]
+        assert_indexes_consistent(manager)
+
+    run(scenario())
+
+
+def test_digest_posts_follow_album_order_and_skip_removed(bm, config):
+    manager = bm.PostManager(config)
+
+    async def scenario():
+        for post_id in range(1, 4):
+            await add(manager, bm, post_id)
+        manager.attach_digest(-100, 500, [3, 1, 2])
+        assert [post.original_message_id for post in manager.get_digest_posts(-100, 500)] == [3, 1, 2]
+        assert manager._pending_posts[1].digest_message_id == 500
+        await manager.withdraw_post(1)
+        assert [post.original_message_id for post in manager.get_digest_posts(-100, 500)] == [3, 2]
+        assert manager.get_digest_posts(-100, 501) == []
+
+    run(scenario())
+
+
+def test_digest_keyboard_has_row_per_post(bm):
+    assert bm.KeyboardFactory.get_digest_kb([]) is None
+    markup = bm.KeyboardFactory.get_digest_kb([(1, 7), (2, 9)])
+    rows = [[button.callback_data for button in row] for row in markup.inline_keyboard]
+    assert rows == [['approve_7', 'reject_7'], ['approve_9', 'reject_9']]
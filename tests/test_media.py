@@ -0,0 +1,124 @@
+import io
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import make_submission, run
+
+
+@pytest.fixture
+def media_config(config):
+    return config.for_tenant('media', media_analysis_enabled=True)
+
+
+def png(size=(96, 96)):
+    image = pytest.importorskip('PIL.Image').new('L', size, 0)
+    for x in range(size[0]):
+        for y in range(size[1]):
+            image.putpixel((x, y), (x * 7 + y * 13) % 256)
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def test_split_bands_cover_all_bits(bm):
+    for count in (1, 5, 7, 64, 100):
+        covered = 0
+        for shift, mask in bm.MediaAnalyzer._split_bands(count):
+            assert not covered & (mask << shift)
+            covered |= mask << shift
+        assert covered == (1 << 64) - 1
+
+
+def test_analysis_is_off_by_default(bm, config):
+    assert not bm.BotConfig.MEDIA_ANALYSIS_ENABLED
+    analyzer = bm.MediaAnalyzer(config)
+    assert not analyzer.enabled
+    assert not analyzer.submit(1, make_submission(bm, 1))
+    assert analyzer.queue.empty() and analyzer.dropped == 0
+
+
+def test_full_queue_drops_instead_of_blocking(bm, media_config):
+    analyzer = bm.MediaAnalyzer(media_config.for_tenant('media', media_analysis_queue=1))
+    assert analyzer.submit(1, make_submission(bm, 1))
+    assert not analyzer.submit(2, make_submission(bm, 2))
+    assert analyzer.dropped == 1
+
+
+def test_most_recent_match_is_chosen_by_time_not_by_id(bm, config):
+    analyzer = bm.MediaAnalyzer(config)
+    # id сообщений из разных личных чатов несравнимы: у свежего поста id может быть меньше
+    analyzer.add_hash(900, 0b1111, timestamp=100.0)
+    analyzer.add_hash(5, 0b1110, timestamp=200.0)
+    analyzer.add_hash(40, 0b1101, timestamp=150.0)
+    assert analyzer.find_similar(1000, 0b1111) == 5
+
+
+def test_find_similar_agrees_with_brute_force_over_shuffled_ids(bm, config):
+    analyzer = bm.MediaAnalyzer(config.for_tenant('media', media_similar_history=200))
+    distance = analyzer.config.MEDIA_SIMILAR_DISTANCE
+    rng = random.Random(3)
+    post_ids = rng.sample(range(1, 100_000), 1000)
+    history = {}
+    for step, post_id in enumerate(post_ids):
+        if history and rng.random() < 0.5:
+            dhash = history[rng.choice(list(history)[-50:])][0]
+            for _ in range(rng.randint(0, distance + 2)):
+                dhash ^= 1 << rng.randrange(64)
+        else:
+            dhash = rng.getrandbits(64)
+        matches = [other_id for other_id, (other, _) in history.items() if (dhash ^ other).bit_count() <= distance]
+        expected = max(matches, key=lambda other_id: history[other_id][1], default=None)
+        assert analyzer.find_similar(post_id, dhash) == expected
+        analyzer.add_hash(post_id, dhash, timestamp=float(step))
+        history[post_id] = (dhash, float(step))
+        if len(history) > 200:
+            del history[next(iter(history))]
+
+
+def test_evicted_hashes_leave_the_band_index(bm, config):
+    analyzer = bm.MediaAnalyzer(config.for_tenant('media', media_similar_history=2))
+    analyzer.add_hash(1, 0, timestamp=1.0)
+    analyzer.add_hash(2, 0x00FF00FF00FF00FF, timestamp=2.0)
+    analyzer.add_hash(3, (1 << 64) - 1, timestamp=3.0)
+    assert list(analyzer._hashes) == [2, 3]
+    assert analyzer.find_similar(4, 0) is None
+    indexed = set().union(*(ids for index in analyzer._band_index for ids in index.values()))
+    assert indexed == {2, 3}
+
+
+def test_lookup_and_repeated_add_do_not_change_history(bm, config):
+    analyzer = bm.MediaAnalyzer(config)
+    analyzer.add_hash(1, 0b1011, timestamp=1.0)
+    assert analyzer.find_similar(1, 0b1011) is None  # сам с собой не сравнивается
+    analyzer.add_hash(1, 0, timestamp=5.0)
+    assert analyzer._hashes[1] == (0b1011, 1.0)
+
+
+def test_injected_pool_is_used_and_left_running(bm, media_config):
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        analyzer = bm.MediaAnalyzer(media_config, pool)
+        result = run(analyzer.analyze(png()))
+        assert 'blank' not in result['flags'] and 0 <= result['dhash'] < 1 << 64
+        analyzer.shutdown()
+        assert pool.submit(int).result() == 0  # общий пул останавливает его владелец
+
+
+def test_cached_repeat_does_not_shadow_first_post(bm, moderation_bot):
+    moderation_bot.media = bm.MediaAnalyzer(moderation_bot.config, ThreadPoolExecutor(max_workers=1))
+    downloads = []
+
+    async def download(file_id):
+        downloads.append(file_id)
+        return io.BytesIO(png())
+
+    moderation_bot.bot.download = download
+    first, repeat = make_submission(bm, 1), make_submission(bm, 2)
+    repeat.file_unique_id = first.file_unique_id
+    first.preview_file_id = repeat.preview_file_id = 'preview'
+    run(moderation_bot._analyze_submission(1, first))
+    run(moderation_bot._analyze_submission(2, repeat))
+    assert downloads == ['preview']
+    assert list(moderation_bot.media._hashes) == [1]
+    moderation_bot.media._pool.shutdown()
@@ -0,0 +1,76 @@
+import pytest
+
+from conftest import run
+
+
+@pytest.fixture
+def clock(bm, monkeypatch):
+    class Clock:
+        now = 1000.0
+    monkeypatch.setattr(bm.time, 'monotonic', lambda: Clock.now)
+    return Clock
+
+
+def note(bm, post_id, approved=True, comment=""):
+    return bm.DecisionNote(post_id=post_id, approved=approved, comment=comment)
+
+
+def test_window_counts_from_first_decision(bm, config, clock):
+    digest = bm.NotificationDigest(config.for_tenant('digest', DIGEST_WINDOW_SECONDS=10))
+    digest.add(1, note(bm, 101))
+    clock.now += 8
+    digest.add(1, note(bm, 102, approved=False))  # окно не продлевается
+    digest.add(2, note(bm, 201))
+    clock.now += 2
+    assert [(user_id, [n.post_id for n in notes]) for user_id, notes in digest.due()] == [(1, [101, 102])]
+    assert len(digest) == 1
+    digest.add(1, note(bm, 103))  # новое окно после отправки
+    clock.now += 8
+    assert [user_id for user_id, _ in digest.due()] == [2]
+    clock.now += 2
+    assert [user_id for user_id, _ in digest.due()] == [1]
+
+
+def test_drain_takes_everything_and_cancels_timers(bm, config, clock):
+    digest = bm.NotificationDigest(config.for_tenant('digest', DIGEST_WINDOW_SECONDS=10))
+    digest.add(1, note(bm, 101))
+    digest.add(2, note(bm, 201))
+    assert sorted(user_id for user_id, _ in digest.drain()) == [1, 2]
+    clock.now += 60
+    assert digest.due() == [] and len(digest) == 0
+
+
+def test_render_escapes_moderator_comments(bm):
+    single = bm.NotificationDigest.render([note(bm, 1, approved=False, comment='<script> & co')])
+    assert '&lt;script&gt; &amp; co' in single and '<script>' not in single
+    batch = bm.NotificationDigest.render([
+        note(bm, 1, comment='a < b'), note(bm, 2, approved=False), note(bm, 3, approved=False, comment='R&D')
+    ])
+    assert 'Одобрено: <b>1</b>' in batch and 'Отклонено: <b>2</b>' in batch
+    assert '✅ #1: a &lt; b' in batch and '❌ #3: R&amp;D' in batch and '#2' not in batch
+
+
+def test_decisions_go_to_digest_or_straight_to_user(bm, config, moderation_bot):
+    sent = []
+
+    async def send(user_id, notes):
+        sent.append((user_id, [n.post_id for n in notes]))
+        return True
+
+    moderation_bot._send_user_notification = send
+    post = bm.PendingPost(
+        user_id=5, username=None, original_message_id=7, moderator_message_id=70,
+        content_type=bm.ContentType.PHOTO, file_id='file'
+    )
+    moderation_bot.config.DIGEST_WINDOW_SECONDS = 30
+    assert run(moderation_bot._notify_user_decision(post, True))
+    assert sent == [] and len(moderation_bot.digest) == 1
+    
+    moderation_bot.config.DIGEST_WINDOW_SECONDS = 0
+    assert run(moderation_bot._notify_user_decision(post, False))
+    assert sent == [(5, [7])]
+    
+    moderation_bot.audience.touch(5)
+    moderation_bot.audience.mark_unreachable(5)  # автор заблокировал бота
+    assert not run(moderation_bot._notify_user_decision(post, False))
+    assert sent == [(5, [7])]
@@ -0,0 +1,105 @@
+import asyncio
+import json
+
+from conftest import make_submission, run
+
+
+def fill(queue, bm, users):
+    async def scenario():
+        return [await queue.push(make_submission(bm, message_id, user_id)) for message_id, user_id in enumerate(users)]
+    return run(scenario())
+
+
+def drain(queue, count=None):
+    async def scenario():
+        return [await queue.pop() for _ in range(len(queue) if count is None else count)]
+    return run(scenario())
+
+
+def test_pop_alternates_between_users(bm):
+    queue = bm.OverflowQueue('overflow.jsonl')
+    fill(queue, bm, [1, 1, 1, 2, 3, 3])
+    order = [submission.user_id for submission in drain(queue)]
+    assert order == [1, 2, 3, 1, 3, 1]
+    assert drain(queue, 1) == [None]
+    queue.close()
+
+
+def test_position_counts_fair_share_of_others(bm):
+    queue = bm.OverflowQueue('overflow.jsonl')
+    fill(queue, bm, [1, 1, 1, 2])
+    assert queue.position(2) == 2  # одна предложка первого пользователя впереди
+    assert queue.position(1) == 4
+    assert run(queue.push(make_submission(bm, 10, 3))) == 3
+    assert queue.count_for(1) == 3 and queue.count_for(9) == 0
+    queue.close()
+
+
+def test_restart_skips_tombstoned_entries(bm, workdir):
+    queue = bm.OverflowQueue('overflow.jsonl')
+    fill(queue, bm, [1, 2, 1])
+    first, = drain(queue, 1)
+    queue.close()
+
+    restored = bm.OverflowQueue('overflow.jsonl')
+    assert len(restored) == 2
+    rest = drain(restored)
+    assert first.message_id not in {submission.message_id for submission in rest}
+    assert rest[0].file_id == f'file-{rest[0].message_id}'
+    assert (workdir / 'overflow.jsonl').stat().st_size == 0  # опустевший журнал обрезается
+    restored.close()
+
+
+def test_log_is_compacted_under_sustained_load(bm, workdir):
+    queue = bm.OverflowQueue('overflow.jsonl', compact_bytes=2000)
+    path = workdir / 'overflow.jsonl'
+
+    async def scenario():
+        for message_id in range(10):
+            await queue.push(make_submission(bm, message_id, message_id % 3))
+        popped, sizes = [], []
+        for message_id in range(10, 300):  # очередь ни разу не пустеет
+            await queue.push(make_submission(bm, message_id, message_id % 3))
+            popped.append((await queue.pop()).message_id)
+            sizes.append(path.stat().st_size)
+        return popped, sizes
+
+    popped, sizes = run(scenario())
+    assert len(set(popped)) == len(popped) == 290
+    assert max(sizes) < 6000  # без сжатия журнал рос бы до ~60 КБ
+    assert len(queue) == 10
+    
+    records = [json.loads(line) for line in path.read_bytes().splitlines()]
+    live = {record['sub']['message_id'] for record in records if 'sub' in record}
+    assert live >= set(range(300)) - set(popped)  # ждущие записи пережили сжатие
+    queue.close()
+    
+    restored = bm.OverflowQueue('overflow.jsonl')
+    rest = {submission.message_id for submission in drain(restored)}
+    assert len(rest) == 10 and rest.isdisjoint(popped)
+    restored.close()
+
+
+def test_concurrent_push_and_pop_keep_offsets_consistent(bm):
+    queue = bm.OverflowQueue('overflow.jsonl', compact_bytes=500)
+
+    async def producer(user_id):
+        for message_id in range(user_id * 100, user_id * 100 + 40):
+            await queue.push(make_submission(bm, message_id, user_id))
+
+    async def consumer(got):
+        for _ in range(60):
+            if (submission := await queue.pop()) is not None:
+                got.append(submission.message_id)
+            await asyncio.sleep(0)
+
+    async def scenario():
+        got = []
+        await asyncio.gather(producer(1), producer(2), consumer(got), consumer(got))
+        while len(queue):
+            got.append((await queue.pop()).message_id)
+        return got
+
+    got = run(scenario())
+    assert sorted(got) == list(range(100, 140)) + list(range(200, 240))
+    queue.close()
@@ -0,0 +1,81 @@
+import asyncio
+
+from conftest import run
+
+
+def add(manager, bm, post_id, user_id=1, content_type=None):
+    return manager.add_post(
+        user_id=user_id, username=None, original_msg_id=post_id, mod_msg_id=1000 + post_id,
+        content_type=content_type or bm.ContentType.PHOTO, file_id=f'file-{post_id}'
+    )
+
+
+def assert_indexes_consistent(manager):
+    pending = {post_id for post_id, post in manager._pending_posts.items() if not post.is_processed}
+    assert manager._queue_index == sorted(manager._queue_index)
+    assert manager._priority_index == sorted(manager._priority_index)
+    assert {post_id for _, post_id in manager._queue_index} == pending
+    assert {key[-1] for key in manager._priority_index} == pending
+    assert {post_id for index in manager._user_index.values() for _, post_id in index} == pending
+    assert {post_id for index in manager._type_index.values() for _, post_id in index} == pending
+    assert all(manager._user_index.values()) and all(manager._type_index.values())  # пустые ключи удаляются
+    assert len(manager.deadlines) == len(pending)
+
+
+def test_indexes_follow_add_claim_and_expire(bm, config):
+    manager = bm.PostManager(config)
+
+    async def scenario():
+        for post_id in range(1, 11):
+            await add(manager, bm, post_id, user_id=post_id % 3,
+                      content_type=bm.ContentType.VIDEO if post_id % 2 else bm.ContentType.PHOTO)
+        assert_indexes_consistent(manager)
+        await manager.claim_posts([2, 3], approved=True)
+        await manager.expire_posts([4])
+        await add(manager, bm, 5, user_id=7)  # повторное добавление заменяет старую запись
+        assert_indexes_consistent(manager)
+        assert manager.find_posts(user_id=7) == [5]
+        page, total = manager.get_queue_page(0, 100)
+        assert total == 7
+        assert [post.original_message_id for post in page] == [1, 6, 7, 8, 9, 10, 5]
+
+    run(scenario())
+
+
+def test_claim_posts_is_exclusive_under_concurrency(bm, config):
+    manager = bm.PostManager(config)
+
+    async def scenario():
+        for post_id in range(1, 6):
+            await add(manager, bm, post_id)
+        results = await asyncio.gather(
+            manager.claim_posts([1, 2, 3], approved=True),
+            manager.claim_posts([3, 4, 5], approved=False),
+            manager.claim_posts([1, 5], approved=True),
+        )
+        claimed = [post.original_message_id for batch in results for post in batch]
+        assert sorted(claimed) == [1, 2, 3, 4, 5]
+        stats = manager.get_stats()
+        assert stats['total_approved'] + stats['total_rejected'] == 5
+        assert_indexes_consistent(manager)
+        assert await manager.claim_posts([1, 2, 3, 4, 5, 404], approved=True) == []
+
+    run(scenario())
+
+
+def test_trusted_author_goes_first(bm, config):
+    manager = bm.PostManager(config)
+
+    async def scenario():
+        await add(manager, bm, 1, user_id=1)
+        for _ in range(config.REPUTATION_MIN_DECISIONS + 1):
+            manager._record_user_decision(2, True)
+        assert manager.get_priority(2) == bm.PostManager.PRIORITY_TRUSTED
+        await add(manager, bm, 2, user_id=2)
+        assert manager.get_queue_position(2) == 1
+        assert manager.get_queue_position(1) == 2
+        await manager.claim_posts([2], approved=True)
+        assert manager.get_queue_position(2) is None
+        assert manager.get_queue_position(1) == 1
+
+    run(scenario())
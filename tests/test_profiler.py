@@ -0,0 +1,114 @@
+import asyncio
+import threading
+import time
+import types
+
+from conftest import run
+
+
+def spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def outer():
+    spin(0)
+
+
+def test_busy_function_dominates_hot_list_and_folded_stacks(bm):
+    profiler = bm.SamplingProfiler(threading.get_ident(), interval=0.001)
+    profiler.start()
+    spin(0.3)
+    profiler.stop()
+
+    assert profiler.samples > 10
+    assert profiler.idle_us < profiler.total_us / 2
+    label, own, total = profiler.hot_functions()[0]
+    assert label.startswith('spin (test_profiler.py:')
+    assert own <= total
+    for line in profiler.collapsed().splitlines():
+        stack, weight = line.rsplit(' ', 1)
+        assert int(weight) > 0 and stack
+    assert any('spin (' in line for line in profiler.collapsed().splitlines())
+
+
+def test_waiting_loop_is_counted_as_idle(bm):
+    profiler = bm.SamplingProfiler(threading.get_ident(), interval=0.001)
+    profiler.start()
+    asyncio.run(asyncio.sleep(0.3))
+    profiler.stop()
+    assert profiler.idle_us > profiler.total_us / 2
+
+
+def test_own_and_inclusive_time_are_split_by_leaf(bm):
+    profiler = bm.SamplingProfiler(threading.get_ident())
+    profiler._stacks = {(outer.__code__, spin.__code__): 300, (outer.__code__,): 100}
+    hot = {label.split(' ')[0]: (own, total) for label, own, total in profiler.hot_functions()}
+    assert hot == {'spin': (300, 300), 'outer': (100, 400)}
+    assert profiler.hot_functions(limit=1)[0][0].startswith('spin')
+
+
+def test_only_slowest_handlers_are_kept(bm):
+    profiler = bm.SamplingProfiler(threading.get_ident(), slowest=3)
+    for i, seconds in enumerate([0.5, 0.1, 2.0, 0.3, 1.0]):
+        profiler.record_handler(f'h{i}', seconds)
+    assert profiler.slowest_handlers() == [(2.0, 'h2'), (1.0, 'h4'), (0.5, 'h0')]
+
+
+def profile_command(bot, user_id, args, answers):
+    async def answer(text, **kwargs):
+        answers.append(text)
+
+    message = types.SimpleNamespace(from_user=types.SimpleNamespace(id=user_id), chat=types.SimpleNamespace(id=user_id),
+                                    answer=answer)
+    return bot._cmd_profile(message, types.SimpleNamespace(args=args))
+
+
+def test_profile_command_validates_access_and_arguments(moderation_bot):
+    moderation_bot.config = moderation_bot.config.for_tenant('profile', admin_ids=[1])
+    answers = []
+
+    async def scenario():
+        await profile_command(moderation_bot, 2, None, answers)
+        await profile_command(moderation_bot, 1, '0', answers)
+        await profile_command(moderation_bot, 1, 'много', answers)
+        await profile_command(moderation_bot, 1, str(moderation_bot.PROFILE_MAX_SECONDS + 1), answers)
+
+    run(scenario())
+    assert answers[0] == "⛔ Нет доступа!"
+    assert all(text.startswith("Использование: /profile") for text in answers[1:])
+    assert moderation_bot._profiler is None
+
+
+def test_profile_run_reports_and_refuses_overlap(moderation_bot):
+    moderation_bot.config = moderation_bot.config.for_tenant('profile', admin_ids=[1])
+    sent = []
+
+    async def send_message(chat_id, text, **kwargs):
+        sent.append(text)
+
+    async def send_document(chat_id, document, **kwargs):
+        sent.append(document)
+
+    moderation_bot.bot = types.SimpleNamespace(send_message=send_message, send_document=send_document)
+    answers = []
+
+    async def handler():
+        spin(0.2)
+
+    async def scenario():
+        await profile_command(moderation_bot, 1, '1', answers)
+        await profile_command(moderation_bot, 1, '1', answers)
+        # Обработчик, прошедший через middleware во время замера, попадает в отчёт
+        await moderation_bot._profile_middleware(
+            lambda event, data: handler(), None, {'handler': types.SimpleNamespace(callback=handler)}
+        )
+        await moderation_bot._profile_task
+
+    run(scenario())
+    assert answers[1] == "⏳ Замер уже идёт, дождись отчёта."
+    assert moderation_bot._profiler is None
+    report, document = sent
+    assert "Профиль за 1 с" in report and "• handler — " in report
+    assert document.filename.endswith('.folded') and b'spin (' in document.data
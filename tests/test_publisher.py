@@ -0,0 +1,162 @@
+import asyncio
+import types
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError, TelegramRetryAfter
+
+from conftest import FakeBot, run
+
+
+@pytest.fixture
+def no_sleep(bm, monkeypatch):
+    """Паузы между попытками не ждём, а записываем"""
+    slept = []
+
+    async def sleep(seconds):
+        slept.append(seconds)
+
+    monkeypatch.setattr(bm.asyncio, 'sleep', sleep)
+    return slept
+
+
+def publisher_config(config, **overrides):
+    overrides.setdefault('publish_destinations', [
+        {'chat_id': -1, 'title': 'Главная', 'rate_per_minute': 6000, 'caption_template': '{comment}'},
+        {'chat_id': -2, 'title': 'Зеркало', 'rate_per_minute': 6000, 'caption_template': '#{post_id} {caption}'},
+        {'chat_id': -3, 'title': 'Архив', 'rate_per_minute': 6000, 'caption_template': ''},
+    ])
+    overrides.setdefault('publish_mode', 'send')
+    return config.for_tenant('publish', **overrides)
+
+
+def make_post(bm, post_id=7, caption=None, card_id=0):
+    return bm.PendingPost(
+        user_id=1, username=None, original_message_id=post_id, moderator_message_id=card_id,
+        content_type=bm.ContentType.PHOTO, file_id='file', caption=caption, moderator_chat_id=-100
+    )
+
+
+def test_captions_follow_each_destination_template(bm, config):
+    publisher = bm.Publisher(FakeBot(), publisher_config(config))
+    main, mirror, archive = publisher.get_destinations()
+    post = make_post(bm, caption='<3 & co')
+    assert bm.Publisher.render_caption(main, post, 'Годно') == 'Годно'
+    assert bm.Publisher.render_caption(mirror, post, '') == '#7 &lt;3 &amp; co'
+    assert bm.Publisher.render_caption(archive, post, 'Годно') is None
+    assert bm.Publisher.render_caption(main, post, '') is None  # пустая подпись — без parse_mode
+
+
+def test_invalid_destinations_are_skipped_and_default_is_main_group(bm, config):
+    broken = bm.Publisher(FakeBot(), config.for_tenant('publish', publish_destinations=[{'title': 'без chat_id'}, {'chat_id': -5}]))
+    assert [dest.chat_id for dest in broken.get_destinations()] == [-5]
+    default = bm.Publisher(FakeBot(), config.for_tenant('publish', publish_destinations=[], main_group_id=-77))
+    assert [dest.chat_id for dest in default.get_destinations()] == [-77]
+
+
+def test_each_destination_gets_its_own_status(bm, config, no_sleep):
+    async def handler(name, kwargs):
+        if kwargs['chat_id'] == -2:
+            raise TelegramBadRequest(None, 'chat not found')
+        if kwargs['chat_id'] == -3:
+            raise TelegramNetworkError(None, 'timeout')
+
+    bot = FakeBot(handler)
+    publisher = bm.Publisher(bot, publisher_config(config))
+    deliveries = run(publisher.publish(make_post(bm), 'Годно'))
+    assert deliveries == {0: 'ok', 1: 'failed', 2: 'retry'}
+    assert [kwargs['chat_id'] for _, kwargs in bot.calls].count(-2) == 1  # постоянная ошибка не повторяется
+    assert [kwargs['chat_id'] for _, kwargs in bot.calls].count(-3) == config.PUBLISH_ATTEMPTS
+    assert no_sleep == [1, 2, 4]
+    assert len(publisher) == 1
+
+
+def test_flood_wait_is_honoured_before_next_attempt(bm, config, no_sleep):
+    failures = [TelegramRetryAfter(None, 'flood', retry_after=17)]
+
+    async def handler(name, kwargs):
+        if failures:
+            raise failures.pop()
+
+    publisher = bm.Publisher(FakeBot(handler), publisher_config(config, publish_destinations=[{'chat_id': -1, 'rate_per_minute': 6000}]))
+    assert run(publisher.publish(make_post(bm))) == {0: 'ok'}
+    assert no_sleep == [17]
+
+
+def test_deferred_retries_end_in_ok_or_failed(bm, config, no_sleep):
+    down = {-1, -2}
+
+    async def handler(name, kwargs):
+        if kwargs['chat_id'] in down:
+            raise TelegramNetworkError(None, 'timeout')
+
+    publisher = bm.Publisher(FakeBot(handler), publisher_config(config, publish_deferred_retries=2, publish_destinations=[
+        {'chat_id': -1, 'rate_per_minute': 6000}, {'chat_id': -2, 'rate_per_minute': 6000}
+    ]))
+    post = make_post(bm)
+    assert run(publisher.publish(post)) == {0: 'retry', 1: 'retry'}
+    assert run(publisher.retry_pending()) == []  # первая отложенная попытка тоже не удалась
+    down.discard(-1)
+    assert run(publisher.retry_pending()) == [post]
+    assert post.deliveries == {0: 'ok', 1: 'failed'}
+    assert len(publisher) == 0
+
+
+def copy_publisher(bm, config, handler):
+    bot = FakeBot(handler)
+    return bot, bm.Publisher(bot, publisher_config(config, publish_mode='copy', publish_destinations=[
+        {'chat_id': -1, 'rate_per_minute': 6000, 'caption_template': ''}
+    ]))
+
+
+def publish_all(publisher, posts):
+    async def scenario():
+        return await asyncio.gather(*(publisher.publish(post) for post in posts))
+    return [deliveries[0] for deliveries in run(scenario())]
+
+
+def test_deleted_card_fails_only_its_own_copy(bm, config):
+    deleted = 104
+
+    async def handler(name, kwargs):
+        ids = kwargs.get('message_ids') or [kwargs.get('message_id')]
+        if name in ('copyMessages', 'copy_message') and deleted in ids:
+            raise TelegramBadRequest(None, 'Bad Request: message to copy not found')
+        if name == 'copyMessages':
+            return [types.SimpleNamespace(message_id=i) for i in ids]
+
+    bot, publisher = copy_publisher(bm, config, handler)
+    posts = [make_post(bm, post_id, card_id=100 + post_id) for post_id in range(1, 7)]
+    assert publish_all(publisher, posts) == ['ok'] * 6
+
+    copied = [i for name, kwargs in bot.calls if name == 'copyMessages' and deleted not in kwargs['message_ids']
+              for i in kwargs['message_ids']]
+    assert sorted(copied) == [101, 102, 103, 105, 106]  # каждый пост скопирован ровно один раз
+    resent = [name for name, _ in bot.calls if name == 'send_photo']
+    assert resent == ['send_photo']  # заново отправлен только пост с удалённой карточкой
+
+
+def test_partial_copy_is_not_repeated(bm, config):
+    async def handler(name, kwargs):
+        if name == 'copyMessages':
+            return [types.SimpleNamespace(message_id=1)]
+
+    bot, publisher = copy_publisher(bm, config, handler)
+    posts = [make_post(bm, post_id, card_id=100 + post_id) for post_id in range(1, 4)]
+    assert publish_all(publisher, posts) == ['failed'] * 3  # какие скопированы — неизвестно, дубли хуже
+    assert [name for name, _ in bot.calls] == ['copyMessages']
+
+
+def test_transient_batch_error_is_retried_for_every_post(bm, config, no_sleep):
+    failures = [TelegramNetworkError(None, 'timeout')]
+
+    async def handler(name, kwargs):
+        if failures:
+            raise failures.pop()
+        if name == 'copyMessages':
+            return [types.SimpleNamespace(message_id=i) for i in kwargs['message_ids']]
+
+    bot, publisher = copy_publisher(bm, config, handler)
+    posts = [make_post(bm, post_id, card_id=100 + post_id) for post_id in range(1, 4)]
+    assert publish_all(publisher, posts) == ['ok'] * 3
+    assert no_sleep == [1, 1, 1]
+    assert [name for name, _ in bot.calls] == ['copyMessages', 'copyMessages']
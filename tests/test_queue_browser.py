@@ -0,0 +1,81 @@
+import re
+import types
+
+from conftest import moderator, run
+from test_post_manager import add
+
+QUEUE_CALLBACK = re.compile(r"^queue_\d+_(all|photo|video)_\d+$")  # как при регистрации _admin_queue
+
+
+def buttons(markup):
+    return {button.text: button.callback_data for row in markup.inline_keyboard for button in row}
+
+
+def fill(manager, bm, count):
+    async def scenario():
+        for post_id in range(1, count + 1):
+            await add(manager, bm, post_id, user_id=post_id % 2,
+                      content_type=bm.ContentType.VIDEO if post_id % 3 == 0 else bm.ContentType.PHOTO)
+    run(scenario())
+
+
+def test_pages_cover_queue_without_gaps(bm, config):
+    manager = bm.PostManager(config)
+    fill(manager, bm, 23)
+    seen = []
+    for offset in (0, 10, 20):
+        page, total = manager.get_queue_page(offset, 10)
+        assert total == 23
+        seen += [post.original_message_id for post in page]
+    assert seen == list(range(1, 24))
+    assert manager.get_queue_page(30, 10) == ([], 23)
+
+
+def test_user_and_type_filters_combine(bm, config):
+    manager = bm.PostManager(config)
+    fill(manager, bm, 12)
+    page, total = manager.get_queue_page(0, 10, user_id=1, content_type=bm.ContentType.VIDEO)
+    assert [post.original_message_id for post in page] == [3, 9] and total == 2
+    page, total = manager.get_queue_page(0, 2, content_type=bm.ContentType.VIDEO)
+    assert [post.original_message_id for post in page] == [3, 6] and total == 4
+    assert manager.get_queue_page(0, 10, user_id=42) == ([], 0)
+
+
+def test_navigation_appears_only_where_there_is_a_page(bm):
+    first = buttons(bm.KeyboardFactory.get_queue_kb(0, 25, 'photo', 7, 10))
+    assert '◀️' not in first and first['▶️'] == 'queue_10_photo_7'
+    last = buttons(bm.KeyboardFactory.get_queue_kb(20, 25, 'photo', 7, 10))
+    assert '▶️' not in last and last['◀️'] == 'queue_10_photo_7'
+    single = buttons(bm.KeyboardFactory.get_queue_kb(0, 10, 'all', 0, 10))
+    assert '◀️' not in single and '▶️' not in single
+    assert '✖️ Сбросить пользователя' not in single
+    for markup in (first, last, single):
+        assert all(QUEUE_CALLBACK.match(data) for data in markup.values()
+                   if data.startswith('queue_') and data != 'queue_by_user')
+
+
+def test_render_escapes_captions_and_reports_empty_queue(bm, moderation_bot):
+    text, _ = moderation_bot._render_queue_page(0, 'all', 0)
+    assert 'Очередь пуста.' in text
+
+    async def scenario():
+        await moderation_bot.post_manager.add_post(
+            user_id=5, username=None, original_msg_id=1, mod_msg_id=100,
+            content_type=bm.ContentType.PHOTO, file_id='file', caption='<b>жирный</b> & ' + 'x' * 60
+        )
+    run(scenario())
+    text, _ = moderation_bot._render_queue_page(0, 'photo', 5)
+    assert '&lt;b&gt;жирный&lt;/b&gt; &amp;' in text
+    assert 'x' * 40 not in text  # подпись обрезается до 40 символов
+    assert 'Фильтр: фото, пользователь <code>5</code>' in text
+
+
+def test_queue_is_admin_only(bm, moderation_bot):
+    answers = []
+
+    async def answer(text=None, show_alert=False):
+        answers.append(text)
+
+    callback = types.SimpleNamespace(data='queue_0_all_0', from_user=moderator(999), answer=answer)
+    run(moderation_bot._admin_queue(callback, state=None))
+    assert answers == ["⛔ Нет доступа!"]
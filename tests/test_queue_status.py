@@ -0,0 +1,99 @@
+import types
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import run
+from test_post_manager import add
+
+
+@pytest.fixture
+def now(bm, monkeypatch):
+    """Подменённые часы модуля: now.value двигается вручную"""
+    class FixedDatetime(datetime):
+        value = datetime(2024, 3, 1, 10, 30)
+
+        @classmethod
+        def now(cls, tz=None):
+            return cls.value
+
+    monkeypatch.setattr(bm, 'datetime', FixedDatetime)
+    return FixedDatetime
+
+
+def test_hourly_rate_folds_finished_hours_into_ewma(bm, config, now):
+    manager = bm.PostManager(config)
+    manager._record_decisions(6)
+    now.value = datetime(2024, 3, 1, 12, 5)
+    manager._record_decisions()
+    assert manager._hourly_rate[10] == 6.0
+    assert manager._hourly_rate[11] == 0.0  # час без решений — тоже наблюдение
+    assert manager._rate_count == 1
+    
+    now.value = datetime(2024, 3, 2, 10, 0)
+    manager._record_decisions(10)
+    now.value = datetime(2024, 3, 2, 11, 0)
+    manager._roll_rate_hour()
+    assert manager._hourly_rate[10] == pytest.approx(0.3 * 10 + 0.7 * 6)
+    
+    now.value = datetime(2024, 3, 9, 11, 0)  # неделя простоя сворачивается за один проход
+    manager._roll_rate_hour()
+    assert manager._rate_hour == now.value
+
+
+def test_estimate_uses_remaining_part_of_current_hour(bm, config, now):
+    manager = bm.PostManager(config)
+    assert manager.estimate_wait(5) is None
+    manager._hourly_rate = [10.0] * 24
+    assert manager.estimate_wait(3) == timedelta(minutes=18)
+    assert manager.estimate_wait(5) == timedelta(minutes=30)
+    assert manager.estimate_wait(15) == timedelta(minutes=90)
+
+
+def test_estimate_skips_idle_hours_and_fills_unknown_ones(bm, config, now):
+    manager = bm.PostManager(config)
+    manager._hourly_rate = [10.0] * 24
+    manager._hourly_rate[11] = 0.0
+    assert manager.estimate_wait(10) == timedelta(hours=2)
+    
+    manager._hourly_rate = [None] * 24
+    manager._hourly_rate[0] = 4.0  # остальные часы берут среднее известных
+    assert manager.estimate_wait(2) == timedelta(minutes=30)
+    manager._hourly_rate = [0.0] * 24
+    assert manager.estimate_wait(1) is None
+
+
+def test_format_eta_ranges(bm):
+    fmt = bm.MemesModerationBot._format_eta
+    assert fmt(None) == "до 24 часов"
+    assert fmt(timedelta(seconds=5)) == "~1 мин"
+    assert fmt(timedelta(minutes=59)) == "~59 мин"
+    assert fmt(timedelta(minutes=90)) == "~2 ч"
+    assert fmt(timedelta(hours=47)) == "~47 ч"
+    assert fmt(timedelta(hours=60)) == "~2 дн"
+
+
+def test_status_lists_only_own_undecided_posts(bm, moderation_bot, now):
+    manager = moderation_bot.post_manager
+    answers = []
+
+    async def answer(text, **kwargs):
+        answers.append(text)
+
+    async def clear():
+        pass
+
+    async def scenario():
+        for post_id in range(1, 5):
+            await add(manager, bm, post_id, user_id=1 if post_id % 2 else 2)
+        await manager.claim_posts([1], approved=True)
+        assert manager.get_queue_position(1) is None
+        assert manager.get_queue_position(3) == 2
+        message = types.SimpleNamespace(from_user=types.SimpleNamespace(id=1), answer=answer)
+        await moderation_bot._cmd_status(message, types.SimpleNamespace(clear=clear))
+        message.from_user.id = 3
+        await moderation_bot._cmd_status(message, types.SimpleNamespace(clear=clear))
+
+    run(scenario())
+    assert 'на рассмотрении: 1' in answers[0] and 'место <b>2</b>, ожидание до 24 часов' in answers[0]
+    assert answers[1] == "📭 У тебя нет предложек на рассмотрении."
@@ -0,0 +1,100 @@
+from conftest import FakeBot, make_submission, run
+
+
+def decide(manager, user_id, approvals, rejections):
+    for _ in range(rejections):
+        manager._record_user_decision(user_id, False)
+    for _ in range(approvals):
+        manager._record_user_decision(user_id, True)
+
+
+def add(manager, bm, post_id, user_id):
+    return manager.add_post(
+        user_id=user_id, username=None, original_msg_id=post_id, mod_msg_id=1000 + post_id,
+        content_type=bm.ContentType.PHOTO, file_id=f'file-{post_id}'
+    )
+
+
+def test_new_authors_stay_normal_whatever_their_history(bm, config):
+    manager = bm.PostManager(config)
+    decide(manager, 1, approvals=0, rejections=config.REPUTATION_MIN_DECISIONS - 1)
+    assert manager.get_reputation(2) == (0.5, 0.0)
+    assert manager.get_priority(1) == manager.get_priority(2) == bm.PostManager.PRIORITY_NORMAL
+
+
+def test_old_rejections_fade_and_author_becomes_trusted(bm, config):
+    manager = bm.PostManager(config)
+    decide(manager, 1, approvals=0, rejections=10)
+    assert manager.get_priority(1) == bm.PostManager.PRIORITY_LOW
+
+    decide(manager, 1, approvals=40, rejections=0)
+    score, weight = manager.get_reputation(1)
+    assert score >= config.REPUTATION_TRUSTED
+    assert weight < 1 / (1 - config.REPUTATION_DECAY)  # затухание ограничивает вес истории
+    assert manager.get_priority(1) == bm.PostManager.PRIORITY_TRUSTED
+
+
+def test_queue_is_ordered_by_priority_and_filters_stay_chronological(bm, config):
+    manager = bm.PostManager(config)
+    decide(manager, 1, approvals=0, rejections=10)  # низкая репутация
+    decide(manager, 3, approvals=10, rejections=0)  # доверенный
+
+    async def scenario():
+        await add(manager, bm, 1, user_id=1)
+        await add(manager, bm, 2, user_id=2)
+        await add(manager, bm, 3, user_id=3)
+        await add(manager, bm, 4, user_id=1)
+
+    run(scenario())
+    page, total = manager.get_queue_page(0, 10)
+    assert [post.original_message_id for post in page] == [3, 2, 1, 4]
+    assert [manager.get_queue_position(post_id) for post_id in (3, 2, 1, 4)] == [1, 2, 3, 4]
+    page, _ = manager.get_queue_page(0, 10, user_id=1)
+    assert [post.original_message_id for post in page] == [1, 4]
+
+    # Приоритет фиксируется при постановке в очередь: решения по другим постам его не меняют
+    decide(manager, 1, approvals=30, rejections=0)
+    page, _ = manager.get_queue_page(0, 10)
+    assert [post.original_message_id for post in page] == [3, 2, 1, 4]
+
+
+def test_auto_approve_needs_threshold_and_history(bm, config):
+    manager = bm.PostManager(config)
+    decide(manager, 1, approvals=2 * config.REPUTATION_MIN_DECISIONS, rejections=0)
+    assert not manager.can_auto_approve(1)  # по умолчанию выключено
+
+    manager.config = config.for_tenant('auto', reputation_auto_approve=0.8)
+    assert manager.can_auto_approve(1)
+    assert not manager.can_auto_approve(2)
+    decide(manager, 3, approvals=config.REPUTATION_MIN_DECISIONS - 1, rejections=0)
+    assert not manager.can_auto_approve(3)
+
+
+def auto_bot(moderation_bot, status):
+    async def deliver(dest, post, comment):
+        return status
+
+    moderation_bot.bot = FakeBot()
+    moderation_bot.publisher._deliver = deliver
+    return moderation_bot
+
+
+def test_auto_approved_post_is_published_archived_and_shown_without_buttons(bm, moderation_bot):
+    bot = auto_bot(moderation_bot, 'ok')
+    assert run(bot._auto_approve(make_submission(bm, 5, user_id=7)))
+
+    assert bot.post_manager._user_stats[7]['approved'] == 1
+    assert bot.archive.find_duplicate('unique-5')['outcome'] == 'approved'
+    (name, kwargs), = bot.bot.calls
+    assert name == 'send_photo' and kwargs['reply_markup'] is None
+    assert 'БЕЗ МОДЕРАЦИИ' in kwargs['caption']
+    assert run(bot.post_manager.get_post(5)) is None  # в очередь модерации пост не попадает
+
+
+def test_failed_auto_publish_falls_back_to_moderation(bm, moderation_bot):
+    bot = auto_bot(moderation_bot, 'failed')
+    assert not run(bot._auto_approve(make_submission(bm, 5, user_id=7)))
+
+    assert 7 not in bot.post_manager._user_stats
+    assert bot.archive.find_duplicate('unique-5') is None
+    assert bot.bot.calls == []
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError
+from aiogram.methods import AnswerCallbackQuery
+
+from conftest import run
+
+MESSAGE = {'message_id': 1, 'date': 0, 'chat': {'id': 1, 'type': 'private'}, 'text': 'ok'}
+
+
+async def serve(delay=0.0):
+    """Фейковый Bot API в том же цикле: запоминает клиентские соединения"""
+    peers = []
+
+    async def handle(request):
+        peers.append(request.transport.get_extra_info('peername'))
+        await asyncio.sleep(delay)
+        result = MESSAGE if request.match_info['method'] == 'sendMessage' else True
+        return web.json_response({'ok': True, 'result': result})
+
+    app = web.Application()
+    app.router.add_post('/bot{token}/{method}', handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://127.0.0.1:{port}', peers
+
+
+def tuned_bot(bm, base, **overrides):
+    config = bm.BotConfig.for_tenant('session', api_server_url=base, **overrides)
+    return Bot(token='123456:TEST', session=bm.TunedAiohttpSession(config))
+
+
+def test_method_timeouts_override_the_default(bm):
+    async def scenario():
+        runner, base, _ = await serve(delay=0.3)
+        bot = tuned_bot(bm, base, http_timeout_seconds=5, http_method_timeouts={'answerCallbackQuery': 0.1})
+        try:
+            with pytest.raises(TelegramNetworkError):
+                await bot.answer_callback_query(callback_query_id='1')
+            await bot.send_message(chat_id=1, text='x')  # остальные методы — с общим таймаутом
+            await bot.session.make_request(bot, AnswerCallbackQuery(callback_query_id='2'), timeout=5)
+        finally:
+            await bot.session.close()
+            await runner.cleanup()
+
+    run(scenario())
+
+
+def test_requests_reuse_pooled_keepalive_connections(bm):
+    async def scenario():
+        runner, base, peers = await serve(delay=0.01)
+        bot = tuned_bot(bm, base, http_pool_limit=4)
+        try:
+            for i in range(10):
+                await bot.send_message(chat_id=1, text=str(i))
+            sequential = set(peers)
+            peers.clear()
+            await asyncio.gather(*(bot.send_message(chat_id=1, text=str(i)) for i in range(40)))
+            return sequential, set(peers), len(peers)
+        finally:
+            await bot.session.close()
+            await runner.cleanup()
+
+    sequential, concurrent, calls = run(scenario())
+    assert len(sequential) == 1
+    assert calls == 40 and len(concurrent) <= 4
+
+
+def test_plain_http_server_drops_ssl_options(bm):
+    http = bm.TunedAiohttpSession(bm.BotConfig.for_tenant('session', api_server_url='http://127.0.0.1:8081'))
+    assert 'ssl' not in http._connector_init
+    assert http._connector_init['limit_per_host'] == http._connector_init['limit']
+    default = bm.TunedAiohttpSession(bm.BotConfig.for_tenant('session'))
+    assert default.api.base.startswith('https://api.telegram.org')
@@ -0,0 +1,119 @@
+from collections import Counter
+
+import pytest
+
+from conftest import FakeBot, make_submission, run
+
+
+def balancer(bm, strategy='round_robin', shards=None):
+    config = bm.BotConfig.for_tenant(
+        'test', review_mode='sharded', shard_strategy=strategy, moderators={1, 2, 3},
+        review_shards=shards or [{'moderator_id': 1, 'weight': 3}, {'moderator_id': 2}, {'moderator_id': 3}]
+    )
+    return bm.ShardBalancer(config)
+
+
+def test_weighted_round_robin_follows_weights(bm):
+    shards = balancer(bm)
+    picks = Counter(shards.assign(post_id).moderator_id for post_id in range(50))
+    assert picks == {1: 30, 2: 10, 3: 10}
+
+
+def test_least_loaded_prefers_shard_with_fewest_posts(bm):
+    shards = balancer(bm, 'least_loaded', [{'moderator_id': 1}, {'moderator_id': 2}])
+    assert shards.assign(1).moderator_id == 1
+    assert shards.assign(2).moderator_id == 2
+    shards.release(1)
+    assert shards.assign(3).moderator_id == 1
+
+
+def test_release_and_reassign_keep_outstanding_consistent(bm):
+    shards = balancer(bm, 'least_loaded')
+    for post_id in range(6):
+        shards.assign(post_id)
+    first = shards.assign(0, exclude=shards._assignments[0])  # переотправка в другой шард
+    assert first is not None
+    assert sum(shard.outstanding for shard in shards.get_shards()) == 6
+    for post_id in range(6):
+        shards.release(post_id)
+    shards.release(0)  # повторное снятие ничего не ломает
+    assert all(shard.outstanding == 0 for shard in shards.get_shards())
+
+
+def test_shards_of_removed_moderators_are_skipped(bm):
+    shards = balancer(bm)
+    shards.config.MODERATORS = {2}
+    assert {shards.assign(post_id).moderator_id for post_id in range(5)} == {2}
+    shards.config.MODERATORS = set()
+    assert not shards.enabled
+    assert shards.assign(99) is None
+
+
+def test_restore_returns_post_to_previous_shard(bm):
+    shards = balancer(bm, 'least_loaded')
+    old = shards.assign(1)
+    shards.assign(1, exclude=old.shard_id)
+    shards.restore(1, old.shard_id)
+    assert shards._assignments[1] == old.shard_id
+    assert [shard.outstanding for shard in shards.get_shards()] == [1, 0, 0]
+    shards.release(1)
+    shards.restore(1, old.shard_id)  # пост решён во время переотправки — назначать некуда
+    assert 1 not in shards._assignments
+    assert all(shard.outstanding == 0 for shard in shards.get_shards())
+
+
+@pytest.fixture
+def config(bm):
+    return bm.BotConfig.for_tenant(
+        'test', bot_token='123456:TEST', moderators_chat_id=-100, moderators={1, 2},
+        review_mode='sharded', shard_strategy='least_loaded',
+        review_shards=[{'moderator_id': 1}, {'moderator_id': 2}]
+    )
+
+
+def test_failed_resend_keeps_post_on_old_shard(bm, moderation_bot):
+    manager = moderation_bot.post_manager
+
+    async def failed_send(**kwargs):
+        return None
+
+    async def scenario():
+        shard = manager.shards.assign(7)
+        await manager.add_post(
+            user_id=1, username=None, original_msg_id=7, mod_msg_id=70,
+            content_type=bm.ContentType.PHOTO, file_id='file',
+            mod_chat_id=shard.chat_id, shard_id=shard.shard_id
+        )
+        moderation_bot._send_to_moderators = failed_send
+        post = await manager.get_post(7)
+        assert not await moderation_bot._reassign_post(post)
+        return shard, post
+
+    shard, post = run(scenario())
+    assert post.shard_id == shard.shard_id
+    assert manager.shards._assignments[7] == shard.shard_id
+    assert [s.outstanding for s in manager.shards.get_shards()] == [1, 0]
+
+
+def open_chat(bot, chat_id):
+    breaker = bot.breaker.chats[(bot.bot.id, chat_id)] = bot.breaker._new(bot.bot.id)
+    breaker.failure(open_for=60)
+
+
+def test_degraded_mode_follows_shard_chats(bm, moderation_bot):
+    moderation_bot.bot = FakeBot()
+    open_chat(moderation_bot, moderation_bot.config.MODERATORS_CHAT_ID)
+    assert not moderation_bot._moderation_degraded()  # общий чат при шардах не используется
+
+    open_chat(moderation_bot, 1)
+    assert not moderation_bot._moderation_degraded()
+
+    async def scenario():
+        for message_id in (1, 2, 3):
+            assert await moderation_bot._send_card(make_submission(bm, message_id), 'карточка')
+
+    run(scenario())
+    assert [kwargs['chat_id'] for _, kwargs in moderation_bot.bot.calls] == [2, 2, 2]  # шард 1 пропускается
+
+    open_chat(moderation_bot, 2)
+    assert moderation_bot._moderation_degraded()
@@ -0,0 +1,95 @@
+import asyncio
+import pickle
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage, MemoryStorageRecord
+
+from conftest import run
+
+
+def close(bot):
+    bot.overflow.close()
+    bot.audit.close()
+    bot.archive.close()
+
+
+def test_docstring_survives_class_attributes(bm):
+    assert bm.MemesModerationBot.__doc__ == "Основной класс бота"
+
+
+def test_snapshot_round_trip_keeps_queue_fsm_and_retries(bm, config, moderation_bot, workdir):
+    async def scenario():
+        for post_id in (1, 2):
+            await moderation_bot.post_manager.add_post(
+                user_id=5, username=None, original_msg_id=post_id, mod_msg_id=100 + post_id,
+                content_type=bm.ContentType.PHOTO, file_id='file'
+            )
+    run(scenario())
+    post = moderation_bot.post_manager._pending_posts[1]
+    moderation_bot.publisher.restore_retries([(post, 0, 'Годно', 2)])
+    storage = MemoryStorage()
+    key = StorageKey(bot_id=moderation_bot.bot.id, chat_id=10, user_id=10)
+    other_bot = StorageKey(bot_id=999, chat_id=10, user_id=10)
+    storage.storage[key] = MemoryStorageRecord(data={'post': 1}, state='AdminStates:waiting_broadcast')
+    storage.storage[other_bot] = MemoryStorageRecord(state='чужой бот')
+    moderation_bot.save_snapshot(storage)
+
+    restored = bm.MemesModerationBot(config)
+    try:
+        manager = restored.post_manager
+        assert sorted(manager._pending_posts) == [1, 2] and manager.config is config
+        assert manager.get_queue_position(2) == 2 and len(manager.deadlines) == 2
+        (retry_post, dest, comment, attempts), = restored.publisher._retry_queue.values()
+        assert retry_post is manager._pending_posts[1]  # тот же объект, что и в очереди
+        assert (dest.dest_id, comment, attempts) == (0, 'Годно', 2)
+        fresh = MemoryStorage()
+        restored.restore_fsm(fresh)
+        assert list(fresh.storage) == [key] and fresh.storage[key].data == {'post': 1}
+    finally:
+        close(restored)
+    
+    snapshot = workdir / config.SNAPSHOT_FILE
+    backup = workdir / f'{config.SNAPSHOT_FILE}.bak'
+    assert not snapshot.exists() and backup.exists()  # повторный старт не поднимет старую очередь
+    restored.save_snapshot(MemoryStorage())
+    assert snapshot.exists() and not backup.exists()
+
+
+def test_incompatible_snapshot_is_kept_aside(bm, config, workdir):
+    snapshot = workdir / config.SNAPSHOT_FILE
+    snapshot.write_bytes(pickle.dumps({'version': 1, 'posts': None, 'fsm': {}}))
+    bot = bm.MemesModerationBot(config)
+    close(bot)
+    assert bot.post_manager.get_stats()['pending_posts'] == 0
+    assert not snapshot.exists() and (workdir / f'{config.SNAPSHOT_FILE}.bad').exists()
+
+
+def test_drain_waits_for_handlers_and_bulk_jobs(bm, moderation_bot):
+    finished = []
+
+    async def job(name, seconds):
+        await asyncio.sleep(seconds)
+        finished.append(name)
+
+    async def scenario():
+        moderation_bot._inflight.add(asyncio.create_task(job('handler', 0.05)))
+        moderation_bot._bulk_jobs.add(asyncio.create_task(job('bulk', 0.1)))
+        await moderation_bot.drain()
+
+    run(scenario())
+    assert sorted(finished) == ['bulk', 'handler']
+
+
+def test_drain_cancels_work_past_the_deadline(bm, moderation_bot):
+    moderation_bot.config.SHUTDOWN_DRAIN_SECONDS = 0.05
+
+    async def scenario():
+        quick = asyncio.create_task(asyncio.sleep(0.01))
+        stuck = asyncio.create_task(asyncio.sleep(60))
+        moderation_bot._inflight.update({quick, stuck})
+        await moderation_bot.drain()
+        return quick, stuck
+
+    quick, stuck = run(scenario())
+    assert quick.done() and not quick.cancelled()
+    assert stuck.cancelled()
@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+from conftest import run
+
+
+def test_tenant_does_not_inherit_admins_or_moderators(bm, monkeypatch):
+    monkeypatch.setattr(bm.BotConfig, 'ADMIN_IDS', {1})
+    monkeypatch.setattr(bm.BotConfig, 'MODERATORS', {1, 2})
+    tenant = bm.BotConfig.for_tenant('shop', bot_token='1:A')
+    assert tenant.ADMIN_IDS == set() and tenant.MODERATORS == set()
+    explicit = bm.BotConfig.for_tenant('news', bot_token='2:B', admin_ids=[5], moderators=[6, 7])
+    assert explicit.ADMIN_IDS == {5} and explicit.MODERATORS == {6, 7}
+    assert bm.BotConfig.ADMIN_IDS == {1}
+
+
+def test_tenant_state_is_isolated_from_base_and_siblings(bm):
+    first = bm.BotConfig.for_tenant('first', bot_token='1:A')
+    second = bm.BotConfig.for_tenant('second', bot_token='2:B')
+    first.REVIEW_SHARDS.append({'moderator_id': 1})
+    first.MODERATORS.add(9)
+    assert second.REVIEW_SHARDS == [] and bm.BotConfig.REVIEW_SHARDS == []
+    assert 9 not in second.MODERATORS and 9 not in bm.BotConfig.MODERATORS
+    files = {(config.OVERFLOW_FILE, config.ARCHIVE_FILE, config.AUDIT_DIR, config.SNAPSHOT_FILE) for config in (first, second, bm.BotConfig)}
+    assert len(files) == 3
+
+
+def test_tenant_config_file_is_applied_on_top_of_overrides(bm, workdir):
+    (workdir / 'bot_config.shop.json').write_text(json.dumps({'admins': [3], 'max_pending_posts': 7}), encoding='utf-8')
+    tenant = bm.BotConfig.for_tenant('shop', bot_token='1:A', max_pending_posts=50)
+    assert tenant.ADMIN_IDS == {3} and tenant.MAX_PENDING_POSTS == 7
+
+
+def test_load_tenants_tolerates_missing_and_broken_files(bm, workdir):
+    assert bm.BotConfig.load_tenants() == []
+    (workdir / bm.BotConfig.TENANTS_FILE).write_text('{broken', encoding='utf-8')
+    assert bm.BotConfig.load_tenants() == []
+    (workdir / bm.BotConfig.TENANTS_FILE).write_text(json.dumps({
+        'shop': {'bot_token': '1:A', 'admin_ids': [5]}, 'news': {'bot_token': '2:B'}
+    }), encoding='utf-8')
+    tenants = bm.BotConfig.load_tenants()
+    assert [(config.BOT_TOKEN, config.ADMIN_IDS) for config in tenants] == [('1:A', {5}), ('2:B', set())]
+
+
+@pytest.fixture
+def runner(bm):
+    configs = [
+        bm.BotConfig.for_tenant('shop', bot_token='111:AAA', breaker_failure_threshold=1),
+        bm.BotConfig.for_tenant('news', bot_token='222:BBB', breaker_failure_threshold=4),
+    ]
+    runner = bm.MultiTenantRunner(configs)
+    yield runner
+    for bot in runner.bots:
+        bot.overflow.close()
+        bot.audit.close()
+        bot.archive.close()
+    run(runner.session.close())
+
+
+def test_runner_shares_one_session_with_per_tenant_breakers(bm, runner):
+    shop, news = runner.bots
+    assert shop.bot.session is news.bot.session is runner.session
+    assert shop.breaker is news.breaker
+    breakers = [mw for mw in runner.session.middleware if isinstance(mw, bm.CircuitBreakerMiddleware)]
+    assert len(breakers) == 1
+    assert shop.breaker._new(shop.bot.id).threshold == 1
+    assert shop.breaker._new(news.bot.id).threshold == 4
+
+
+def test_runner_shares_one_media_pool_between_tenants(bm):
+    configs = [
+        bm.BotConfig.for_tenant('shop', bot_token='111:AAA', media_analysis_enabled=True),
+        bm.BotConfig.for_tenant('news', bot_token='222:BBB', media_analysis_enabled=True),
+    ]
+    runner = bm.MultiTenantRunner(configs)
+    try:
+        assert runner.media_pool is not None
+        assert all(bot.media._pool is runner.media_pool for bot in runner.bots)
+        runner.bots[0].media.shutdown()
+        assert runner.bots[1].media._pool is runner.media_pool
+    finally:
+        runner.media_pool.shutdown()
+        for bot in runner.bots:
+            bot.overflow.close()
+            bot.audit.close()
+            bot.archive.close()
+        run(runner.session.close())
+
+
+def test_runner_without_media_analysis_has_no_pool(runner):
+    assert runner.media_pool is None
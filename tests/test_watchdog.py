@@ -0,0 +1,115 @@
+import asyncio
+import json
+import socket
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from conftest import run
+
+
+@pytest.fixture
+def watchdog_config(config):
+    return config.for_tenant('watchdog', loop_lag_interval_seconds=0.02, loop_lag_threshold_seconds=0.2)
+
+
+def block_loop(seconds):
+    time.sleep(seconds)
+
+
+def watch(bm, config, scenario, on_stall=None):
+    """Прогнать scenario(watchdog) при работающем сторожевом цикле"""
+    alerts = []
+
+    async def record(lag, stack):
+        alerts.append((lag, stack))
+
+    async def main():
+        watchdog = bm.LoopWatchdog(config, on_stall or record)
+        task = asyncio.create_task(watchdog.run())
+        await asyncio.sleep(0.05)
+        try:
+            await scenario(watchdog)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        return watchdog
+
+    return run(main()), alerts
+
+
+def test_stall_is_reported_with_the_blocking_stack(bm, watchdog_config):
+    async def scenario(watchdog):
+        block_loop(0.5)
+        await asyncio.sleep(0.05)
+        if watchdog._alert_task:
+            await watchdog._alert_task
+
+    watchdog, alerts = watch(bm, watchdog_config, scenario)
+    assert watchdog.stalls == 1 and watchdog.max_lag >= 0.4
+    (lag, stack), = alerts
+    assert lag >= 0.4
+    assert 'block_loop' in stack and 'base_events.py' not in stack
+
+
+def test_alerts_are_throttled_but_stalls_are_counted(bm, watchdog_config):
+    async def scenario(watchdog):
+        for _ in range(2):
+            block_loop(0.3)
+            await asyncio.sleep(0.05)
+
+    watchdog, alerts = watch(bm, watchdog_config, scenario)
+    assert watchdog.stalls == 2
+    assert len(alerts) == 1
+
+
+def test_failing_alert_does_not_stop_the_watchdog(bm, watchdog_config):
+    async def broken(lag, stack):
+        raise RuntimeError("чат недоступен")
+
+    async def scenario(watchdog):
+        block_loop(0.3)
+        await asyncio.sleep(0.1)
+        assert watchdog._alert_task.done() and watchdog._alert_task.exception() is None
+        watchdog.lag = 0.0
+        await asyncio.sleep(0.1)
+        assert watchdog.lag < 0.2  # пульс продолжается
+
+    watchdog, _ = watch(bm, watchdog_config, scenario, on_stall=broken)
+    assert watchdog.stalls == 1
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def fetch(port, path='/healthz'):
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', timeout=2) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b'null') if e.headers.get('Content-Type') == 'application/json' else None
+
+
+def test_liveness_answers_while_loop_is_stuck_and_releases_port(bm, watchdog_config):
+    port = free_port()
+    config = watchdog_config.for_tenant('watchdog', liveness_port=port, liveness_stale_seconds=5)
+
+    async def scenario(watchdog):
+        status, body = fetch(port)
+        assert status == 200 and body['alive'] and body['stalls'] == 0
+        # Запрос синхронный, цикл стоит — отвечает поток сервера
+        watchdog.heartbeat = time.monotonic() - 10
+        status, body = fetch(port)
+        assert status == 503 and not body['alive'] and body['heartbeat_age'] >= 10
+        assert fetch(port, '/metrics')[0] == 404
+
+    watchdog, _ = watch(bm, config, scenario)
+    assert watchdog._server is None
+    with socket.socket() as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # как у HTTPServer; TIME_WAIT не мешает
+        sock.bind(('127.0.0.1', port))  # сервер остановлен и порт освобождён